@@ -0,0 +1,96 @@
+"""
+Verify the incremental BarArchive exporter and compare loading bars from the archive with CSV.
+
+Synthetic bars (see benchmark.storage) are written to an SQLite database and exported in two
+parts; the second export must only append the new rows and the archive must equal read_arrays
+of the tables. Loading all bars of all markets is then timed from a CSV export parsed with a
+Decimal per price cell (as in the notebooks) and from the memory-mapped archive.
+
+Run from the crocket directory:
+    python -m benchmark.archive
+"""
+from csv import reader, writer
+from datetime import datetime, timedelta
+from decimal import Decimal
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import time
+
+from numpy import array_equal
+
+from benchmark.storage import START_DATETIME, make_cycles
+from sql.backend import PRICE_COLUMNS, get_database
+from utilities.BarArchive import BarArchive, export_table
+
+COLUMNS = ('time',) + PRICE_COLUMNS
+
+
+def load_csv(path):
+
+    with open(path, 'r', newline='') as f:
+        rows = reader(f)
+        next(rows)
+
+        return [(datetime.strptime(x[0], '%Y-%m-%d %H:%M:%S'), *(Decimal(y) for y in x[1:6]), int(x[6]), int(x[7]))
+                for x in rows]
+
+
+def main(num_markets=50, num_minutes=1440 * 7):
+
+    markets, cycles = make_cycles(num_markets, num_minutes)
+    split = num_minutes * 3 // 4
+
+    with TemporaryDirectory() as directory:
+        db = get_database('sqlite', 'benchmark_archive', directory=directory)
+        archive = BarArchive(join(directory, 'archive'))
+
+        for market in markets:
+            db.create_price_table(market)
+
+        exported = []
+
+        for part in (cycles[:split], cycles[split:]):
+            for rows in part:
+                db.insert_transaction_query(rows)
+
+            start = time()
+            exported.append(sum(export_table(archive, db, x, x, PRICE_COLUMNS) for x in markets))
+
+            print('export: appended {} rows in {:.2f}s.'.format(exported[-1], time() - start))
+
+        end_datetime = START_DATETIME + timedelta(minutes=num_minutes)
+        mismatches = 0
+
+        for market in markets:
+            arrays = db.read_range_arrays(market, list(COLUMNS), START_DATETIME, end_datetime, prices='satoshi')
+            archived = archive.open(market)
+
+            mismatches += not all(array_equal(arrays[x], archived[x]) for x in COLUMNS)
+
+        print('export: {} + {} of {} rows, {} markets differ from read_arrays.'.format(
+            exported[0], exported[1], num_markets * num_minutes, mismatches))
+
+        # CSV export as in the notebooks
+        for market in markets:
+            with open(join(directory, market + '.csv'), 'w', newline='') as f:
+                csv_writer = writer(f)
+                csv_writer.writerow(COLUMNS)
+                csv_writer.writerows(db.select_query(market, list(COLUMNS)))
+
+        db.close()
+
+        start = time()
+        total = sum(sum(x[3] for x in load_csv(join(directory, y + '.csv'))) for y in markets)
+        csv_time = time() - start
+
+        start = time()
+        archive_total = sum(int(archive.open(x, columns=['base_volume'])['base_volume'].sum()) for x in markets)
+        archive_time = time() - start
+
+        print('load {} rows: CSV with Decimal {:.3f}s, archive {:.4f}s ({:.0f}x), volumes {}.'.format(
+            num_markets * num_minutes, csv_time, archive_time, csv_time / archive_time,
+            'match' if int(total * 100000000) == archive_total else 'DO NOT match'))
+
+
+if __name__ == '__main__':
+    main()
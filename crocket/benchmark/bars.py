@@ -0,0 +1,120 @@
+"""
+Verify and time the streaming BarBuilder.
+
+Trades of simulated markets are polled every 5 seconds through process_data with a BarBuilder
+building 10s, 1m, 5m and 1h bars from the same trade stream. 1m bars are compared to the bars of
+process_data and all resolutions are compared to calculate_metrics_decimal on the raw trades of
+each bar.
+
+Run from the crocket directory:
+    python -m benchmark.bars
+"""
+from bisect import bisect_right
+from logging import getLogger
+from time import time
+
+from benchmark.polling import START_DATETIME, SimulatedExchange
+from bittrex.BittrexTrades import BittrexTrades
+from scraper_helper import calculate_metrics_decimal, process_data
+from utilities.BarBuilder import BarBuilder
+
+FIELDS = ('time', 'price', 'wprice', 'base_volume', 'buy_volume', 'sell_volume', 'buy_order', 'sell_order')
+
+
+def run(exchange, duration, resolutions, cycle_time=5):
+    """
+    Poll all markets of exchange through process_data with a BarBuilder
+    :return: (tuple) bars of process_data by (market, time), bars of BarBuilder by resolution and (market, time)
+    """
+
+    logger = getLogger('benchmark')
+    markets = exchange.markets
+    bar_builder = BarBuilder(resolutions=resolutions)
+
+    working_data = {}
+    market_datetime = {k: START_DATETIME for k in markets}
+    last_price = {k: 0 for k in markets}
+    weighted_price = {k: 0 for k in markets}
+
+    bars = {}
+    builder_bars = {x: {} for x in resolutions}
+    now = START_DATETIME.timestamp()
+
+    while now < START_DATETIME.timestamp() + duration:
+        response_dict = {x: exchange.get_market_history(x, now) for x in markets}
+
+        working_data, market_datetime, last_price, weighted_price, entries = \
+            process_data(response_dict, working_data, market_datetime, last_price, weighted_price, logger,
+                         bar_builder=bar_builder)
+
+        for market, market_entries in entries.items():
+            for entry in market_entries:
+                bars[(market, entry.get('time'))] = entry
+
+        for resolution, resolution_entries in bar_builder.pop_entries().items():
+            for market, market_entries in resolution_entries.items():
+                for entry in market_entries:
+                    builder_bars[resolution][(market, entry.get('time'))] = entry
+
+        now += cycle_time
+
+    return bars, builder_bars
+
+
+def count_mismatches(expected_bars, actual_bars):
+
+    common = set(expected_bars) & set(actual_bars)
+
+    return len(common), len([x for x in common
+                             if any(str(expected_bars[x].get(y)) != str(actual_bars[x].get(y)) for y in FIELDS)])
+
+
+def main(num_markets=50, duration=7200, resolutions=(10, 60, 300, 3600)):
+
+    exchange = SimulatedExchange(num_markets=num_markets, duration=duration)
+
+    bars, builder_bars = run(exchange, duration, resolutions)
+
+    print('1m bars: {} compared with process_data, {} mismatches.'.format(*count_mismatches(bars, builder_bars[60])))
+
+    # Reference bars from raw trades
+    for resolution in resolutions:
+        reference = {}
+
+        for (market, _), entry in builder_bars[resolution].items():
+            start = entry.get('datetime').timestamp()
+            times = exchange.trade_times[market]
+            data = exchange.histories[market][bisect_right(times, start):bisect_right(times, start + resolution)]
+
+            if data:
+                reference[(market, entry.get('time'))] = calculate_metrics_decimal(data[::-1], entry.get('datetime'))
+
+        print('{}s bars: {} with trades compared with calculate_metrics_decimal, {} mismatches.'.format(
+            resolution, *count_mismatches(reference, builder_bars[resolution])))
+
+    # Throughput of the accumulators
+    columns = []
+
+    for market in exchange.markets:
+        trades = BittrexTrades(market=market, trades=exchange.histories[market][::-1], capacity=16)
+        columns.append((market, trades.get_latest(len(trades))))
+
+    num_trades = sum(len(x[1][0]) for x in columns)
+
+    for resolution_set in ((60,), resolutions):
+        bar_builder = BarBuilder(resolutions=resolution_set)
+
+        start = time()
+
+        for market, market_columns in columns:
+            bar_builder.start(market, START_DATETIME)
+            bar_builder.add_trades(market, *market_columns)
+
+        run_time = time() - start
+
+        print('BarBuilder {}: {} trades in {:.3f}s ({:.0f} trades/s).'.format(
+            resolution_set, num_trades, run_time, num_trades / run_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Benchmark fetch latency of a full scraper cycle against a local stand-in for Bittrex and the proxies.
+
+The stand-in listens on one port per proxy, answers getmarkethistory requests (absolute URLs, as sent
+to an HTTP proxy) after a fixed latency and supports keep-alive connections. Some proxies can be made
+slow or dead to compare shuffled proxies with the adaptive ProxyPool.
+
+Run from the crocket directory:
+    python -m benchmark.fetch
+"""
+from asyncio import CancelledError, all_tasks, current_task, gather, new_event_loop, run_coroutine_threadsafe, sleep as async_sleep, \
+    start_server
+from json import dumps
+from os.path import dirname, join, realpath
+from random import shuffle
+from threading import Event, Thread
+from time import time
+
+from requests_futures.sessions import FuturesSession
+
+from benchmark.synthetic import generate_trades
+from scraper_helper import get_data, get_data_async
+from utilities.async_network import AsyncSession
+from utilities.ProxyPool import ProxyPool
+
+MARKETS_LIST_PATH = join(dirname(dirname(dirname(realpath(__file__)))), 'markets.txt')
+
+
+class StandInServer:
+    """
+    Local HTTP server answering getmarkethistory requests on several ports
+    """
+
+    def __init__(self, num_ports=200, latency=0.05, num_slow=0, num_dead=0, slow_latency=2.0):
+
+        self.num_ports = num_ports
+        self.latency = latency
+        self.num_slow = num_slow
+        self.num_dead = num_dead
+        self.slow_latency = slow_latency
+        self.slow_ports = set()
+        self.dead_ports = set()
+        self.ports = []
+        self.servers = []
+        self.connections = 0
+        self.requests = 0
+
+        body = dumps({'success': True, 'message': '', 'result': generate_trades(100)}).encode('utf-8')
+        self.response = b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: ' + \
+                        str(len(body)).encode('latin-1') + b'\r\n\r\n' + body
+
+        self._loop = new_event_loop()
+        self._started = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    async def _handle(self, reader, writer):
+
+        self.connections += 1
+
+        port = writer.get_extra_info('sockname')[1]
+        latency = self.slow_latency if port in self.slow_ports else self.latency
+
+        if port in self.dead_ports:
+            writer.close()
+            return
+
+        try:
+            while True:
+                request_line = await reader.readline()
+
+                if not request_line:
+                    break
+
+                while await reader.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+
+                self.requests += 1
+
+                await async_sleep(latency)
+
+                writer.write(self.response)
+                await writer.drain()
+        except (CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+
+        for _ in range(self.num_ports):
+            server = self._loop.run_until_complete(start_server(self._handle, '127.0.0.1', 0, backlog=1024))
+            self.servers.append(server)
+            self.ports.append(server.sockets[0].getsockname()[1])
+
+        self.slow_ports = set(self.ports[:self.num_slow])
+        self.dead_ports = set(self.ports[self.num_slow:self.num_slow + self.num_dead])
+
+        self._started.set()
+        self._loop.run_forever()
+
+    def start(self):
+
+        self._thread.start()
+        self._started.wait()
+
+        return self
+
+    async def _shutdown(self):
+
+        for server in self.servers:
+            server.close()
+
+        tasks = [x for x in all_tasks() if x is not current_task()]
+
+        for task in tasks:
+            task.cancel()
+
+        await gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+
+        run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class StandInBittrex:
+    """
+    Returns request input for getmarkethistory (same as Bittrex with dispatch=return_request_input)
+    """
+
+    def get_market_history(self, market):
+
+        return {'url': 'http://bittrex.local/api/v1.1/public/getmarkethistory?market={}'.format(market),
+                'apisign': '0' * 128}
+
+
+def run_cycles(get_function, session, markets, proxies, num_cycles, proxy_pool=None):
+    """
+    Run fetch cycles
+    :return: (tuple) duration of each cycle, number of markets fetched in each cycle
+    """
+
+    proxy_indexes = list(range(len(proxies)))
+    durations = []
+    fetched = []
+
+    for _ in range(num_cycles):
+        shuffle(proxy_indexes)
+        start = time()
+
+        response_dict = get_function(markets, StandInBittrex(), session, proxies, proxy_indexes,
+                                     proxy_pool=proxy_pool)
+
+        durations.append(time() - start)
+        fetched.append(len(response_dict))
+
+    return durations, fetched
+
+
+def main(num_cycles=8, latency=0.05, num_slow=20, num_dead=20):
+
+    with open(MARKETS_LIST_PATH, 'r') as f:
+        markets = f.read().splitlines()
+
+    server = StandInServer(latency=latency, num_slow=num_slow, num_dead=num_dead).start()
+    proxies = ['127.0.0.1:{}'.format(x) for x in server.ports]
+
+    print('{} markets, {} proxies ({} slow, {} dead), {:.0f}ms server latency, {} cycles'.format(
+        len(markets), len(proxies), num_slow, num_dead, latency * 1000, num_cycles))
+
+    engines = (('futures', get_data, lambda: FuturesSession(max_workers=20), None),
+               ('asyncio', get_data_async, lambda: AsyncSession(timeout=3), None),
+               ('adaptive', get_data_async, lambda: AsyncSession(timeout=3), ProxyPool(proxies)))
+
+    try:
+        for name, get_function, create_session, proxy_pool in engines:
+            connections = server.connections
+
+            with create_session() as session:
+                durations, fetched = run_cycles(get_function, session, markets, proxies, num_cycles, proxy_pool)
+
+            print('{:>8}: first cycle {:.3f}s, mean of next cycles {:.3f}s, {:.1f} markets fetched per cycle, '
+                  '{} connections opened'.format(name, durations[0], sum(durations[1:]) / max(len(durations) - 1, 1),
+                                                 sum(fetched[1:]) / max(len(fetched) - 1, 1),
+                                                 server.connections - connections))
+
+            if proxy_pool:
+                print(proxy_pool.summary())
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
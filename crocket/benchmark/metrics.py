@@ -0,0 +1,75 @@
+"""
+Compare the satoshi and Decimal implementations of calculate_metrics.
+
+Run from the crocket directory:
+    python -m benchmark.metrics
+"""
+from datetime import datetime
+from random import Random
+from timeit import timeit
+
+from benchmark.synthetic import generate_trades
+from scraper_helper import calculate_metrics, calculate_metrics_decimal
+
+
+def generate_intervals(num_intervals, seed=0):
+    """
+    Generate intervals of trades with sizes typical of the scraper (mostly small, some bursts).
+    :param num_intervals: Number of intervals
+    :param seed: Random seed
+    :return: (list(list(dict)))
+    """
+
+    rng = Random(seed)
+
+    intervals = []
+
+    for index in range(num_intervals):
+        num_trades = int(rng.paretovariate(1.2)) - 1
+        intervals.append(generate_trades(min(num_trades, 2000), seed=seed + index))
+
+    # Edge cases: zero volume, unrounded totals and exact half satoshi values
+    intervals.append([{'Id': 1, 'TimeStamp': '2017-11-17T04:22:46.39', 'Quantity': 1.5e-07, 'Price': 0.00021798,
+                       'Total': 0.0, 'FillType': 'PARTIAL_FILL', 'OrderType': 'BUY'}])
+    intervals.append([{'Price': x, 'Total': x * 3.3, 'OrderType': 'BUY'} for x in (0.1 / 3, 0.2 / 3, 0.001953125)])
+    intervals.append([{'Price': x, 'Total': 0.1, 'OrderType': y} for x, y in ((1e-6, 'BUY'), (1.01e-6, 'SELL'))])
+
+    return intervals
+
+
+def verify(intervals, start_datetime):
+    """
+    Check that both implementations produce identical metrics.
+    :return: (int) Number of intervals checked
+    """
+
+    for data in intervals:
+        expected = calculate_metrics_decimal(data, start_datetime)
+        actual = calculate_metrics(data, start_datetime)
+
+        for key, value in expected.items():
+            if type(value) is not type(actual[key]) or str(value) != str(actual[key]):
+                raise AssertionError('Mismatch for {}: {} != {}'.format(key, actual[key], value))
+
+    return len(intervals)
+
+
+def main(num_intervals=2000, repeat=3):
+
+    start_datetime = datetime.now().astimezone(tz=None)
+    intervals = generate_intervals(num_intervals)
+
+    print('Verified {} intervals: identical output.'.format(verify(intervals, start_datetime)))
+
+    num_trades = sum(len(x) for x in intervals)
+
+    for name, function in (('decimal', calculate_metrics_decimal), ('satoshi', calculate_metrics)):
+        elapsed = min(timeit(lambda: [function(x, start_datetime) for x in intervals], number=1)
+                      for _ in range(repeat))
+
+        print('{:>8}: {:.3f}s for {} intervals ({} trades), {:.0f} trades/s'.format(
+            name, elapsed, len(intervals), num_trades, num_trades / elapsed))
+
+
+if __name__ == '__main__':
+    main()
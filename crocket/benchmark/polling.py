@@ -0,0 +1,262 @@
+"""
+Benchmark request volume and bar latency of fixed-cadence polling against the PollScheduler
+and summary-first change detection.
+
+Markets trade with rates spread from a few trades per hour to several trades per second. The
+simulation runs on a virtual clock through the scraper's fetch functions: an AsyncSession transport
+answers getmarkethistory with the latest 100 trades of a market up to the current time and
+getmarketsummaries with the last price and cumulative volume of all markets. Bars emitted by all
+modes are compared.
+
+Run from the crocket directory:
+    python -m benchmark.polling
+"""
+from datetime import datetime, timezone
+from itertools import accumulate
+from json import dumps
+from logging import getLogger
+from random import Random
+from urllib.parse import parse_qs, urlsplit
+
+from numpy import median
+
+from benchmark.synthetic import generate_trades
+from bittrex.bittrex2 import Bittrex, return_request_input
+from scraper_helper import get_data_async, get_data_summary_first, process_data
+from utilities.async_network import AsyncSession
+from utilities.PollScheduler import PollScheduler
+from utilities.time import convert_bittrex_timestamp_to_epoch, format_time
+
+START_DATETIME = datetime(2018, 1, 1, tzinfo=timezone.utc)
+HISTORY_LENGTH = 100
+
+
+class SimulatedExchange:
+    """
+    Trade histories of several markets, returned as seen at a point in time
+    """
+
+    def __init__(self, num_markets=199, duration=3600, min_rate=1 / 1200, max_rate=3, seed=0):
+
+        rng = Random(seed)
+
+        self.histories = {}
+        self.trade_times = {}
+        self.volumes = {}
+        self.rates = {}
+
+        for index in range(num_markets):
+            market = 'BTC-{:03d}'.format(index)
+            rate = min_rate * (max_rate / min_rate) ** rng.random()
+
+            trades = generate_trades(int(rate * duration * 1.5) + 20,
+                                     start_id=1000000 * index,
+                                     start_datetime=START_DATETIME.replace(tzinfo=None),
+                                     seed=index,
+                                     mean_interval=1 / rate)
+
+            # Oldest first
+            trades.reverse()
+
+            self.histories[market] = trades
+            self.trade_times[market] = [convert_bittrex_timestamp_to_epoch(x.get('TimeStamp')) / 1000000
+                                        for x in trades]
+            self.volumes[market] = list(accumulate(x.get('Quantity') for x in trades))
+            self.rates[market] = rate
+
+    @property
+    def markets(self):
+
+        return list(self.histories)
+
+    def _count_trades(self, market, now):
+        """
+        Number of trades of market up to now
+        """
+
+        times = self.trade_times.get(market)
+        low, high = 0, len(times)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if times[middle] <= now:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def get_market_history(self, market, now):
+        """
+        Get latest trades of market up to now
+        :param market:
+        :param now: Seconds since epoch
+        :return: (list(dict)) Market history (newest first)
+        """
+
+        count = self._count_trades(market, now)
+
+        return self.histories[market][max(0, count - HISTORY_LENGTH):count][::-1]
+
+    def get_market_summaries(self, now):
+        """
+        Get last price and volume of all markets up to now
+        :param now: Seconds since epoch
+        :return: (list(dict))
+        """
+
+        timestamp = format_time(datetime.fromtimestamp(now, tz=timezone.utc), '%Y-%m-%dT%H:%M:%S.%f')[:-3]
+        summaries = []
+
+        for market in self.histories:
+            count = self._count_trades(market, now)
+
+            summaries.append({'MarketName': market,
+                              'Last': self.histories[market][count - 1].get('Price') if count else None,
+                              'Volume': self.volumes[market][count - 1] if count else 0,
+                              'BaseVolume': 0,
+                              'TimeStamp': timestamp})
+
+        return summaries
+
+
+class SimulatedTransport:
+    """
+    AsyncSession transport answering Bittrex API calls from a SimulatedExchange at a virtual time
+    """
+
+    def __init__(self, exchange):
+
+        self.exchange = exchange
+        self.now = 0
+        self.requests = 0
+
+    async def get(self, url, headers=None, proxy=None):
+
+        self.requests += 1
+
+        parts = urlsplit(url)
+
+        if parts.path.endswith('getmarketsummaries'):
+            result = self.exchange.get_market_summaries(self.now)
+        else:
+            result = self.exchange.get_market_history(parse_qs(parts.query).get('market')[0], self.now)
+
+        return 200, dumps({'success': True, 'message': '', 'result': result}).encode('utf-8')
+
+    async def close(self):
+
+        pass
+
+
+def simulate(exchange, duration, scheduler=None, summary_first=False, cycle_time=5, tick=1):
+    """
+    Run scraper cycles on a virtual clock
+    :param exchange: SimulatedExchange
+    :param duration: Seconds to simulate
+    :param scheduler: PollScheduler (polls all markets every cycle_time seconds if None)
+    :param summary_first: Fetch market history only for markets whose summary changed
+    :param cycle_time: Duration between cycles of fixed-cadence polling
+    :param tick: Minimum duration between cycles with the scheduler
+    :return: (tuple) bars by (market, time), latency of each bar in seconds, number of requests
+    """
+
+    logger = getLogger('benchmark')
+    start = START_DATETIME.timestamp()
+
+    bittrex = Bittrex(api_key=None, api_secret=None, dispatch=return_request_input, api_version='v1.1')
+    transport = SimulatedTransport(exchange)
+    session = AsyncSession(transport=transport)
+    markets = exchange.markets
+    proxies = ['127.0.0.1:8080']
+    proxy_indexes = [0] * len(markets)
+
+    working_data = {}
+    summaries = {}
+    histories = {}
+    market_datetime = {k: START_DATETIME for k in markets}
+    last_price = {k: 0 for k in markets}
+    weighted_price = {k: 0 for k in markets}
+
+    bars = {}
+    latencies = {}
+    now = start
+
+    with session:
+
+        while now < start + duration:
+            transport.now = now
+
+            if scheduler:
+                poll_markets = scheduler.get_due_markets(market_datetime, now=now)
+                complete_datetime = datetime.fromtimestamp(now - scheduler.grace, tz=timezone.utc)
+            else:
+                poll_markets = markets
+                complete_datetime = None
+
+            if summary_first:
+                response_dict, _ = get_data_summary_first(poll_markets, bittrex, session, proxies, proxy_indexes,
+                                                          summaries, histories, logger=logger)
+            else:
+                response_dict = get_data_async(poll_markets, bittrex, session, proxies, proxy_indexes,
+                                               logger=logger)
+
+            if scheduler:
+                scheduler.record_polls(poll_markets, response_dict, now=now)
+
+            working_data, market_datetime, last_price, weighted_price, entries = \
+                process_data(response_dict, working_data, market_datetime, last_price, weighted_price, logger,
+                             complete_datetime=complete_datetime)
+
+            for market, market_entries in entries.items():
+                for entry in market_entries:
+                    bar_time = entry.get('datetime').timestamp()
+
+                    bars[(market, bar_time)] = entry
+                    latencies[(market, bar_time)] = now - (bar_time + 60)
+
+            if scheduler:
+                now = max(now + tick, min(scheduler.get_next_poll_time(market_datetime), now + cycle_time))
+            else:
+                now += cycle_time
+
+    return bars, latencies, transport.requests
+
+
+def summarize(name, exchange, bars, latencies, num_requests, duration):
+
+    hot = [k for k in latencies if exchange.rates.get(k[0]) >= 0.1]
+    cold = [k for k in latencies if exchange.rates.get(k[0]) < 0.1]
+
+    print('{}: {} requests ({:.0f}/min), {} bars, median bar latency {:.1f}s (active markets), '
+          '{:.1f}s (quiet markets)'.format(name, num_requests, num_requests / duration * 60, len(bars),
+                                            median([latencies[x] for x in hot]),
+                                            median([latencies[x] for x in cold])))
+
+
+def main(num_markets=199, duration=1800):
+
+    exchange = SimulatedExchange(num_markets=num_markets, duration=duration)
+
+    results = {}
+
+    for name, scheduler, summary_first in (('fixed', None, False),
+                                           ('summary first', None, True),
+                                           ('scheduled', PollScheduler(exchange.markets), False),
+                                           ('scheduled, summary first', PollScheduler(exchange.markets), True)):
+
+        results[name] = simulate(exchange, duration, scheduler=scheduler, summary_first=summary_first)
+        summarize(name, exchange, *results[name], duration)
+
+    fixed_bars = results.get('fixed')[0]
+
+    for name, (bars, _, _) in results.items():
+        common = set(fixed_bars) & set(bars)
+        mismatches = [x for x in common if fixed_bars[x] != bars[x]]
+
+        print('{}: {} bars in common with fixed, {} mismatches.'.format(name, len(common), len(mismatches)))
+
+
+if __name__ == '__main__':
+    main()
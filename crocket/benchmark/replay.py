@@ -0,0 +1,124 @@
+"""
+Verify and time recording and replay of scraper cycles.
+
+Simulated markets are scraped with the PollScheduler and summary-first change detection while a
+ResponseRecorder records the raw responses and emitted bars of each cycle. The recording is then
+replayed through get_data_async and process_data as fast as possible and the replayed bars are
+compared to the recorded bars.
+
+Run from the crocket directory:
+    python -m benchmark.replay
+"""
+from datetime import datetime, timezone
+from decimal import Decimal
+from logging import getLogger
+from os import listdir
+from os.path import getsize, join
+from tempfile import TemporaryDirectory
+from time import time
+
+from benchmark.polling import START_DATETIME, SimulatedExchange, SimulatedTransport
+from bittrex.bittrex2 import Bittrex, return_request_input
+from scraper_helper import get_data_async, get_data_summary_first, process_data, replay_cycles
+from utilities.async_network import AsyncSession
+from utilities.constants import BittrexConstants
+from utilities.PollScheduler import PollScheduler
+from utilities.ResponseRecorder import ResponseRecorder, read_cycles
+
+
+def record(exchange, duration, directory, cycle_time=5, tick=1):
+    """
+    Scrape all markets of exchange on a virtual clock, recording each cycle
+    :return: (int) Number of bars emitted
+    """
+
+    logger = getLogger('benchmark')
+    start = START_DATETIME.timestamp()
+
+    bittrex = Bittrex(api_key=None, api_secret=None, dispatch=return_request_input, api_version='v1.1')
+    transport = SimulatedTransport(exchange)
+    session = AsyncSession(transport=transport)
+    scheduler = PollScheduler(exchange.markets)
+    recorder = ResponseRecorder(directory, START_DATETIME)
+    markets = exchange.markets
+    proxies = ['127.0.0.1:8080']
+    proxy_indexes = [0] * len(markets)
+
+    working_data = {}
+    summaries = {}
+    histories = {}
+    market_datetime = {k: START_DATETIME for k in markets}
+    last_price = {k: Decimal(0).quantize(BittrexConstants.DIGITS) for k in markets}
+    weighted_price = {k: Decimal(0).quantize(BittrexConstants.DIGITS) for k in markets}
+
+    num_bars = 0
+    now = start
+
+    with session:
+
+        while now < start + duration:
+            transport.now = now
+
+            poll_markets = scheduler.get_due_markets(market_datetime, now=now)
+            complete_datetime = datetime.fromtimestamp(now - scheduler.grace, tz=timezone.utc)
+
+            response_dict, _ = get_data_summary_first(poll_markets, bittrex, session, proxies, proxy_indexes,
+                                                      summaries, histories,
+                                                      logger=logger,
+                                                      recorder=recorder)
+
+            scheduler.record_polls(poll_markets, response_dict, now=now)
+
+            working_data, market_datetime, last_price, weighted_price, entries = \
+                process_data(response_dict, working_data, market_datetime, last_price, weighted_price, logger,
+                             complete_datetime=complete_datetime)
+
+            recorder.write_cycle(now, response_dict, entries, complete_datetime=complete_datetime)
+            num_bars += sum(len(x) for x in entries.values())
+
+            now = max(now + tick, min(scheduler.get_next_poll_time(market_datetime), now + cycle_time))
+
+    recorder.close()
+
+    return num_bars
+
+
+def main(num_markets=199, duration=1800):
+
+    exchange = SimulatedExchange(num_markets=num_markets, duration=duration)
+
+    with TemporaryDirectory() as directory:
+
+        start = time()
+        num_bars = record(exchange, duration, directory)
+        record_time = time() - start
+
+        size = sum(getsize(join(directory, x)) for x in listdir(directory))
+
+        print('Recorded {}s of {} markets ({} bars) in {:.2f}s, {:.2f} MB.'.format(
+            duration, num_markets, num_bars, record_time, size / 1e6))
+
+        num_cycles = 0
+        num_replayed = 0
+        num_trades = 0
+        mismatches = 0
+
+        start = time()
+
+        for cycle, entries in replay_cycles(read_cycles(directory)):
+            num_cycles += 1
+            mismatches += entries != cycle.get('bars')
+
+            for market_entries in entries.values():
+                num_replayed += len(market_entries)
+                num_trades += sum(int(x[6]) + int(x[7]) for x in market_entries)
+
+        replay_time = time() - start
+
+    print('Replayed {} cycles ({} bars, {} trades) in {:.2f}s ({:.0f} trades/s, {:.0f}x real time), '
+          '{} cycles with mismatches.'.format(num_cycles, num_replayed, num_trades, replay_time,
+                                              num_trades / replay_time, duration / replay_time, mismatches))
+
+
+if __name__ == '__main__':
+    main()
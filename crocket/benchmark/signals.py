@@ -0,0 +1,111 @@
+"""
+Verify that run_algorithm, evaluating signals on satoshi units, makes the same buy and sell decisions
+as the Decimal run_algorithm of earlier versions over recorded history.
+
+Bars of the markets of a BarArchive of price tables (see export_archive.py) are replayed through the
+tradebot loop with run_decimal_algorithm on lists of Decimals and with run_algorithm on BittrexData,
+for the default parameters and for short waits and holds (many signals). Bars with a wprice of 0 are
+skipped as by run_tradebot. Orders, including their Decimal quantities, must be identical: the run
+exits with status 1 if any case differs. Without an archive directory, synthetic bars are archived
+and replayed.
+
+Run from the crocket directory:
+    python -m benchmark.signals [archive directory]
+"""
+from datetime import timedelta
+from sys import argv, exit
+from tempfile import TemporaryDirectory
+
+from numpy import asarray, int64
+
+from benchmark.tradebot import ListData, make_bars, run, run_decimal_algorithm
+from bittrex.BittrexData import BittrexData
+from utilities.BarArchive import EPOCH_NAIVE, BarArchive
+from utilities.constants import OrderType
+from utilities.satoshi import from_satoshi, to_satoshi
+
+COLUMNS = ('wprice', 'buy_volume', 'sell_volume')
+
+LOOKBACK = 65
+
+CASES = [('default', {}),
+         ('short waits', {'wait_time': 600, 'max_hold_time': 3600}),
+         ('loose volume lags', {'wait_time': 600, 'max_hold_time': 3600,
+                                'buy_volume_lag_min': 0, 'sell_volume_lag_min': 0, 'price_lag_threshold': 0.2})]
+
+
+def load_bars(archive):
+    """
+    Load bars of every market of archive
+    :return: (dict) List of (datetime, wprice, buy_volume, sell_volume) per market
+    """
+
+    bars = {}
+
+    for market in archive.get_markets():
+        arrays = archive.open(market, columns=['time'] + list(COLUMNS))
+
+        bars[market] = [((EPOCH_NAIVE + timedelta(microseconds=int(x[0]))).astimezone(tz=None),
+                         *(from_satoshi(y) for y in x[1:]))
+                        for x in zip(*(arrays[y].tolist() for y in ('time',) + COLUMNS)) if x[1] > 0]
+
+    return bars
+
+
+def archive_bars(archive, bars):
+    """
+    Archive synthetic bars of benchmark.tradebot
+    """
+
+    for market, market_bars in bars.items():
+        arrays = {'time': asarray([(x[0].replace(tzinfo=None) - EPOCH_NAIVE) // timedelta(microseconds=1)
+                                   for x in market_bars], dtype=int64)}
+
+        for index, column in enumerate(COLUMNS, 1):
+            arrays[column] = asarray([to_satoshi(x[index]) for x in market_bars], dtype=int64)
+
+        archive.append(market, arrays)
+
+
+def replay(archive):
+    """
+    Replay bars of archive with both algorithms for every case
+    :return: (bool) Orders identical in all cases
+    """
+
+    bars = load_bars(archive)
+    identical = True
+
+    print('replay: {} bars of {} markets.'.format(sum(len(x) for x in bars.values()), len(bars)))
+
+    for name, parameters in CASES:
+        decimal_orders, _ = run(bars, ListData, LOOKBACK, run_decimal_algorithm, **parameters)
+        orders, _ = run(bars, lambda x: BittrexData(market=x, capacity=LOOKBACK + 1), LOOKBACK, **parameters)
+
+        print('{}: {} buy and {} sell orders, {}.'.format(
+            name, sum(x.get('type') == OrderType.BUY.name for x in orders),
+            sum(x.get('type') == OrderType.SELL.name for x in orders),
+            'identical' if orders == decimal_orders else 'DIFFERENT'))
+
+        identical = identical and orders == decimal_orders
+
+    return identical
+
+
+def main(directory=None):
+
+    if directory is not None:
+        identical = replay(BarArchive(directory))
+    else:
+        with TemporaryDirectory() as directory:
+            archive = BarArchive(directory)
+            archive_bars(archive, make_bars(50, 3 * 1440, seed=2))
+
+            identical = replay(archive)
+
+    if not identical:
+        exit('signals: orders of run_algorithm differ from run_decimal_algorithm.')
+
+
+if __name__ == '__main__':
+    main(*argv[1:])
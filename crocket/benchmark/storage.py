@@ -0,0 +1,162 @@
+"""
+Compare ingest and read throughput of the storage backends on the same synthetic workload.
+
+One minute bar per market is inserted per scraper cycle with insert_transaction_query into one
+price table per market. Each market's rows are then read back for the whole period with
+select_range (Decimal and datetime tuples) and read_range_arrays (NumPy columns), and the satoshi
+sum of prices read is checked against the prices inserted. Each backend runs with DECIMAL and with
+satoshi (BIGINT) price storage.
+
+SQLite runs in a temporary directory. MySQL runs against a scratch database on localhost if
+MySQLdb and the credentials of run_server are available, and is skipped otherwise.
+
+Run from the crocket directory:
+    python -m benchmark.storage
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from os import environ
+from os.path import getsize, join
+from random import Random
+from tempfile import TemporaryDirectory
+from time import time
+
+from sql.backend import PRICE_COLUMNS, get_database
+from utilities.satoshi import to_satoshi
+
+START_DATETIME = datetime(2018, 1, 1)
+
+DIGITS = Decimal(10) ** -8
+
+
+def make_cycles(num_markets, num_minutes, seed=0):
+    """
+    Make one bar per market per minute
+    :return: (list) Rows tuple(table, columns, values) per cycle
+    """
+
+    random = Random(seed)
+    markets = ['BTC-{:03d}'.format(x) for x in range(num_markets)]
+    prices = {x: Decimal(random.uniform(0.00001, 0.01)).quantize(DIGITS) for x in markets}
+    columns = ('time',) + PRICE_COLUMNS
+    cycles = []
+
+    for minute in range(num_minutes):
+        time_string = '{:%Y-%m-%d %H:%M:%S}'.format(START_DATETIME + timedelta(minutes=minute))
+        rows = []
+
+        for market in markets:
+            prices[market] = (prices[market] * Decimal(1 + random.gauss(0, 0.002))).quantize(DIGITS)
+            buy_volume = Decimal(random.uniform(0, 2)).quantize(DIGITS)
+            sell_volume = Decimal(random.uniform(0, 2)).quantize(DIGITS)
+
+            rows.append((market, columns, (time_string, prices[market], prices[market], buy_volume + sell_volume,
+                                           buy_volume, sell_volume, random.randint(0, 50), random.randint(0, 50))))
+
+        cycles.append(rows)
+
+    return markets, cycles
+
+
+def run(db, markets, cycles, price_storage='decimal'):
+    """
+    Insert cycles and read each market back
+    :return: (dict) Seconds per stage and satoshi sum of prices read
+    """
+
+    db.initialize_schema(price_storage)
+
+    for market in markets:
+        db.create_price_table(market)
+
+    start = time()
+
+    for rows in cycles:
+        if not db.insert_transaction_query(rows):
+            raise RuntimeError('Insert rejected by {}.'.format(type(db).__name__))
+
+    ingest_time = time() - start
+    end_datetime = START_DATETIME + timedelta(minutes=len(cycles))
+
+    start = time()
+
+    for market in markets:
+        db.select_range(market, ['time', 'price', 'base_volume'], START_DATETIME, end_datetime)
+
+    select_time = time() - start
+
+    if [x[0] for x in db.select_range(markets[0], ['price'], START_DATETIME, end_datetime)] != \
+            [x[0][2][1] for x in cycles]:
+        raise RuntimeError('Prices read by select_range differ from prices inserted.')
+
+    start = time()
+    price_sum = 0
+
+    for market in markets:
+        arrays = db.read_range_arrays(market, ['time', 'price', 'base_volume'], START_DATETIME, end_datetime,
+                                      prices='satoshi')
+        price_sum += int(arrays['price'].sum())
+
+    array_time = time() - start
+
+    return {'ingest': ingest_time, 'select': select_time, 'arrays': array_time, 'price_sum': price_sum}
+
+
+def open_mysql(database_name):
+    """
+    Open a scratch MySQL database (None if MySQLdb or credentials are unavailable)
+    """
+
+    try:
+        from utilities.credentials import get_credentials
+
+        username, password = get_credentials(join(environ['HOME'], '.credentials_unlocked.json'))
+
+        db = get_database('mysql', 'develop', hostname='localhost', username=username, password=password)
+        db.execute_query('DROP DATABASE IF EXISTS {}'.format(database_name))
+        db.create_database(database_name)
+        db.close()
+
+        return get_database('mysql', database_name, hostname='localhost', username=username, password=password)
+
+    except Exception as e:
+        print('mysql: skipped ({}).'.format(e))
+
+
+def main(num_markets=50, num_minutes=1440):
+
+    markets, cycles = make_cycles(num_markets, num_minutes)
+    num_rows = num_markets * num_minutes
+    expected_sum = sum(to_satoshi(x[2][1]) for rows in cycles for x in rows)
+
+    with TemporaryDirectory() as directory:
+        for price_storage in ('decimal', 'satoshi'):
+            database_name = 'benchmark_storage_' + price_storage
+
+            backends = [('sqlite', get_database('sqlite', database_name, directory=directory)),
+                        ('mysql', open_mysql(database_name))]
+
+            for backend, db in backends:
+                if db is None:
+                    continue
+
+                name = '{} {}'.format(backend, price_storage)
+                result = run(db, markets, cycles, price_storage)
+
+                print('{}: ingest {} rows in {} transactions in {:.2f}s ({:.0f} rows/s).'.format(
+                    name, num_rows, len(cycles), result['ingest'], num_rows / result['ingest']))
+                print('{}: select_range {:.2f}s ({:.0f} rows/s), read_range_arrays {:.2f}s ({:.0f} rows/s).'.format(
+                    name, result['select'], num_rows / result['select'], result['arrays'],
+                    num_rows / result['arrays']))
+                print('{}: prices read {} inserted.'.format(
+                    name, 'match' if result['price_sum'] == expected_sum else 'DO NOT match'))
+
+                if backend == 'sqlite':
+                    db.execute_query('PRAGMA wal_checkpoint(TRUNCATE)')
+                    print('{}: {:.0f} bytes per row.'.format(name, getsize(db.path) / num_rows))
+
+                db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from random import Random
+
+from utilities.time import format_time
+
+BITTREX_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def generate_trades(num_trades, start_id=1, start_datetime=datetime(2018, 1, 1), seed=0,
+                    base_price=0.0002,
+                    mean_interval=1.0):
+    """
+    Generate synthetic getmarkethistory results (newest first).
+    :param num_trades: Number of trades
+    :param start_id: Id of the oldest trade
+    :param start_datetime: Timestamp of the oldest trade (UTC)
+    :param seed: Random seed
+    :param base_price: Starting price
+    :param mean_interval: Mean seconds between trades
+    :return: (list(dict))
+    """
+
+    rng = Random(seed)
+
+    trades = []
+    price = base_price
+    current_datetime = start_datetime
+
+    for index in range(num_trades):
+        price = round(max(price * (1 + rng.gauss(0, 0.002)), 1e-8), 8)
+        quantity = round(rng.expovariate(1 / 500), 8)
+
+        timestamp = format_time(current_datetime, BITTREX_TIME_FORMAT)[:-4]
+
+        # Bittrex drops trailing zeros and the fractional part when it is zero
+        timestamp = timestamp.rstrip('0').rstrip('.')
+
+        trades.append({'Id': start_id + index,
+                       'TimeStamp': timestamp,
+                       'Quantity': quantity,
+                       'Price': price,
+                       'Total': round(price * quantity, 8),
+                       'FillType': rng.choice(('FILL', 'PARTIAL_FILL')),
+                       'OrderType': rng.choice(('BUY', 'SELL'))})
+
+        current_datetime += timedelta(seconds=rng.expovariate(1 / mean_interval))
+
+    trades.reverse()
+
+    return trades
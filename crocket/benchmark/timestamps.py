@@ -0,0 +1,63 @@
+"""
+Compare the fast Bittrex timestamp parser with the strptime path.
+
+Run from the crocket directory:
+    python -m benchmark.timestamps
+"""
+from datetime import timezone
+from timeit import timeit
+
+from benchmark.synthetic import generate_trades
+from utilities.time import convert_bittrex_timestamp_to_datetime, convert_bittrex_timestamp_to_datetime_strptime, \
+    convert_bittrex_timestamp_to_epoch, convert_bittrex_timestamp_to_local, convert_datetime_to_epoch, utc_to_local
+
+
+def strptime_to_local(timestamp):
+
+    return convert_bittrex_timestamp_to_datetime_strptime(timestamp).replace(tzinfo=timezone.utc).astimezone(tz=None)
+
+
+def fast_to_local(timestamp):
+
+    return utc_to_local(convert_bittrex_timestamp_to_datetime(timestamp))
+
+
+def verify(timestamps):
+    """
+    Check that fast and strptime paths give identical results.
+    :return: (int) Number of timestamps checked
+    """
+
+    for timestamp in timestamps:
+        expected = strptime_to_local(timestamp)
+        actual = fast_to_local(timestamp)
+
+        local = convert_bittrex_timestamp_to_local(timestamp)
+
+        if expected != actual or expected.utcoffset() != actual.utcoffset() or \
+                expected != local or expected.utcoffset() != local.utcoffset() or \
+                convert_bittrex_timestamp_to_epoch(timestamp) != convert_datetime_to_epoch(expected):
+            raise AssertionError('Mismatch for {}: {} != {}'.format(timestamp, actual, expected))
+
+    return len(timestamps)
+
+
+def main(num_timestamps=100000, repeat=3):
+
+    timestamps = [x.get('TimeStamp') for x in generate_trades(num_timestamps, mean_interval=300)]
+    timestamps += ['2016-02-29T23:59:59.999999', '2017-11-17T04:22:46', '2017-11-17T04:22:46.3', '1999-12-31T00:00:00.01']
+
+    print('Verified {} timestamps: identical output.'.format(verify(timestamps)))
+
+    for name, function in (('strptime', strptime_to_local),
+                           ('fast', fast_to_local),
+                           ('local', convert_bittrex_timestamp_to_local),
+                           ('epoch', convert_bittrex_timestamp_to_epoch)):
+        elapsed = min(timeit(lambda: [function(x) for x in timestamps], number=1) for _ in range(repeat))
+
+        print('{:>8}: {:.3f}s for {} timestamps, {:.2f}us per timestamp'.format(
+            name, elapsed, len(timestamps), elapsed / len(timestamps) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,454 @@
+"""
+Verify and time the tradebot's per-bar work.
+
+Bars of simulated markets go through the loop of run_tradebot: append the bar, clear the first bar
+once more than lookback bars are held, then run_algorithm. This runs once with the list-based
+BittrexData and run_algorithm of earlier versions (del list[0] per bar, window sums and means
+computed from slices per bar, signals evaluated on Decimals), once with the ring buffer and its
+RollingSums, and once in batch mode (BittrexMarketData and run_algorithm_batch), both evaluating
+signals on satoshi units. Buy orders complete immediately so sell signals run too, and the orders
+of all runs must be identical. Time per bar is compared for the default lag durations and for lags
+of most of a day of 1 minute bars, and time per scraper cycle for 199 and 2000 markets.
+
+Registered strategies then run side by side on one BittrexMarketData as in run_tradebot: the orders
+of each strategy must be those of the strategy running alone, and the cost per cycle of a second
+strategy sharing the bars is reported.
+
+Run from the crocket directory:
+    python -m benchmark.tradebot
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from logging import getLogger
+from random import Random
+from time import time
+
+from numpy import mean
+
+from bittrex.BittrexData import BittrexData
+from bittrex.BittrexMarketData import BittrexMarketData
+from bittrex.BittrexOrder import BittrexOrder
+from bittrex.BittrexStatus import DEFAULT_STOP_GAIN_PERCENT, BittrexStatus
+from strategies import get_strategy
+from trade_algorithm import run_algorithm, run_algorithm_batch
+from utilities.constants import BittrexConstants, OrderStatus, OrderType
+
+START_DATETIME = datetime(2018, 1, 1).astimezone(tz=None)
+
+AMOUNT_PER_CALL = Decimal('0.01')
+
+
+def run_decimal_algorithm(data, status, buy_amount, order_queue, logger,
+                          duration=1,
+                          price_lag_time=30,
+                          price_lag_duration=5,
+                          price_lag_threshold=0.05,
+                          volume_lag_duration=60,
+                          buy_volume_lag_min=10,
+                          buy_volume_lag_max=40,
+                          sell_volume_lag_min=10,
+                          sell_volume_lag_max=40,
+                          stop_loss_percent=0.01,
+                          stop_gain_increment=0.02,
+                          max_hold_time=14400,
+                          wait_time=14400):
+    """
+    run_algorithm of earlier versions, evaluating signals on Decimals of data (see ListData)
+    """
+
+    market = status.market
+    current_time = data.datetime[-1]
+    current_price = data.wprice[-1]
+
+    last_buy_time_difference = (current_time - status.last_buy_time).total_seconds()
+
+    # Action if haven't bought coin
+    if not status.bought:
+
+        # No action if purchased within time of last buy
+        if last_buy_time_difference < wait_time:
+            return
+
+        # Windows are updated with each bar by data, so their cost does not grow with the lag durations
+        sample_buy_volume_mean = data.get_window('buy_volume', duration).mean()
+        buy_volume_lag_total = data.get_window('buy_volume', volume_lag_duration, duration).total
+        sell_volume_lag_total = data.get_window('sell_volume', volume_lag_duration, duration).total
+
+        if sample_buy_volume_mean > 0 and \
+            buy_volume_lag_min < buy_volume_lag_total < buy_volume_lag_max and \
+                sell_volume_lag_min < sell_volume_lag_total < sell_volume_lag_max:
+
+            previous_price = Decimal(
+                data.get_window('wprice', price_lag_duration, duration + price_lag_time - price_lag_duration).mean()
+            ).quantize(BittrexConstants.DIGITS)
+
+            if sample_buy_volume_mean > 2 and \
+                    abs((current_price - previous_price) / previous_price) < price_lag_threshold:
+
+                target_quantity = (buy_amount / current_price).quantize(BittrexConstants.DIGITS)
+
+                order = {
+                    'market': market,
+                    'type': OrderType.BUY.name,
+                    'target_quantity': target_quantity,
+                    'base_quantity': buy_amount
+                }
+
+                logger.info('BUY:\n{}'.format(order))
+
+                order_queue.put(order)
+
+                status.bought = True
+                status.buy_signal = current_price
+                status.last_buy_time = current_time
+
+    # Action if have bought coin
+    else:
+
+        if status.buy_order.status != OrderStatus.COMPLETED.name:
+            logger.error('Tradebot: Checking sell order when buy order still in progress: {}.'.format(market))
+            return
+
+        buy_order = status.buy_order
+        current_buy_hold_time = (current_time - buy_order.closed_time).total_seconds()
+
+        if status.stop_gain_percent == DEFAULT_STOP_GAIN_PERCENT:
+            loss_threshold = 0
+        else:
+            loss_threshold = 0.01
+
+        current_stop_gain_threshold = (
+            status.buy_signal * Decimal(status.stop_gain_percent + 1)).quantize(BittrexConstants.DIGITS)
+        current_stop_gain_min_threshold = (
+            status.buy_signal * Decimal(status.stop_gain_percent - loss_threshold + 1)).quantize(
+            BittrexConstants.DIGITS)
+
+        next_stop_gain_threshold = (status.buy_signal * Decimal(
+            status.stop_gain_percent + stop_gain_increment + 1)).quantize(BittrexConstants.DIGITS)
+
+        # Activate stop gain signal after passing threshold percentage
+        if not status.stop_gain and current_price > current_stop_gain_threshold:
+            status.stop_gain = True
+        elif status.stop_gain and current_price > next_stop_gain_threshold:
+            status.stop_gain_percent = status.stop_gain_percent + stop_gain_increment
+
+        # Sell if hit stop loss
+        # Sell after passing max hold time
+        # Sell after detecting stop gain signal and price drop below stop gain price
+        if (current_price < (status.buy_signal * Decimal(1 - stop_loss_percent)).quantize(BittrexConstants.DIGITS)) or \
+                current_buy_hold_time > max_hold_time or \
+                (status.stop_gain and current_price < current_stop_gain_min_threshold):
+
+            target_quantity = buy_order.final_quantity
+
+            order = {
+                'market': market,
+                'type': OrderType.SELL.name,
+                'target_quantity': target_quantity,
+            }
+
+            logger.info('SELL:\n{}'.format(order))
+
+            order_queue.put(order)
+
+            status.bought = False
+            status.sell_signal = current_price
+            status.reset_stop_gain()
+
+
+class SliceWindow:
+    """
+    Window of run_algorithm of earlier versions: sum and mean of the window's slice computed per call
+    """
+
+    def __init__(self, values, length, offset):
+
+        self.values = values
+        self.length = length
+        self.offset = offset
+
+    def _slice(self):
+
+        size = len(self.values)
+
+        return self.values[max(size - self.offset - self.length, 0):max(size - self.offset, 0)]
+
+    @property
+    def total(self):
+
+        return sum(self._slice())
+
+    def mean(self):
+
+        return mean(self._slice())
+
+
+class ListData:
+    """
+    BittrexData of earlier versions: parallel lists, clear_first shifts every list
+    """
+
+    def __init__(self, market=None):
+
+        self.market = market
+        self.datetime = []
+        self.wprice = []
+        self.buy_volume = []
+        self.sell_volume = []
+
+    def get_window(self, column, length, offset=0):
+
+        return SliceWindow(getattr(self, column), length, offset)
+
+    def __len__(self):
+
+        return len(self.datetime)
+
+    def append(self, datetime, wprice, buy_volume, sell_volume):
+
+        self.datetime.append(datetime)
+        self.wprice.append(wprice)
+        self.buy_volume.append(buy_volume)
+        self.sell_volume.append(sell_volume)
+
+    def clear_first(self):
+
+        del self.datetime[0]
+        del self.wprice[0]
+        del self.buy_volume[0]
+        del self.sell_volume[0]
+
+
+class OrderQueue(list):
+
+    def put(self, order):
+
+        self.append(order)
+
+
+def make_bars(num_markets, num_bars, seed=0):
+    """
+    Make 1 minute bars per market with quiet volume, volume spikes and price jumps
+    :return: (dict) List of (datetime, wprice, buy_volume, sell_volume) per market
+    """
+
+    random = Random(seed)
+    bars = {}
+
+    for index in range(num_markets):
+        price = random.uniform(0.0001, 0.01)
+        market_bars = []
+
+        for minute in range(num_bars):
+            price *= 1 + random.gauss(0, 0.003) + (random.choice((-0.03, 0.04)) if random.random() < 0.005 else 0)
+            spike = random.random() < 0.02
+
+            market_bars.append((START_DATETIME + timedelta(minutes=minute),
+                                Decimal(price).quantize(BittrexConstants.DIGITS),
+                                Decimal(random.uniform(2, 6) if spike else random.expovariate(3)).quantize(
+                                    BittrexConstants.DIGITS),
+                                Decimal(random.expovariate(3)).quantize(BittrexConstants.DIGITS)))
+
+        bars['BTC-{:03d}'.format(index)] = market_bars
+
+    return bars
+
+
+def complete_orders(orders, statuses, closed_time):
+    """
+    Complete orders immediately at the bar's time
+    """
+
+    for order in orders:
+        status = statuses[order.get('market')]
+
+        if order.get('type') == OrderType.BUY.name:
+            status.buy_order = BittrexOrder(market=order.get('market'),
+                                            order_type=OrderType.BUY.name,
+                                            final_quantity=order.get('target_quantity'),
+                                            closed_time=closed_time,
+                                            status=OrderStatus.COMPLETED.name)
+        else:
+            status.clear_orders()
+
+
+def run(bars, make_data, lookback,
+        algorithm=run_algorithm,
+        **parameters):
+    """
+    Run the tradebot loop over bars
+    :param bars: (dict) Bars per market (markets may have fewer bars than others)
+    :param make_data: Function of market making a BittrexData
+    :param lookback: Bars passed to run_algorithm
+    :param algorithm: run_algorithm or run_decimal_algorithm
+    :param parameters: Parameters of run_algorithm
+    :return: (tuple) orders, seconds
+    """
+
+    logger = getLogger('benchmark')
+    data = {x: make_data(x) for x in bars}
+    statuses = {x: BittrexStatus(market=x) for x in bars}
+    orders = OrderQueue()
+
+    start = time()
+
+    for index in range(max(len(x) for x in bars.values())):
+        for market, market_bars in bars.items():
+            if index >= len(market_bars):
+                continue
+
+            market_data = data[market]
+            market_data.append(*market_bars[index])
+
+            if len(market_data) > lookback:
+                market_data.clear_first()
+
+                num_orders = len(orders)
+
+                algorithm(market_data, statuses[market], AMOUNT_PER_CALL, orders, logger, **parameters)
+
+                complete_orders(orders[num_orders:], statuses, market_bars[index][0])
+
+    return orders, time() - start
+
+
+def run_batch(bars, lookback, **parameters):
+    """
+    Run the tradebot loop over bars in batch mode (BittrexMarketData and run_algorithm_batch)
+    :return: (tuple) orders, seconds
+    """
+
+    logger = getLogger('benchmark')
+    data = BittrexMarketData(markets=bars, capacity=lookback + 1)
+    statuses = {x: BittrexStatus(market=x) for x in bars}
+    orders = OrderQueue()
+
+    start = time()
+
+    for index in range(len(next(iter(bars.values())))):
+        data.append({x: y[index] for x, y in bars.items()})
+
+        ready = [x for x in bars if data.size[data.rows[x]] > lookback]
+        data.clear_first(ready)
+
+        num_orders = len(orders)
+
+        run_algorithm_batch(data, statuses, ready, AMOUNT_PER_CALL, orders, logger, **parameters)
+
+        complete_orders(orders[num_orders:], statuses, next(iter(bars.values()))[index][0])
+
+    return orders, time() - start
+
+
+def run_strategies(bars, lookback, names):
+    """
+    Run registered strategies in the tradebot loop in batch mode, sharing one BittrexMarketData
+    :param names: Names of strategies
+    :return: (tuple) orders per strategy, seconds
+    """
+
+    logger = getLogger('benchmark')
+    data = BittrexMarketData(markets=bars, capacity=lookback + 1)
+    strategies = [get_strategy(x) for x in names]
+    statuses = {x: {y: BittrexStatus(market=y) for y in bars} for x in names}
+    orders = {x: OrderQueue() for x in names}
+
+    start = time()
+
+    for index in range(len(next(iter(bars.values())))):
+        data.append({x: y[index] for x, y in bars.items()})
+
+        ready = [x for x in bars if data.size[data.rows[x]] > lookback]
+        data.clear_first(ready)
+
+        for strategy in strategies:
+            strategy_orders = orders[strategy.name]
+            num_orders = len(strategy_orders)
+
+            strategy.run_batch(data, statuses[strategy.name], ready, AMOUNT_PER_CALL, strategy_orders, logger)
+
+            complete_orders(strategy_orders[num_orders:], statuses[strategy.name],
+                            next(iter(bars.values()))[index][0])
+
+    return orders, time() - start
+
+
+def main(num_markets=50, num_bars=2 * 1440):
+
+    bars = make_bars(num_markets, num_bars)
+    num_steps = num_markets * num_bars
+
+    # Short waits between buys, so signals are frequent
+    cases = [(65, {'wait_time': 600, 'max_hold_time': 3600}),
+             (1440, {'wait_time': 600, 'max_hold_time': 3600,
+                     'volume_lag_duration': 1380, 'price_lag_time': 720, 'price_lag_duration': 60,
+                     'buy_volume_lag_min': 230, 'buy_volume_lag_max': 920,
+                     'sell_volume_lag_min': 230, 'sell_volume_lag_max': 920})]
+
+    for lookback, parameters in cases:
+        list_orders, list_time = run(bars, ListData, lookback, run_decimal_algorithm, **parameters)
+        orders, run_time = run(bars, lambda x: BittrexData(market=x, capacity=lookback + 1), lookback, **parameters)
+        batch_orders, batch_time = run_batch(bars, lookback, **parameters)
+
+        print('lookback {}: {} orders, {}.'.format(
+            lookback, len(orders), 'identical' if orders == list_orders == batch_orders else 'DIFFERENT'))
+        print('lookback {}: lists {:.1f}us per bar, ring buffer {:.1f}us per bar, batch {:.1f}us per bar.'.format(
+            lookback, list_time / num_steps * 1e6, run_time / num_steps * 1e6, batch_time / num_steps * 1e6))
+
+    # Latency of a scraper cycle with the default parameters of run_algorithm
+    for cycle_markets in (199, 2000):
+        cycle_bars = make_bars(cycle_markets, 6 * 60, seed=1)
+
+        list_orders, list_time = run(cycle_bars, ListData, 65, run_decimal_algorithm)
+        orders, run_time = run(cycle_bars, lambda x: BittrexData(market=x, capacity=66), 65)
+        batch_orders, batch_time = run_batch(cycle_bars, 65)
+
+        print('{} markets: {} orders, {}.'.format(
+            cycle_markets, len(orders), 'identical' if orders == list_orders == batch_orders else 'DIFFERENT'))
+        print('{} markets: lists {:.2f}ms per cycle, ring buffer {:.2f}ms per cycle, batch {:.2f}ms per cycle.'.format(
+            cycle_markets, list_time / 360 * 1e3, run_time / 360 * 1e3, batch_time / 360 * 1e3))
+
+    # Strategies sharing the bars of a scraper cycle
+    cycle_bars = make_bars(199, 6 * 60, seed=1)
+
+    single_orders, single_time = run_strategies(cycle_bars, 65, ['volume_lag'])
+    shared_orders, shared_time = run_strategies(cycle_bars, 65, ['volume_lag', 'volume_lag_loose'])
+
+    for name in shared_orders:
+        alone_orders, _ = run_strategies(cycle_bars, 65, [name])
+
+        print('strategy {}: {} orders, {} alone.'.format(
+            name, len(shared_orders[name]), 'identical to' if shared_orders[name] == alone_orders[name] else
+            'DIFFERENT from'))
+
+    print('199 markets: volume_lag {:.2f}ms per cycle, with volume_lag_loose {:.2f}ms per cycle.'.format(
+        single_time / 360 * 1e3, shared_time / 360 * 1e3))
+
+    # Appending and clearing alone, and with the latest bar read as by run_algorithm (bars appended to
+    # BittrexData are written when read), up to a week of 1 minute bars
+    for lookback in (65, 1440, 10080):
+        for name, make_data in (('lists', ListData), ('ring buffer', lambda x: BittrexData(capacity=lookback + 1))):
+            market_bars = next(iter(bars.values())) * 10
+            times = []
+
+            for read in (False, True):
+                market_data = make_data(None)
+
+                start = time()
+
+                for bar in market_bars:
+                    market_data.append(*bar)
+
+                    if len(market_data) > lookback:
+                        market_data.clear_first()
+
+                    if read:
+                        market_data.wprice[-1]
+
+                times.append((time() - start) / len(market_bars) * 1e6)
+
+            print('lookback {}: {} append and clear {:.2f}us per bar, with latest bar read {:.2f}us per bar.'.format(
+                lookback, name, *times))
+
+if __name__ == '__main__':
+    main()
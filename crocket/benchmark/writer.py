@@ -0,0 +1,126 @@
+"""
+Benchmark scraper cycle time with inline inserts against the DatabaseWriter.
+
+A simulated database takes commit_latency seconds per transaction, and stalls completely (raising
+ConnectionError like an unreachable server) for a period in the middle of the run. Scraper cycles
+put one bar per market; the time each cycle spends handing off its rows is measured. All rows are
+checked to reach the database exactly once, through group commits or the spill file.
+
+Run from the crocket directory:
+    python -m benchmark.writer
+"""
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import sleep, time
+
+from numpy import max as np_max, median
+
+from sql.writer import DatabaseWriter
+
+COLUMNS = ('time', 'price', 'wprice', 'base_volume', 'buy_volume', 'sell_volume', 'buy_order', 'sell_order')
+
+
+class SimulatedDatabase:
+    """
+    insert_transaction_query with a fixed latency per transaction and an outage window
+    """
+
+    unavailable_errors = (ConnectionError,)
+
+    def __init__(self, commit_latency=0.2, outage=None):
+
+        self.commit_latency = commit_latency
+        self.outage = outage
+        self.rows = []
+        self.transactions = 0
+
+    def insert_transaction_query(self, entries):
+
+        if self.outage and self.outage[0] <= time() < self.outage[1]:
+            sleep(self.commit_latency)
+            raise ConnectionError('Lost connection to server during query')
+
+        sleep(self.commit_latency)
+
+        self.rows.extend(entries)
+        self.transactions += 1
+
+        return True
+
+
+def make_rows(cycle, num_markets):
+
+    return [('BTC-{:03d}'.format(x), COLUMNS, ('{}'.format(cycle), '0.0001', '0.0001', '1', '0.5', '0.5', 1, 1))
+            for x in range(num_markets)]
+
+
+def run(db, num_cycles, num_markets, cycle_time, writer=None):
+    """
+    Run scraper cycles, inserting inline if writer is None
+    :return: (list) Seconds each cycle spent inserting or queueing its rows
+    """
+
+    durations = []
+
+    for cycle in range(num_cycles):
+        start = time()
+        rows = make_rows(cycle, num_markets)
+
+        if writer:
+            writer.put(rows)
+        else:
+            try:
+                db.insert_transaction_query(rows)
+            except ConnectionError:
+                pass
+
+        durations.append(time() - start)
+
+        sleep(max(cycle_time - durations[-1], 0))
+
+    return durations
+
+
+def main(num_cycles=100, num_markets=199, cycle_time=0.05, commit_latency=0.2):
+
+    duration = num_cycles * cycle_time
+
+    db = SimulatedDatabase(commit_latency=commit_latency)
+    durations = run(db, num_cycles, num_markets, cycle_time)
+
+    print('inline: median {:.3f}s, max {:.3f}s per cycle, {} transactions.'.format(
+        median(durations), np_max(durations), db.transactions))
+
+    with TemporaryDirectory() as directory:
+        start = time()
+
+        # Database unreachable for the middle half of the run
+        db = SimulatedDatabase(commit_latency=commit_latency,
+                               outage=(start + duration / 4, start + duration * 3 / 4))
+        writer = DatabaseWriter(db,
+                                max_queue=10,
+                                commit_size=2000,
+                                commit_interval=cycle_time * 4,
+                                retry_interval=cycle_time * 4,
+                                max_pending=num_markets * 20,
+                                spill_path=join(directory, 'spill.jsonl'))
+        writer.start()
+
+        durations = run(db, num_cycles, num_markets, cycle_time, writer=writer)
+        stats = writer.get_stats()
+        depth = stats.get('queue_depth')
+
+        # Reachable again: spilled rows are inserted with the next group commit
+        writer.close()
+
+    expected = num_cycles * num_markets
+    unique = len(set((x[0], x[2][0]) for x in db.rows))
+
+    print('writer: median {:.4f}s, max {:.4f}s per cycle, {} transactions, {} rows spilled, '
+          'queue depth at end {}.'.format(median(durations), np_max(durations), db.transactions,
+                                          writer.num_spilled, depth))
+    print('writer: {} of {} rows inserted ({} unique).'.format(len(db.rows), expected, unique))
+
+
+if __name__ == '__main__':
+    main()
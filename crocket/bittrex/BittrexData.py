@@ -1,7 +1,99 @@
+from collections import deque
+from decimal import Decimal
+
+from numpy import empty, int64, zeros
+
+from utilities.satoshi import SATOSHI_PER_UNIT
+
+WINDOW_COLUMNS = ('wprice', 'buy_volume', 'sell_volume')
+
+# Multiplying Decimals by a Decimal avoids converting the int per value
+SATOSHI_PER_UNIT_DECIMAL = Decimal(SATOSHI_PER_UNIT)
+
+
+class RollingSum:
+    """
+    Sum of a column of BittrexData over the bars [-(offset + length), -offset), brought up to date
+    by get_window. Bars entering the window since the last update are added and bars leaving it are
+    subtracted (O(1) per bar when read every bar), so sums of satoshi units are exact and equal to
+    sum() of the window's slice. Bars that are not read cost nothing.
+    """
+
+    __slots__ = ('length', 'offset', 'total', 'count', '_values', '_capacity', '_start', '_stop')
+
+    def __init__(self, values, capacity, length, offset, num_bars, size):
+
+        self.length = length
+        self.offset = offset
+
+        self.total = 0
+        self.count = 0
+
+        self._values = values
+        self._capacity = capacity
+
+        # Window as numbers of bars appended before its first bar and after its last bar
+        self._start = self._stop = num_bars - size
+
+        self.update(num_bars, size)
+
+    def update(self, num_bars, size):
+        """
+        Move the window to the latest bars
+        :param num_bars: Number of bars appended to BittrexData
+        :param size: Number of bars held
+        :return:
+        """
+
+        first = num_bars - size
+        start = max(num_bars - self.offset - self.length, first)
+        stop = max(num_bars - self.offset, first)
+
+        # Sum the window again if all its bars left or bars leaving it were overwritten since the last update
+        if start >= self._stop or self._start < num_bars - self._capacity:
+            self.total = sum(self._values.item(x % self._capacity) for x in range(start, stop))
+            self.count = stop - start
+
+            self._start = start
+            self._stop = stop
+            return
+
+        for index in range(self._start, min(start, self._stop)):
+            self.total -= self._values.item(index % self._capacity)
+            self.count -= 1
+
+        for index in range(max(self._stop, start), stop):
+            self.total += self._values.item(index % self._capacity)
+            self.count += 1
+
+        self._start = start
+        self._stop = stop
+
+    def mean(self):
+        """
+        Mean of the window in satoshi units (total divided by count, as numpy.mean of the window's slice)
+        :return:
+        """
+
+        return self.total / self.count if self.count else float('nan')
+
 
 class BittrexData:
     """
-    Holds set of Bittrex data
+    Holds set of Bittrex data of the latest capacity bars (oldest first).
+
+    Each column is a ring buffer of twice capacity: every value is written at its slot and at its
+    slot + capacity, so the latest bars are always a contiguous slice. datetime, wprice, buy_volume
+    and sell_volume are NumPy views of that slice (no copy), and appending a bar or clearing the
+    first one is O(1) regardless of capacity. Once full, appending a bar evicts the oldest.
+
+    Appended bars are written to the ring buffers when bars are next read, so append and clear_first
+    only keep counts (at most capacity bars wait to be written).
+
+    wprice, buy_volume and sell_volume are int64 satoshi units (Decimals are only made for orders).
+
+    Windowed sums and means used per bar are RollingSums from get_window, updated when got, so
+    appending and clearing bars do not depend on the number of windows.
     """
 
     def __init__(self,
@@ -9,38 +101,112 @@ class BittrexData:
                  datetime=None,
                  wprice=None,
                  buy_volume=None,
-                 sell_volume=None):
+                 sell_volume=None,
+                 capacity=1440):
 
         self.market = market
+        self.capacity = capacity
 
-        # Set properties to empty lists if not given a list
-        if datetime is None:
-            self.datetime = []
-        elif isinstance(datetime, list):
-            self.datetime = datetime
-        else:
-            raise TypeError('BittrexData: datetime argument is not a list.')
+        # Number of bars held and number of bars appended
+        self._size = 0
+        self._num_bars = 0
 
-        if wprice is None:
-            self.wprice = []
-        elif isinstance(wprice, list):
-            self.wprice = wprice
-        else:
-            raise TypeError('BittrexData: wprice argument is not a list.')
+        # Bars appended since bars were last read
+        self._pending = deque(maxlen=capacity)
 
-        if buy_volume is None:
-            self.buy_volume = []
-        elif isinstance(buy_volume, list):
-            self.buy_volume = buy_volume
-        else:
-            raise TypeError('BittrexData: buy_volume argument is not a list.')
+        self._windows = {}
 
-        if sell_volume is None:
-            self.sell_volume = []
-        elif isinstance(sell_volume, list):
-            self.sell_volume = sell_volume
-        else:
-            raise TypeError('BittrexData: sell_volume argument is not a list.')
+        self._datetime = empty(2 * capacity, dtype=object)
+        self._wprice = zeros(2 * capacity, dtype=int64)
+        self._buy_volume = zeros(2 * capacity, dtype=int64)
+        self._sell_volume = zeros(2 * capacity, dtype=int64)
+
+        columns = (datetime, wprice, buy_volume, sell_volume)
+
+        for name, column in zip(('datetime', 'wprice', 'buy_volume', 'sell_volume'), columns):
+            if column is not None and not isinstance(column, list):
+                raise TypeError('BittrexData: {} argument is not a list.'.format(name))
+
+        if any(x is not None for x in columns):
+            for bar in zip(*[x or [] for x in columns]):
+                self.append(*bar)
+
+    def __len__(self):
+
+        return self._size
+
+    def _write_pending(self):
+        """
+        Write appended bars to the ring buffers
+        :return:
+        """
+
+        pending = self._pending
+        capacity = self.capacity
+        satoshi = SATOSHI_PER_UNIT_DECIMAL
+
+        datetimes = self._datetime
+        wprices = self._wprice
+        buy_volumes = self._buy_volume
+        sell_volumes = self._sell_volume
+
+        head = (self._num_bars - len(pending)) % capacity
+
+        while pending:
+            datetime, wprice, buy_volume, sell_volume = pending.popleft()
+            mirror = head + capacity
+
+            datetimes[head] = datetimes[mirror] = datetime
+            wprices[head] = wprices[mirror] = int(wprice * satoshi)
+            buy_volumes[head] = buy_volumes[mirror] = int(buy_volume * satoshi)
+            sell_volumes[head] = sell_volumes[mirror] = int(sell_volume * satoshi)
+
+            head = head + 1 if head + 1 < capacity else 0
+
+    def _window(self, column):
+
+        if self._pending:
+            self._write_pending()
+
+        end = self._num_bars % self.capacity + self.capacity
+
+        return column[end - self._size:end]
+
+    @property
+    def datetime(self):
+
+        return self._window(self._datetime)
+
+    @property
+    def wprice(self):
+
+        return self._window(self._wprice)
+
+    @property
+    def buy_volume(self):
+
+        return self._window(self._buy_volume)
+
+    @property
+    def sell_volume(self):
+
+        return self._window(self._sell_volume)
+
+    def append(self, datetime, wprice, buy_volume, sell_volume):
+        """
+        Append a bar, evicting the oldest bar if full
+        :param datetime:
+        :param wprice: (Decimal) Whole satoshis (8 decimal places), as entries of the scraper
+        :param buy_volume: (Decimal) Whole satoshis
+        :param sell_volume: (Decimal) Whole satoshis
+        :return:
+        """
+
+        self._pending.append((datetime, wprice, buy_volume, sell_volume))
+        self._num_bars += 1
+
+        if self._size < self.capacity:
+            self._size += 1
 
     def clear_first(self):
         """
@@ -48,8 +214,38 @@ class BittrexData:
         :return:
         """
 
-        del self.datetime[0]
-        del self.wprice[0]
-        del self.buy_volume[0]
-        del self.sell_volume[0]
+        if self._size:
+            self._size -= 1
+
+    def get_window(self, column, length,
+                   offset=0):
+        """
+        Get the rolling sum of a column over the bars [-(offset + length), -offset), created on first use
+        and brought up to date with the bars appended and cleared since it was last got
+        :param column: 'wprice', 'buy_volume' or 'sell_volume'
+        :param length: Number of bars
+        :param offset: Number of latest bars excluded
+        :return: (RollingSum)
+        """
+
+        if self._pending:
+            self._write_pending()
+
+        key = (column, length, offset)
+        window = self._windows.get(key)
+
+        if window is None:
+            if column not in WINDOW_COLUMNS:
+                raise ValueError('BittrexData: No window of {}.'.format(column))
+
+            # Windows are within the bars held
+            if offset + length >= self.capacity:
+                raise ValueError('BittrexData: Window of {} bars with offset {} needs capacity above {}.'.format(
+                    length, offset, offset + length))
+
+            window = self._windows[key] = RollingSum(getattr(self, '_' + column), self.capacity, length, offset,
+                                                     self._num_bars, self._size)
+        else:
+            window.update(self._num_bars, self._size)
 
+        return window
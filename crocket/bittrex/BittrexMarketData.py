@@ -0,0 +1,281 @@
+from numpy import arange, asarray, empty, int64, maximum, minimum, where, zeros
+
+from bittrex.BittrexData import WINDOW_COLUMNS
+from utilities.satoshi import SATOSHI_PER_UNIT
+
+
+class RollingSums:
+    """
+    Sums of a column of BittrexMarketData over the bars [-(offset + length), -offset) of every
+    market, as int64 satoshi arrays indexed by row. Kept up to date by BittrexMarketData in one
+    NumPy pass over all rows per append and clear_first (see RollingSum of BittrexData).
+    """
+
+    def __init__(self, values, capacity, length, offset, num_bars, size):
+
+        self.length = length
+        self.offset = offset
+
+        self._values = values.ravel()
+        self._capacity = capacity
+
+        # Position of each row in the flattened ring buffers
+        self._base = arange(len(num_bars), dtype=int64) * values.shape[1]
+
+        self.total = zeros(len(num_bars), dtype=int64)
+        self.count = zeros(len(num_bars), dtype=int64)
+
+        first = num_bars - size
+
+        # Window as numbers of bars appended before its first bar and after its last bar
+        self._start = maximum(num_bars - offset - length, first)
+        self._stop = maximum(num_bars - offset, first)
+
+        for index in range(length):
+            bar = self._start + index
+            held = bar < self._stop
+
+            self.total += where(held, self._values.take(self._base + bar % capacity), 0)
+            self.count += held
+
+    def update(self, num_bars, size):
+        """
+        Move the windows to their latest bars after at most one bar was appended or cleared per row
+        :param num_bars: (numpy.ndarray) Number of bars appended to each row
+        :param size: (numpy.ndarray) Number of bars held by each row
+        :return:
+        """
+
+        first = num_bars - size
+        start = maximum(num_bars - (self.offset + self.length), first)
+        stop = maximum(num_bars - self.offset, first)
+
+        # One append or clear_first moves start and stop by one bar at most
+        leaving = self._start < minimum(start, self._stop)
+        entering = maximum(self._stop, start) < stop
+
+        self.total += where(entering, self._values.take(self._base + self._stop % self._capacity), 0)
+        self.total -= where(leaving, self._values.take(self._base + self._start % self._capacity), 0)
+        self.count += entering
+        self.count -= leaving
+
+        self._start = start
+        self._stop = stop
+
+
+class MarketWindow:
+    """
+    Window of one market of RollingSums, as RollingSum of BittrexData: total in satoshi units and
+    mean() is total divided by count.
+    """
+
+    __slots__ = ('total', 'count')
+
+    def __init__(self, total, count):
+
+        self.total = int(total)
+        self.count = int(count)
+
+    def mean(self):
+        """
+        Mean of the window in satoshi units (total divided by count, as numpy.mean of the window's slice)
+        :return:
+        """
+
+        return self.total / self.count if self.count else float('nan')
+
+
+class MarketRow:
+    """
+    Bars of one market of BittrexMarketData, with the interface of BittrexData used by run_algorithm
+    """
+
+    __slots__ = ('market', '_data', '_row')
+
+    def __init__(self, data, market, row):
+
+        self.market = market
+
+        self._data = data
+        self._row = row
+
+    def __len__(self):
+
+        return int(self._data.size[self._row])
+
+    @property
+    def datetime(self):
+
+        return self._data.get_column('datetime', self._row)
+
+    @property
+    def wprice(self):
+
+        return self._data.get_column('wprice', self._row)
+
+    def get_window(self, column, length,
+                   offset=0):
+        """
+        Get the sum of a column over the bars [-(offset + length), -offset)
+        :param column: 'wprice', 'buy_volume' or 'sell_volume'
+        :param length: Number of bars
+        :param offset: Number of latest bars excluded
+        :return: (MarketWindow)
+        """
+
+        window = self._data.get_window(column, length, offset)
+
+        return MarketWindow(window.total[self._row], window.count[self._row])
+
+
+class BittrexMarketData:
+    """
+    Holds the latest capacity bars of many markets as markets × time arrays, one row per market.
+
+    Rows are ring buffers of twice capacity as in BittrexData, with datetime as objects and wprice,
+    buy_volume and sell_volume as int64 satoshi units. Bars of all markets of a scraper cycle are
+    appended in one pass, and RollingSums from get_window hold the window sums of every market, so
+    conditions on windows can be evaluated for all markets at once. get_market returns a MarketRow
+    to run per market logic on.
+    """
+
+    def __init__(self,
+                 markets=None,
+                 capacity=1440):
+
+        self.markets = list(markets or [])
+        self.capacity = capacity
+
+        self.rows = {x: index for index, x in enumerate(self.markets)}
+
+        # Number of bars held and number of bars appended per row
+        self.size = zeros(len(self.markets), dtype=int64)
+        self.num_bars = zeros(len(self.markets), dtype=int64)
+
+        self._windows = {}
+
+        self._datetime = empty((len(self.markets), 2 * capacity), dtype=object)
+        self._wprice = zeros((len(self.markets), 2 * capacity), dtype=int64)
+        self._buy_volume = zeros((len(self.markets), 2 * capacity), dtype=int64)
+        self._sell_volume = zeros((len(self.markets), 2 * capacity), dtype=int64)
+
+    def __len__(self):
+
+        return len(self.markets)
+
+    def get_rows(self, markets):
+        """
+        Get rows of markets
+        :param markets: List of markets
+        :return: (numpy.ndarray) int64
+        """
+
+        return asarray([self.rows[x] for x in markets], dtype=int64)
+
+    def get_column(self, column, row):
+        """
+        Get the bars held of a row (oldest first, a view of the ring buffer)
+        :param column: 'datetime' (objects), or 'wprice', 'buy_volume' or 'sell_volume' (satoshi)
+        :param row: Row of market
+        :return: (numpy.ndarray)
+        """
+
+        values = getattr(self, '_' + column)
+        end = self.num_bars[row] % self.capacity + self.capacity
+
+        return values[row, end - self.size[row]:end]
+
+    def get_latest(self, column):
+        """
+        Get the latest bar of every row (last bar appended if none are held)
+        :param column: 'wprice', 'buy_volume' or 'sell_volume' (satoshi)
+        :return: (numpy.ndarray) int64
+        """
+
+        return getattr(self, '_' + column)[arange(len(self.markets)), (self.num_bars - 1) % self.capacity]
+
+    def get_market(self, market):
+        """
+        Get the bars of a market
+        :param market: Market
+        :return: (MarketRow)
+        """
+
+        return MarketRow(self, market, self.rows[market])
+
+    def append(self, bars):
+        """
+        Append a bar to markets, evicting their oldest bar if full
+        :param bars: (dict) (datetime, wprice, buy_volume, sell_volume) per market
+        :return:
+        """
+
+        if not bars:
+            return
+
+        rows = self.get_rows(bars)
+        heads = self.num_bars[rows] % self.capacity
+        mirrors = heads + self.capacity
+
+        bars = list(bars.values())
+
+        # Prices and volumes of entries are whole satoshis (Decimals of 8 places or 0), so scaling is exact
+        satoshis = asarray([int(y * SATOSHI_PER_UNIT) for x in bars for y in x[1:]], dtype=int64).reshape(-1, 3)
+
+        self._datetime[rows, heads] = self._datetime[rows, mirrors] = [x[0] for x in bars]
+
+        for index, column in enumerate((self._wprice, self._buy_volume, self._sell_volume)):
+            column[rows, heads] = column[rows, mirrors] = satoshis[:, index]
+
+        self.num_bars[rows] += 1
+        self.size[rows] = minimum(self.size[rows] + 1, self.capacity)
+
+        self._update_windows()
+
+    def clear_first(self, markets):
+        """
+        Clear the first bar of markets
+        :param markets: List of markets
+        :return:
+        """
+
+        rows = self.get_rows(markets)
+
+        if not len(rows):
+            return
+
+        self.size[rows] = maximum(self.size[rows] - 1, 0)
+
+        self._update_windows()
+
+    def _update_windows(self):
+
+        for window in self._windows.values():
+            window.update(self.num_bars, self.size)
+
+    def get_window(self, column, length,
+                   offset=0):
+        """
+        Get the rolling sums of a column over the bars [-(offset + length), -offset) of every market,
+        created on first use
+        :param column: 'wprice', 'buy_volume' or 'sell_volume'
+        :param length: Number of bars
+        :param offset: Number of latest bars excluded
+        :return: (RollingSums)
+        """
+
+        key = (column, length, offset)
+
+        if key not in self._windows:
+            if column not in WINDOW_COLUMNS:
+                raise ValueError('BittrexMarketData: No window of {}.'.format(column))
+
+            # Bars leaving the window must not be overwritten yet
+            if offset + length >= self.capacity:
+                raise ValueError('BittrexMarketData: Window of {} bars with offset {} needs capacity above {}.'.format(
+                    length, offset, offset + length))
+
+            self._windows[key] = RollingSums(getattr(self, '_' + column), self.capacity, length, offset,
+                                             self.num_bars, self.size)
+
+        return self._windows[key]
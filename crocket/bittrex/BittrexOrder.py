@@ -2,7 +2,7 @@ from datetime import datetime
 from decimal import Decimal
 
 from utilities.constants import BittrexConstants, OrderStatus
-from utilities.time import convert_bittrex_timestamp_to_datetime, utc_to_local
+from utilities.time import convert_bittrex_timestamp_to_local
 
 
 class BittrexOrder:
@@ -24,7 +24,8 @@ class BittrexOrder:
                  uuid=None,
                  actual_price=0,
                  current_total=0,
-                 final_total=0):
+                 final_total=0,
+                 strategy=None):
 
         self.market = market
         self.type = order_type
@@ -35,6 +36,9 @@ class BittrexOrder:
         self.final_quantity = final_quantity
         self.status = status
 
+        # Strategy of the tradebot that signalled the order
+        self.strategy = strategy
+
         # Order information from Bittrex API
         self.uuid = uuid
         self.open_time = open_time
@@ -54,7 +58,8 @@ class BittrexOrder:
         new_order = BittrexOrder(market=order.get('market'),
                                  order_type=order.get('type'),
                                  target_quantity=order.get('target_quantity'),
-                                 base_quantity=order.get('base_quantity'))
+                                 base_quantity=order.get('base_quantity'),
+                                 strategy=order.get('strategy'))
 
         return new_order
 
@@ -94,7 +99,7 @@ class BittrexOrder:
         closed_time = order.get('Closed')
         order_type = order.get('Type')
 
-        self.open_time = utc_to_local(convert_bittrex_timestamp_to_datetime(order.get('Opened')))
+        self.open_time = convert_bittrex_timestamp_to_local(order.get('Opened'))
         self.current_quantity = (Decimal(order.get('Quantity')) - Decimal(order.get('QuantityRemaining'))).quantize(
             BittrexConstants.DIGITS)
 
@@ -104,7 +109,7 @@ class BittrexOrder:
             pass
 
         if closed_time:
-            self.closed_time = utc_to_local(convert_bittrex_timestamp_to_datetime(closed_time))
+            self.closed_time = convert_bittrex_timestamp_to_local(closed_time)
         else:
             self.closed_time = datetime.now().astimezone(tz=None)
 
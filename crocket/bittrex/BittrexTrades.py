@@ -0,0 +1,193 @@
+from numpy import empty, float64, int8, int64
+
+from utilities.constants import OrderType
+from utilities.satoshi import to_satoshi_array
+from utilities.time import convert_bittrex_timestamp_to_epoch
+
+# Order type codes stored in the sides column
+TRADE_SIDES = {OrderType.BUY.name: OrderType.BUY.value,
+               OrderType.SELL.name: OrderType.SELL.value}
+
+
+class BittrexTrades:
+    """
+    Holds trade history of a market (oldest first) in fixed-width columns.
+
+    Columns are preallocated arrays holding the trades between positions start and stop.
+    New trades are appended after stop and consumed trades are cleared by moving start,
+    so trades in use are always a contiguous slice. The arrays are compacted (or grown)
+    only when there is no room left after stop.
+    """
+
+    def __init__(self,
+                 market=None,
+                 trades=None,
+                 capacity=1024):
+
+        self.market = market
+
+        # Id of latest trade added (high-water mark)
+        self.last_id = None
+
+        self._start = 0
+        self._stop = 0
+
+        self._ids = empty(capacity, dtype=int64)
+        self._timestamps = empty(capacity, dtype=int64)  # Microseconds since epoch
+        self._prices = empty(capacity, dtype=int64)  # Satoshi
+        self._quantities = empty(capacity, dtype=float64)
+        self._totals = empty(capacity, dtype=float64)
+        self._sides = empty(capacity, dtype=int8)
+
+        if trades:
+            self.add(trades)
+
+    def __len__(self):
+
+        return self._stop - self._start
+
+    @property
+    def capacity(self):
+
+        return len(self._ids)
+
+    @property
+    def ids(self):
+
+        return self._ids[self._start:self._stop]
+
+    @property
+    def timestamps(self):
+
+        return self._timestamps[self._start:self._stop]
+
+    @property
+    def prices(self):
+
+        return self._prices[self._start:self._stop]
+
+    @property
+    def quantities(self):
+
+        return self._quantities[self._start:self._stop]
+
+    @property
+    def totals(self):
+
+        return self._totals[self._start:self._stop]
+
+    @property
+    def sides(self):
+
+        return self._sides[self._start:self._stop]
+
+    def _reserve(self, count):
+        """
+        Make room for count trades after stop
+        :param count: Number of trades
+        :return:
+        """
+
+        if self._stop + count <= self.capacity:
+            return
+
+        size = len(self)
+        old_capacity = self.capacity
+        capacity = old_capacity
+
+        # Grow if trades in use would fill more than half of the arrays
+        while 2 * (size + count) > capacity:
+            capacity *= 2
+
+        for name in ('_ids', '_timestamps', '_prices', '_quantities', '_totals', '_sides'):
+            column = getattr(self, name)
+
+            if capacity != old_capacity:
+                new_column = empty(capacity, dtype=column.dtype)
+                new_column[:size] = column[self._start:self._stop]
+                setattr(self, name, new_column)
+            else:
+                column[:size] = column[self._start:self._stop]
+
+        self._start = 0
+        self._stop = size
+
+    def add(self, trades):
+        """
+        Add trades newer than the latest trade
+        :param trades: (list(dict)) Trades in Bittrex order (newest first)
+        :return: (int) Number of trades added
+        """
+
+        count = 0
+
+        if self.last_id is None:
+            count = len(trades)
+        else:
+            for trade in trades:
+                if trade.get('Id') <= self.last_id:
+                    break
+                count += 1
+
+        if count == 0:
+            return 0
+
+        new_trades = trades[count - 1::-1]
+
+        self._reserve(count)
+
+        start = self._stop
+        stop = start + count
+
+        self._ids[start:stop] = [x.get('Id') for x in new_trades]
+        self._timestamps[start:stop] = [convert_bittrex_timestamp_to_epoch(x.get('TimeStamp')) for x in new_trades]
+        self._prices[start:stop] = to_satoshi_array([x.get('Price') for x in new_trades])
+        self._quantities[start:stop] = [x.get('Quantity') for x in new_trades]
+        self._totals[start:stop] = [x.get('Total') for x in new_trades]
+        self._sides[start:stop] = [TRADE_SIDES.get(x.get('OrderType'), 0) for x in new_trades]
+
+        self._stop = stop
+        self.last_id = trades[0].get('Id')
+
+        return count
+
+    def get_interval(self, start, stop):
+        """
+        Get columns of trades between two positions in Bittrex order (newest first)
+        :param start: Position of first trade
+        :param stop: Position after last trade
+        :return: (tuple) prices, totals, buy totals, sell totals
+        """
+
+        offset = self._start
+        prices = self._prices[offset + start:offset + stop][::-1]
+        totals = self._totals[offset + start:offset + stop][::-1]
+        sides = self._sides[offset + start:offset + stop][::-1]
+
+        return (prices,
+                totals.tolist(),
+                totals[sides == OrderType.BUY.value].tolist(),
+                totals[sides == OrderType.SELL.value].tolist())
+
+    def get_latest(self, count):
+        """
+        Get columns of latest trades (oldest first)
+        :param count: Number of trades
+        :return: (tuple) timestamps, prices, totals in satoshi units, sides
+        """
+
+        start = self._stop - count
+
+        return (self._timestamps[start:self._stop].tolist(),
+                self._prices[start:self._stop].tolist(),
+                to_satoshi_array(self._totals[start:self._stop]).tolist(),
+                self._sides[start:self._stop].tolist())
+
+    def clear_before(self, position):
+        """
+        Clear all trades before position
+        :param position:
+        :return:
+        """
+
+        self._start = min(self._start + position, self._stop)
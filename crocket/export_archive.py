@@ -0,0 +1,109 @@
+from argparse import ArgumentParser
+from os import environ
+from os.path import dirname, join, realpath
+from sys import exit
+from time import time
+
+from sql.backend import BACKENDS, OHLC_COLUMNS, PRICE_COLUMNS, get_database
+from utilities.BarArchive import BarArchive, export_table
+from utilities.credentials import get_credentials
+
+# ==============================================================================
+# Parse arguments
+# ==============================================================================
+parser = ArgumentParser(description='Export price and rollup tables to a memory-mapped columnar archive '
+                                    '(one directory per table). Only rows after the last exported time are '
+                                    'appended, so the export can be rerun to add new rows.')
+
+parser.add_argument('-d',
+                    '--database',
+                    help='Name of database')
+
+parser.add_argument('-o',
+                    '--directory',
+                    help='Archive directory')
+
+parser.add_argument('-f',
+                    '--table-format',
+                    action='append',
+                    help='Format of table names from market, e.g. {}-5m (default: {} and the rollup formats)')
+
+parser.add_argument('-b',
+                    '--backend',
+                    default='mysql',
+                    choices=BACKENDS,
+                    help='Storage backend (default: mysql)')
+
+parser.add_argument('-s',
+                    '--sqlite-directory',
+                    help='Directory of SQLite database files (default: data in the crocket directory)')
+
+args = parser.parse_args()
+
+if args.database is None or args.directory is None:
+    parser.print_help()
+    exit(1)
+
+# ==============================================================================
+# Set up parameters
+# ==============================================================================
+
+HOME_DIRECTORY_PATH = environ['HOME']
+
+CREDENTIALS_FILE_PATH = join(HOME_DIRECTORY_PATH, '.credentials_unlocked.json')
+
+CROCKET_DIRECTORY = dirname(dirname(realpath(__file__)))
+
+MARKETS_LIST_PATH = join(CROCKET_DIRECTORY, 'markets.txt')
+
+HOSTNAME = 'localhost'
+
+USERNAME, PASSCODE = get_credentials(CREDENTIALS_FILE_PATH) if args.backend == 'mysql' else (None, None)
+
+with open(MARKETS_LIST_PATH, 'r') as f:
+    MARKETS = f.read().splitlines()
+
+TABLE_FORMATS = args.table_format or ['{}', '{}-5m', '{}-1h', '{}-1d']
+
+# ==============================================================================
+# Export tables
+# ==============================================================================
+
+db = get_database(args.backend, args.database,
+                  hostname=HOSTNAME,
+                  username=USERNAME,
+                  password=PASSCODE,
+                  directory=args.sqlite_directory or join(CROCKET_DIRECTORY, 'data'))
+
+archive = BarArchive(args.directory)
+
+tables = set(db.get_all_tables() or [])
+ohlc_tables = set(db.get_tables_with_column('close') or [])
+
+start = time()
+num_exported = 0
+num_tables = 0
+
+for table_format in TABLE_FORMATS:
+    for market in MARKETS:
+        table_name = table_format.format(market)
+
+        if table_name not in tables:
+            continue
+
+        columns = PRICE_COLUMNS + OHLC_COLUMNS if table_name in ohlc_tables else PRICE_COLUMNS
+        exported = export_table(archive, db, table_name, table_name, columns)
+
+        num_exported += exported
+        num_tables += 1
+
+        if exported:
+            print('{}: appended {} rows ({} rows archived).'.format(table_name, exported,
+                                                                    archive.get_index(table_name)['num_rows']))
+
+run_time = time() - start
+
+print('Exported {} rows of {} tables to {} in {:.1f}s ({:.0f} rows/s).'.format(
+    num_exported, num_tables, args.directory, run_time, num_exported / run_time if run_time else 0))
+
+db.close()
@@ -0,0 +1,177 @@
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from os import environ
+from os.path import dirname, join, realpath
+from sys import exit
+from time import sleep, time
+
+from sql.sql import OHLC_COLUMNS, PRICE_COLUMNS, Database
+from utilities.credentials import get_credentials
+
+# ==============================================================================
+# Parse arguments
+# ==============================================================================
+parser = ArgumentParser(description='Copy per-market price tables into one long price table keyed by '
+                                    '(market_id, time). Rows are copied in time chunks with INSERT IGNORE, '
+                                    'so the scraper can keep writing and the tool can be rerun to copy new rows.')
+
+parser.add_argument('-d',
+                    '--database',
+                    help='Name of database')
+
+parser.add_argument('-t',
+                    '--table',
+                    default='prices',
+                    help='Long price table (default: prices)')
+
+parser.add_argument('-m',
+                    '--market-table',
+                    default='markets',
+                    help='Market dimension table (default: markets)')
+
+parser.add_argument('-f',
+                    '--table-format',
+                    default='{}',
+                    help='Format of per-market table names, e.g. {}-5m (long table name uses the same format)')
+
+parser.add_argument('-a',
+                    '--after',
+                    help='Only copy rows at or after this time (YYYY-mm-dd HH:MM:SS)')
+
+parser.add_argument('-c',
+                    '--chunk-days',
+                    type=float,
+                    default=7,
+                    help='Days of rows copied per statement (default: 7)')
+
+parser.add_argument('-s',
+                    '--sleep',
+                    type=float,
+                    default=0.1,
+                    help='Seconds to pause between statements (default: 0.1)')
+
+parser.add_argument('-v',
+                    '--verify',
+                    action='store_true',
+                    help='Compare row counts per market after copying')
+
+args = parser.parse_args()
+
+if args.database is None:
+    parser.print_help()
+    exit(1)
+
+# ==============================================================================
+# Set up parameters
+# ==============================================================================
+
+HOME_DIRECTORY_PATH = environ['HOME']
+
+CREDENTIALS_FILE_PATH = join(HOME_DIRECTORY_PATH, '.credentials_unlocked.json')
+
+CROCKET_DIRECTORY = dirname(dirname(realpath(__file__)))
+
+MARKETS_LIST_PATH = join(CROCKET_DIRECTORY, 'markets.txt')
+
+HOSTNAME = 'localhost'
+
+USERNAME, PASSCODE = get_credentials(CREDENTIALS_FILE_PATH)
+
+with open(MARKETS_LIST_PATH, 'r') as f:
+    MARKETS = f.read().splitlines()
+
+TABLE = args.table_format.format(args.table)
+
+# Rollup tables (formats other than the 1m table) have OHLC columns
+OHLC = args.table_format != '{}'
+COLUMNS = PRICE_COLUMNS + OHLC_COLUMNS if OHLC else PRICE_COLUMNS
+CHUNK = timedelta(days=args.chunk_days)
+AFTER = datetime.strptime(args.after, '%Y-%m-%d %H:%M:%S') if args.after else None
+
+# ==============================================================================
+# Copy tables
+# ==============================================================================
+
+db = Database(hostname=HOSTNAME,
+              username=USERNAME,
+              password=PASSCODE,
+              database_name=args.database)
+
+tables = set(db.get_all_tables() or [])
+markets = [x for x in MARKETS if args.table_format.format(x) in tables]
+
+bounds = {}
+
+for market in markets:
+    (first_datetime, last_datetime), = db.select_query(args.table_format.format(market), ['MIN(time)', 'MAX(time)'])
+
+    if first_datetime is not None:
+        bounds[market] = (max(first_datetime, AFTER) if AFTER else first_datetime, last_datetime)
+
+if not bounds:
+    print('No rows to copy.')
+    exit(0)
+
+partition_end = datetime.now() + timedelta(days=90)
+
+db.create_market_table(args.market_table)
+db.create_long_price_table(TABLE, min(x[0] for x in bounds.values()), partition_end, ohlc=OHLC)
+db.add_price_partitions(TABLE, partition_end)
+
+market_ids = db.get_market_ids(args.market_table, markets)
+
+start = time()
+num_copied = 0
+
+for index, (market, (first_datetime, last_datetime)) in enumerate(bounds.items()):
+    market_copied = 0
+    chunk_start = first_datetime
+
+    while chunk_start <= last_datetime:
+        copied = db.copy_price_table(args.table_format.format(market), TABLE, market_ids[market],
+                                     chunk_start, chunk_start + CHUNK,
+                                     columns=COLUMNS)
+
+        if copied is None:
+            print('Failed to copy {} from {}.'.format(market, chunk_start))
+            exit(1)
+
+        market_copied += copied
+        chunk_start += CHUNK
+
+        sleep(args.sleep)
+
+    num_copied += market_copied
+
+    print('[{}/{}] {}: copied {} rows.'.format(index + 1, len(bounds), market, market_copied))
+
+run_time = time() - start
+
+print('Copied {} rows of {} markets into {} in {:.1f}s ({:.0f} rows/s).'.format(
+    num_copied, len(bounds), TABLE, run_time, num_copied / run_time if run_time else 0))
+
+# ==============================================================================
+# Verify
+# ==============================================================================
+
+if args.verify:
+    mismatches = []
+
+    for market in bounds:
+        condition = 'WHERE time >= \'{:%Y-%m-%d %H:%M:%S}\''.format(AFTER) if AFTER else ''
+
+        (source_count,), = db.select_query(args.table_format.format(market), ['COUNT(*)'], condition)
+        (count,), = db.select_query(TABLE, ['COUNT(*)'], '{} market_id = {}'.format(
+            condition + ' AND' if condition else 'WHERE', market_ids[market]))
+
+        if source_count != count:
+            mismatches.append(market)
+            print('{}: {} rows in {}, {} rows in {}.'.format(market, source_count, args.table_format.format(market),
+                                                           count, TABLE))
+
+    print('Verified {} markets, {} mismatches.'.format(len(bounds), len(mismatches)))
+
+    if mismatches:
+        exit(1)
+
+db.close()
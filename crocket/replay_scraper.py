@@ -0,0 +1,63 @@
+from argparse import ArgumentParser
+from sys import exit
+from time import time
+
+from scraper_helper import replay_cycles
+from utilities.ResponseRecorder import read_cycles
+
+# ==============================================================================
+# Parse arguments
+# ==============================================================================
+parser = ArgumentParser()
+
+parser.add_argument('-d',
+                    '--directory',
+                    help='Directory of recorded responses')
+
+parser.add_argument('-s',
+                    '--speed',
+                    type=float,
+                    help='Speed-up relative to recorded time (as fast as possible if not given)')
+
+args = parser.parse_args()
+
+if args.directory is None:
+    parser.print_help()
+    exit(1)
+
+# ==============================================================================
+# Replay recorded cycles and compare bars
+# ==============================================================================
+
+num_cycles = 0
+num_responses = 0
+num_bars = 0
+num_trades = 0
+mismatches = []
+
+start = time()
+
+for cycle, entries in replay_cycles(read_cycles(args.directory), speed=args.speed):
+
+    num_cycles += 1
+    num_responses += len(cycle.get('responses'))
+
+    if entries != cycle.get('bars'):
+        mismatches.append(cycle.get('cycle_time'))
+
+    for market_entries in entries.values():
+        num_bars += len(market_entries)
+
+        # buy_order and sell_order of format_bittrex_entry
+        num_trades += sum(int(x[6]) + int(x[7]) for x in market_entries)
+
+run_time = time() - start
+
+print('Replayed {} cycles ({} responses, {} bars, {} trades) in {:.2f}s ({:.0f} trades/s).'.format(
+    num_cycles, num_responses, num_bars, num_trades, run_time, num_trades / run_time if run_time else 0))
+
+if mismatches:
+    print('Bars of {} cycles differ from recorded bars, first at {}.'.format(len(mismatches), mismatches[0]))
+    exit(1)
+
+print('Replayed bars match recorded bars.')
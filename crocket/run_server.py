@@ -1,12 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import partial
 from flask import Flask, jsonify, request
-from itertools import chain
+from itertools import chain, compress
 from json import load as json_load
 from requests.exceptions import ConnectionError
 from requests_futures.sessions import FuturesSession
 from logging import FileHandler, Formatter, StreamHandler, getLogger
 from multiprocessing import Process, Queue
+from queue import Empty
 from os import environ
 from os.path import dirname, join, realpath
 from random import shuffle
@@ -17,12 +19,20 @@ from bittrex.bittrex2 import Bittrex, format_bittrex_entry, return_request_input
 from bittrex.BittrexOrder import BittrexOrder
 from bittrex.BittrexStatus import BittrexStatus
 from bittrex.BittrexData import BittrexData
+from bittrex.BittrexMarketData import BittrexMarketData
 from manager_helper import buy_above_bid, get_order_and_update_wallet, sell_below_ask, skip_order
-from scraper_helper import get_data, process_data
-from sql.sql import Database
-from trade_algorithm import run_algorithm
+from scraper_helper import get_data, get_data_async, get_data_summary_first, group_entries_by_market, merge_entries, \
+    pop_closed_entries, process_data
+from sql.backend import get_database
+from sql.writer import DatabaseWriter
+from strategies import ROUTINGS, LiveRouter, PaperRouter, get_strategy
+from utilities.async_network import AsyncSession
+from utilities.BarBuilder import BAR_FIELDS, BarBuilder
 from utilities.constants import BittrexConstants, OrderStatus, OrderType
 from utilities.credentials import get_credentials
+from utilities.PollScheduler import PollScheduler
+from utilities.ProxyPool import ProxyPool
+from utilities.ResponseRecorder import ResponseRecorder
 from utilities.time import convert_bittrex_timestamp_to_datetime, format_time, utc_to_local
 from utilities.Wallet import Wallet
 
@@ -85,6 +95,57 @@ with open(BITTREX_CREDENTIALS_PATH, 'r') as f:
 with open(PROXY_LIST_PATH, 'r') as f:
     PROXIES = f.read().splitlines()
 
+# ==============================================================================
+# Scraper settings
+# ==============================================================================
+
+# Fetch market history with asyncio (keep-alive connections per proxy) instead of threads
+ASYNC_SCRAPER = True
+
+# Deadline per API call in seconds
+REQUEST_TIMEOUT = 3
+
+# Route API calls to the fastest healthy proxies instead of shuffling all proxies
+ADAPTIVE_PROXIES = True
+
+# Poll each market at a rate matching its trade activity instead of polling all markets every cycle
+ADAPTIVE_POLLING = True
+
+# Check which markets traded with one market summaries call before fetching market history
+SUMMARY_FIRST = True
+
+# Number of scraper processes (markets and proxies are split between processes)
+SCRAPER_SHARDS = 1
+
+# OHLCV rollup tables built incrementally from the same trades: table name (per market) by resolution in seconds
+BAR_TABLES = {300: '{}-5m', 3600: '{}-1h', 86400: '{}-1d'}
+
+# Store bars of all markets in one table per resolution keyed by (market_id, time) instead of one table per market
+LONG_PRICE_TABLES = False
+
+# Price table and market dimension table of the long layout (bar tables are BAR_TABLES formats of PRICE_TABLE)
+PRICE_TABLE = 'prices'
+MARKET_TABLE = 'markets'
+
+# Monthly partitions of long price tables are created this many days ahead on start
+PARTITION_DAYS_AHEAD = 90
+
+# Directory to record raw market history responses to for replay (not recorded if None)
+RECORD_DIRECTORY = None
+
+# Storage backend of price, rollup and trade tables: 'mysql' (server at HOSTNAME) or 'sqlite' (embedded, WAL mode)
+STORAGE_BACKEND = 'mysql'
+
+# Directory of SQLite database files (one file per database)
+SQLITE_DIRECTORY = join(CROCKET_DIRECTORY, 'data')
+
+# Storage of prices and volumes in new databases: 'decimal' (DECIMAL(15,8)) or 'satoshi' (BIGINT satoshi units).
+# Existing databases keep the storage of their schema version.
+PRICE_STORAGE = 'decimal'
+
+# Directory of rows the database writer could not insert in time (inserted once the database is reachable)
+SPILL_DIRECTORY = '/var/tmp'
+
 # ==============================================================================
 # Tradebot settings
 # ==============================================================================
@@ -92,6 +153,19 @@ with open(PROXY_LIST_PATH, 'r') as f:
 WALLET_TOTAL = 0
 AMOUNT_PER_CALL = 0
 
+# Bars per market passed to run_algorithm (BittrexData keeps one more before clearing the first)
+TRADEBOT_LOOKBACK = 65
+
+# Keep bars of all markets in one BittrexMarketData and evaluate buy conditions of all markets in one pass
+# (run_algorithm only runs for markets holding coin or passing them)
+TRADEBOT_BATCH = True
+
+# Registered strategies (see strategies.py) run by the tradebot and their order routing: 'live' (executed by the
+# manager) or 'paper' (filled at the wprice of the latest bar). Strategies share the bars and windows of markets and
+# each has its own statuses. The first strategy records trades to the table of the tradebot start endpoint, others
+# to <table>_<strategy>. Live strategies share the wallet of the manager, so only one should be live.
+TRADEBOT_STRATEGIES = {'volume_lag': 'live'}
+
 SKIP_LIST = ['BTC-BCC', 'BTC-ETH', 'BTC-LSK', 'BTC-NEO', 'BTC-OMG', 'BTC-XRP', 'BTC-LTC']
 
 # ==============================================================================
@@ -121,6 +195,22 @@ manager = Process()
 # ==============================================================================
 
 
+def open_database(database_name, logger=None):
+    """
+    Open a database of the configured storage backend
+    :param database_name:
+    :param logger:
+    :return: (StorageBackend)
+    """
+
+    return get_database(STORAGE_BACKEND, database_name,
+                        hostname=HOSTNAME,
+                        username=USERNAME,
+                        password=PASSCODE,
+                        directory=SQLITE_DIRECTORY,
+                        logger=logger)
+
+
 def initialize_databases(database_name, markets,
                          logger=None):
     """
@@ -128,14 +218,10 @@ def initialize_databases(database_name, markets,
     :param database_name:
     :param markets:
     :param logger:
-    :return:
+    :return: (dict) Id per market in the long price table layout (None if one table per market)
     """
 
-    db = Database(hostname=HOSTNAME,
-                  username=USERNAME,
-                  password=PASSCODE,
-                  database_name='develop',
-                  logger=logger)
+    db = open_database('develop', logger=logger)
 
     # Create database if does not exist
     db.create_database(database_name)
@@ -143,28 +229,53 @@ def initialize_databases(database_name, markets,
 
     db.close()
 
-    base_db = Database(hostname=HOSTNAME,
-                       username=USERNAME,
-                       password=PASSCODE,
-                       database_name=database_name,
-                       logger=logger)
+    base_db = open_database(database_name, logger=logger)
+
+    price_storage = base_db.initialize_schema(PRICE_STORAGE)
+
+    if logger and price_storage != PRICE_STORAGE:
+        logger.warning('Database: {} stores prices as {}, not {}.'.format(database_name, price_storage, PRICE_STORAGE))
 
     # Create tables if does not exist
-    for market in markets:
-        base_db.create_price_table(market)
+    if LONG_PRICE_TABLES:
+        base_db.create_market_table(MARKET_TABLE)
+
+        partition_end = datetime.now() + timedelta(days=PARTITION_DAYS_AHEAD)
+
+        for table_format in ('{}', *BAR_TABLES.values()):
+            base_db.create_long_price_table(table_format.format(PRICE_TABLE), datetime.now(), partition_end,
+                                            ohlc=table_format != '{}')
+            base_db.add_price_partitions(table_format.format(PRICE_TABLE), partition_end)
+
+        rollup_tables = [x.format(PRICE_TABLE) for x in BAR_TABLES.values()]
+        market_ids = base_db.get_market_ids(MARKET_TABLE, markets)
+    else:
+        for market in markets:
+            base_db.create_price_table(market)
+
+            for table_format in BAR_TABLES.values():
+                base_db.create_rollup_table(table_format.format(market))
+
+        rollup_tables = [x.format(y) for x in BAR_TABLES.values() for y in markets]
+        market_ids = None
+
+    # Rollup tables created before they had OHLC columns
+    ohlc_tables = set(base_db.get_tables_with_column('close') or [])
+
+    for table_name in rollup_tables:
+        if table_name not in ohlc_tables:
+            base_db.add_ohlc_columns(table_name)
 
     base_db.close()
 
-    tradebot_db = Database(hostname=HOSTNAME,
-                           username=USERNAME,
-                           password=PASSCODE,
-                           database_name=TRADEBOT_DATABASE,
-                           logger=logger)
+    tradebot_db = open_database(TRADEBOT_DATABASE, logger=logger)
 
     tradebot_db.create_trade_table(database_name)
 
     tradebot_db.close()
 
+    return market_ids
+
 
 def format_tradebot_entry(market, buy_time, buy_signal, buy_price, buy_total, sell_time, sell_signal, sell_price,
                           sell_total, profit, percent):
@@ -213,9 +324,219 @@ def shutdown_server():
 # Run functions
 # ==============================================================================
 
+def scrape_markets(markets, proxies, start_datetime, logger,
+                   interval=60,
+                   sleep_time=5,
+                   record_directory=None):
+    """
+    Fetch market history and aggregate it into entries every cycle
+    :param markets: List of markets (invalid markets are removed)
+    :param proxies: List of proxies
+    :param start_datetime: Start of first entry of all markets
+    :param logger: Main logger
+    :param interval: Duration between entries into database
+    :param sleep_time: Duration between API calls
+    :param record_directory: Directory to record raw responses to (not recorded if None)
+    :return: (generator) entries per market, start of next entry per market and bars per table format of each cycle
+    """
+
+    # Initialize Bittrex object
+    bittrex_request = Bittrex(api_key=BITTREX_CREDENTIALS.get('key'),
+                              api_secret=BITTREX_CREDENTIALS.get('secret'),
+                              dispatch=return_request_input,
+                              api_version='v1.1')
+
+    # Initialize variables
+    proxy_indexes = list(range(len(proxies)))
+    proxy_pool = ProxyPool(proxies, logger=logger) if ADAPTIVE_PROXIES else None
+    scheduler = PollScheduler(markets, interval=interval, min_period=sleep_time) if ADAPTIVE_POLLING else None
+    bar_builder = BarBuilder(resolutions=tuple(BAR_TABLES)) if BAR_TABLES else None
+    recorder = ResponseRecorder(record_directory, start_datetime) if record_directory else None
+
+    working_data = {}
+    summaries = {}
+    histories = {}
+
+    current_datetime = {k: start_datetime for k in markets}
+    last_price = {k: Decimal(0).quantize(BittrexConstants.DIGITS) for k in markets}
+    weighted_price = {k: Decimal(0).quantize(BittrexConstants.DIGITS) for k in markets}
+
+    if ASYNC_SCRAPER:
+        session = AsyncSession(timeout=REQUEST_TIMEOUT)
+        fetch_data = get_data_async
+    else:
+        session = FuturesSession(max_workers=20)
+        fetch_data = get_data
+
+    with session:
+
+        while True:
+            shuffle(proxy_indexes)
+            start = time()
+
+            if scheduler:
+                poll_markets = scheduler.get_due_markets(current_datetime, now=start)
+                complete_datetime = datetime.fromtimestamp(start).astimezone(tz=None) - \
+                    timedelta(seconds=scheduler.grace)
+            else:
+                poll_markets = markets
+                complete_datetime = None
+
+            requested_markets = list(poll_markets)
+
+            if SUMMARY_FIRST:
+                response_dict, summary_datetime = get_data_summary_first(poll_markets, bittrex_request, session,
+                                                                         proxies, proxy_indexes, summaries, histories,
+                                                                         get_function=fetch_data,
+                                                                         logger=logger,
+                                                                         proxy_pool=proxy_pool,
+                                                                         recorder=recorder)
+
+                # Unchanged markets are complete up to the time of their summary
+                if complete_datetime and summary_datetime:
+                    complete_datetime = min(complete_datetime,
+                                            summary_datetime - timedelta(seconds=scheduler.grace))
+            else:
+                response_dict = fetch_data(poll_markets, bittrex_request, session, proxies, proxy_indexes,
+                                           logger=logger,
+                                           proxy_pool=proxy_pool,
+                                           recorder=recorder)
+
+            if scheduler:
+                # Invalid markets are removed from the list of due markets
+                for market in set(requested_markets) - set(poll_markets):
+                    markets.remove(market)
+                    scheduler.remove(market)
+
+                scheduler.record_polls(poll_markets, response_dict, now=start)
+
+            working_data, current_datetime, last_price, weighted_price, entries = \
+                process_data(response_dict, working_data, current_datetime, last_price, weighted_price, logger,
+                             interval,
+                             complete_datetime=complete_datetime,
+                             bar_builder=bar_builder)
+
+            if recorder:
+                recorder.write_cycle(start, response_dict, entries, complete_datetime=complete_datetime)
+
+            yield entries, current_datetime, route_bars(bar_builder.pop_entries()) if bar_builder else {}
+
+            stop = time()
+            run_time = stop - start
+
+            if run_time > 5:
+                logger.info('Scraper: Total time: {0:.2f}s'.format(run_time))
+
+                if proxy_pool:
+                    logger.info(proxy_pool.summary())
+
+                if scheduler:
+                    logger.info(scheduler.summary())
+
+            if scheduler:
+                sleep(min(max(scheduler.get_next_poll_time(current_datetime) - stop, 0.5), sleep_time))
+            elif run_time < sleep_time:
+                sleep(sleep_time - run_time)
+
+
+def route_bars(bars):
+    """
+    Route bars of each resolution to their tables
+    :param bars: (dict) List of bars per market by resolution
+    :return: (dict) List of bars per market by table format
+    """
+
+    return {BAR_TABLES[resolution]: resolution_bars for resolution, resolution_bars in bars.items() if resolution_bars}
+
+
+def insert_entries(writer, entries,
+                   market_ids=None,
+                   table_format='{}',
+                   fields=None):
+    """
+    Queue entries of all markets for insertion by the database writer
+    :param writer: DatabaseWriter
+    :param entries: (dict) List of entries per market
+    :param market_ids: (dict) Id per market to insert into the long price table (one table per market if None)
+    :param table_format: Format of table name from market (or from PRICE_TABLE in the long layout)
+    :param fields: Fields of entries inserted (fields of format_bittrex_entry if None)
+    :return:
+    """
+
+    format_entry = partial(format_bittrex_entry, fields=fields) if fields else format_bittrex_entry
+
+    if market_ids is None:
+        writer.put(list(chain.from_iterable(
+            [[(table_format.format(x), *format_entry(y)) for y in entries[x]] for x in entries])))
+        return
+
+    table_name = table_format.format(PRICE_TABLE)
+    rows = []
+
+    for market, market_entries in entries.items():
+        for entry in market_entries:
+            columns, values = format_entry(entry)
+            rows.append((table_name, ('market_id', *columns), (market_ids[market], *values)))
+
+    writer.put(rows)
+
+
+def insert_bars(writer, bars,
+                market_ids=None):
+    """
+    Queue bars of rollup tables for insertion by the database writer
+    :param writer: DatabaseWriter
+    :param bars: (dict) List of bars per market by table format (see route_bars)
+    :param market_ids: (dict) Id per market to insert into the long price tables (one table per market if None)
+    :return:
+    """
+
+    for table_format, market_bars in bars.items():
+        insert_entries(writer, market_bars, market_ids=market_ids, table_format=table_format, fields=BAR_FIELDS)
+
+
+def start_writer(db, database_name, logger):
+    """
+    Start a database writer spilling to a file per database
+    :param db: Database
+    :param database_name: Name of database
+    :param logger:
+    :return: (DatabaseWriter)
+    """
+
+    writer = DatabaseWriter(db,
+                            spill_path=join(SPILL_DIRECTORY, 'scraper-spill.{}.jsonl'.format(database_name)),
+                            logger=logger)
+    writer.start()
+
+    return writer
+
+
+def insert_trades(db, table_name, trades, logger):
+    """
+    Insert trade entries in order. Entries are kept in trades while the database is unreachable.
+    :param db: Database
+    :param table_name: Name of trade table
+    :param trades: (list) Trade entries not yet inserted (updated in place)
+    :param logger:
+    :return:
+    """
+
+    while trades:
+        try:
+            db.insert_query(table_name, trades[0])
+        except db.unavailable_errors as e:
+            logger.error('Tradebot: Database unreachable ({}). Keeping {} trades for next insert.'.format(
+                e, len(trades)))
+            break
+
+        trades.pop(0)
+
+
 def run_scraper(control_queue, database_name, logger, markets=MARKETS,
                 interval=60,
-                sleep_time=5):
+                sleep_time=5,
+                num_shards=SCRAPER_SHARDS):
     """
     Run scraper to pull data from Bittrex
     :param control_queue: Queue to control scraper
@@ -224,88 +545,229 @@ def run_scraper(control_queue, database_name, logger, markets=MARKETS,
     :param markets: List of active markets
     :param interval: Duration between entries into database
     :param sleep_time: Duration between API calls
+    :param num_shards: Number of scraper processes (markets and proxies are split between processes)
     :return:
     """
     # Initialize database object
-    initialize_databases(database_name, markets, logger=logger)
+    market_ids = initialize_databases(database_name, markets, logger=logger)
 
-    db = Database(hostname=HOSTNAME,
-                  username=USERNAME,
-                  password=PASSCODE,
-                  database_name=database_name,
-                  logger=logger)
+    if num_shards > 1:
+        run_scraper_coordinator(control_queue, database_name, logger, markets, interval, sleep_time, num_shards,
+                                market_ids=market_ids)
+        return
 
-    # Initialize Bittrex object
-    bittrex_request = Bittrex(api_key=BITTREX_CREDENTIALS.get('key'),
-                              api_secret=BITTREX_CREDENTIALS.get('secret'),
-                              dispatch=return_request_input,
-                              api_version='v1.1')
+    db = open_database(database_name, logger=logger)
+
+    writer = start_writer(db, database_name, logger)
 
-    # Initialize variables
     run_tradebot = False
-    proxy_indexes = list(range(len(PROXIES)))
+    scraper = scrape_markets(markets, PROXIES, datetime.now().astimezone(tz=None), logger,
+                             interval=interval,
+                             sleep_time=sleep_time,
+                             record_directory=RECORD_DIRECTORY)
 
-    working_data = {}
+    try:
+
+        for entries, _, bars in scraper:
+
+            if run_tradebot:
+                tradebot_entries = {k: entries.get(k)[-1] for k in entries}
+
+                SCRAPER_TRADEBOT_QUEUE.put(tradebot_entries)
+
+            if entries or bars:
+                insert_entries(writer, entries, market_ids=market_ids)
+                insert_bars(writer, bars, market_ids=market_ids)
+
+            if writer.queue_depth:
+                logger.debug('Scraper: Database writer {}.'.format(writer.get_stats()))
+
+            if not control_queue.empty():
+
+                signal = control_queue.get()
+
+                if signal == "START TRADEBOT":
+                    run_tradebot = True
+                    logger.info("Scraper: Starting tradebot ...")
 
-    current_datetime = datetime.now().astimezone(tz=None)
-    current_datetime = {k: current_datetime for k in MARKETS}
-    last_price = {k: Decimal(0).quantize(BittrexConstants.DIGITS) for k in MARKETS}
-    weighted_price = {k: Decimal(0).quantize(BittrexConstants.DIGITS) for k in MARKETS}
+                elif signal == "STOP TRADEBOT":
+                    run_tradebot = False
+                    logger.info("Scraper: Stopping tradebot ...")
+
+                elif signal == "STOP":
+                    logger.info("Scraper: Stopping scraper ...")
+                    break
+
+    except ConnectionError as e:
+        logger.debug('ConnectionError: {}. Exiting ...'.format(e))
+    finally:
+        scraper.close()
+        writer.close()
+        db.close()
+
+        logger.info("Scraper: Stopped scraper.")
+        logger.info("Scraper: Database connection closed.")
+
+
+def run_scraper_shard(control_queue, entry_queue, shard_index, markets, proxies, start_datetime, logger,
+                      interval=60,
+                      sleep_time=5):
+    """
+    Run scraper on a shard of markets, passing entries to the coordinator
+    :param control_queue: Queue to stop shard
+    :param entry_queue: Queue to pass (shard index, entries, start of next entry of shard, bars per table format) to coordinator
+    :param shard_index: Index of shard
+    :param markets: Markets of shard
+    :param proxies: Proxies of shard
+    :param start_datetime: Start of first entry (same for all shards)
+    :param logger: Main logger
+    :param interval: Duration between entries into database
+    :param sleep_time: Duration between API calls
+    :return:
+    """
+
+    scraper = scrape_markets(markets, proxies, start_datetime, logger,
+                             interval=interval,
+                             sleep_time=sleep_time,
+                             record_directory=join(RECORD_DIRECTORY, 'shard-{}'.format(shard_index))
+                             if RECORD_DIRECTORY else None)
 
     try:
 
-        with FuturesSession(max_workers=20) as session:
+        for entries, market_datetime, bars in scraper:
 
-            while True:
-                shuffle(proxy_indexes)
-                start = time()
+            entry_queue.put((shard_index, entries, min(market_datetime.values(), default=None), bars))
 
-                response_dict = get_data(MARKETS, bittrex_request, session, PROXIES, proxy_indexes,
-                                         logger=logger)
+            if not control_queue.empty() and control_queue.get() == "STOP":
+                break
 
-                working_data, current_datetime, last_price, weighted_price, entries = \
-                    process_data(response_dict, working_data, current_datetime, last_price, weighted_price, logger,
-                                 interval)
+    except ConnectionError as e:
+        logger.debug('ConnectionError in shard {}: {}. Exiting ...'.format(shard_index, e))
+    finally:
+        scraper.close()
 
-                if run_tradebot:
-                    tradebot_entries = {k: entries.get(k)[-1] for k in entries}
+        logger.info("Scraper: Stopped shard {}.".format(shard_index))
+
+
+def run_scraper_coordinator(control_queue, database_name, logger, markets, interval, sleep_time, num_shards,
+                            market_ids=None):
+    """
+    Run scraper shards in separate processes and merge their entries per interval.
+    Entries of an interval are passed to the tradebot and inserted into the database once all shards
+    have passed the interval, or merge_timeout seconds after the interval ended.
+    :param control_queue: Queue to control scraper
+    :param database_name: Name of database
+    :param logger: Main logger
+    :param markets: List of active markets
+    :param interval: Duration between entries into database
+    :param sleep_time: Duration between API calls
+    :param num_shards: Number of scraper processes
+    :param market_ids: (dict) Id per market in the long price table layout (one table per market if None)
+    :return:
+    """
+
+    db = open_database(database_name, logger=logger)
+
+    run_tradebot = False
+    merge_timeout = interval
+
+    # All shards start their entries at the same time
+    start_datetime = datetime.now().astimezone(tz=None)
+
+    entry_queue = Queue()
+    shard_queues = [Queue() for _ in range(num_shards)]
+    shards = [Process(target=run_scraper_shard,
+                      args=(shard_queues[x], entry_queue, x, markets[x::num_shards], PROXIES[x::num_shards],
+                            start_datetime, logger, interval, sleep_time))
+              for x in range(num_shards)]
 
-                    SCRAPER_TRADEBOT_QUEUE.put(tradebot_entries)
+    for shard in shards:
+        shard.start()
 
-                if entries:
-                    formatted_entries = list(chain.from_iterable(
-                        [[(x, *format_bittrex_entry(y)) for y in entries[x]] for x in entries]))
+    pending_entries = {}
+    writer = start_writer(db, database_name, logger)
+    shard_datetimes = [start_datetime] * num_shards
 
-                    db.insert_transaction_query(formatted_entries)
+    try:
+
+        while True:
 
-                stop = time()
-                run_time = stop - start
+            try:
+                shard_index, entries, shard_datetime, bars = entry_queue.get(timeout=sleep_time)
 
-                if run_time > 5:
-                    logger.info('Scraper: Total time: {0:.2f}s'.format(run_time))
+                merge_entries(pending_entries, entries)
 
-                if run_time < sleep_time:
-                    sleep(sleep_time - run_time)
+                # Bars of additional resolutions are not passed to the tradebot
+                if bars:
+                    insert_bars(writer, bars, market_ids=market_ids)
 
-                if not control_queue.empty():
+                if shard_datetime:
+                    shard_datetimes[shard_index] = shard_datetime
+            except Empty:
+                pass
 
-                    signal = control_queue.get()
+            # Intervals all shards have passed, or that ended more than merge_timeout ago
+            closed_datetime = max(min(shard_datetimes),
+                                  datetime.now().astimezone(tz=None) - timedelta(seconds=interval + merge_timeout))
 
-                    if signal == "START TRADEBOT":
-                        run_tradebot = True
-                        logger.info("Scraper: Starting tradebot ...")
+            closed_entries = pop_closed_entries(pending_entries, closed_datetime)
 
-                    elif signal == "STOP TRADEBOT":
-                        run_tradebot = False
-                        logger.info("Scraper: Stopping tradebot ...")
+            if closed_entries:
 
-                    elif signal == "STOP":
-                        logger.info("Scraper: Stopping scraper ...")
-                        break
+                if run_tradebot:
+                    for _, interval_entries in closed_entries:
+                        SCRAPER_TRADEBOT_QUEUE.put(interval_entries)
+
+                insert_entries(writer, group_entries_by_market(closed_entries), market_ids=market_ids)
+
+            if writer.queue_depth:
+                logger.debug('Scraper: Database writer {}.'.format(writer.get_stats()))
+
+            if not control_queue.empty():
+
+                signal = control_queue.get()
+
+                if signal == "START TRADEBOT":
+                    run_tradebot = True
+                    logger.info("Scraper: Starting tradebot ...")
+
+                elif signal == "STOP TRADEBOT":
+                    run_tradebot = False
+                    logger.info("Scraper: Stopping tradebot ...")
+
+                elif signal == "STOP":
+                    logger.info("Scraper: Stopping scraper ...")
+                    break
 
     except ConnectionError as e:
         logger.debug('ConnectionError: {}. Exiting ...'.format(e))
     finally:
+        for shard_queue in shard_queues:
+            shard_queue.put("STOP")
+
+        # Shards exit after their current cycle, once their entries are received
+        deadline = time() + interval
+
+        while any(x.is_alive() for x in shards) and time() < deadline:
+            try:
+                _, entries, _, bars = entry_queue.get(timeout=1)
+
+                merge_entries(pending_entries, entries)
+
+                if bars:
+                    insert_bars(writer, bars, market_ids=market_ids)
+            except Empty:
+                pass
+
+        for shard in shards:
+            if shard.is_alive():
+                shard.terminate()
+
+        if pending_entries:
+            insert_entries(writer, group_entries_by_market(pop_closed_entries(pending_entries, None)),
+                           market_ids=market_ids)
+
+        writer.close()
         db.close()
 
         logger.info("Scraper: Stopped scraper.")
@@ -313,9 +775,10 @@ def run_scraper(control_queue, database_name, logger, markets=MARKETS,
 
 
 def run_tradebot(control_queue, data_queue, pending_order_queue, completed_order_queue,
-                 markets, amount_per_call, table_name, logger, skip_list):
+                 markets, amount_per_call, table_name, logger, skip_list,
+                 strategies=None):
     """
-    Run trading algorithm on real-time market data
+    Run trading strategies on real-time market data
     :param pending_order_queue: Queue to pass orders to manager
     :param completed_order_queue: Queue to recieve completed orders from manager
     :param control_queue: Queue to control tradebot
@@ -325,24 +788,53 @@ def run_tradebot(control_queue, data_queue, pending_order_queue, completed_order
     :param table_name: Name of SQL table to record data
     :param logger: Main logger
     :param skip_list: List of markets to skip
+    :param strategies: (dict) Routing per name of registered strategy (TRADEBOT_STRATEGIES if None)
     :return:
     """
 
+    strategies = strategies or TRADEBOT_STRATEGIES
+
     market_data = {}
     market_status = {}
+    routers = {}
+    paper_routers = []
+    paper_orders = []
+    trade_tables = {}
+    unsaved_trades = {}
+
+    # Strategies share the bars of markets, each has its own statuses, order routing and trade table
+    for index, (name, routing) in enumerate(strategies.items()):
 
-    for market in markets:
+        if routing not in ROUTINGS:
+            raise ValueError('Tradebot: Routing of strategy {} is {}, not one of {}.'.format(name, routing, ROUTINGS))
+
+        market_status[name] = {x: BittrexStatus(market=x) for x in markets if x not in skip_list}
+
+        if routing == 'paper':
+            routers[name] = PaperRouter(name)
+            paper_routers.append(routers[name])
+        else:
+            routers[name] = LiveRouter(name, pending_order_queue)
 
-        if market not in skip_list:
-            market_status[market] = BittrexStatus(market=market)
-            market_data[market] = BittrexData(market=market)
+        trade_tables[name] = table_name if index == 0 else '{}_{}'.format(table_name, name)
+        unsaved_trades[name] = []
+
+    strategy_list = [get_strategy(x) for x in strategies]
+
+    if TRADEBOT_BATCH:
+        market_data = BittrexMarketData(markets=[x for x in markets if x not in skip_list],
+                                        capacity=TRADEBOT_LOOKBACK + 1)
+        get_data = market_data.get_market
+    else:
+        for market in markets:
+
+            if market not in skip_list:
+                market_data[market] = BittrexData(market=market, capacity=TRADEBOT_LOOKBACK + 1)
+
+        get_data = market_data.get
 
     # Initialize SQL database connection
-    db = Database(hostname=HOSTNAME,
-                  username=USERNAME,
-                  password=PASSCODE,
-                  database_name=TRADEBOT_DATABASE,
-                  logger=logger)
+    db = open_database(TRADEBOT_DATABASE, logger=logger)
 
     # Initialize Bittrex object
     bittrex = Bittrex(api_key=BITTREX_CREDENTIALS.get('key'),
@@ -350,61 +842,80 @@ def run_tradebot(control_queue, data_queue, pending_order_queue, completed_order
                       api_version='v1.1')
 
     try:
+        for name in strategies:
+            db.create_trade_table(trade_tables[name])
+
         while True:
 
             # Receive data from scraper
             scraper_data = data_queue.get()
 
+            # Retry trades not inserted while the database was unreachable
+            for name, trades in unsaved_trades.items():
+                if trades:
+                    insert_trades(db, trade_tables[name], trades, logger)
+
             # Add received scraper data from running data
-            for market, entry in scraper_data.items():
-
-                if market not in skip_list:
-                    if entry.get('wprice') > 0:  # Temporary fix for entries with 0 price
-                        market_data[market].datetime.append(entry.get('datetime'))
-                        market_data[market].wprice.append(entry.get('wprice'))
-                        market_data[market].buy_volume.append(entry.get('buy_volume'))
-                        market_data[market].sell_volume.append(entry.get('sell_volume'))
-
-            # Check if any orders completed
-            if not completed_order_queue.empty():
-
-                while not completed_order_queue.empty():
-
-                    completed_order = completed_order_queue.get()
-                    order_market = completed_order.market
-
-                    # Update market statuses with completed orders
-                    if completed_order.type == OrderType.BUY.name:
-
-                        # Check if buy order skipped
-                        if completed_order.status == OrderStatus.SKIPPED.name:
-                            market_status[order_market].bought = False
-                            market_status[order_market].buy_signal = None
-                            logger.info('Tradebot: Received skipped buy order. Skipping buy order for {}.'.format(
-                                order_market))
-                        else:
-                            market_status[order_market].buy_order = completed_order
-                            logger.info('Tradebot: Received completed buy order for {}.'.format(order_market))
+            if TRADEBOT_BATCH:
+                market_data.append({x: (y.get('datetime'), y.get('wprice'), y.get('buy_volume'), y.get('sell_volume'))
+                                    for x, y in scraper_data.items()
+                                    if x not in skip_list and y.get('wprice') > 0})  # Temporary fix for 0 price
+            else:
+                for market, entry in scraper_data.items():
+
+                    if market not in skip_list:
+                        if entry.get('wprice') > 0:  # Temporary fix for entries with 0 price
+                            market_data[market].append(entry.get('datetime'),
+                                                       entry.get('wprice'),
+                                                       entry.get('buy_volume'),
+                                                       entry.get('sell_volume'))
+
+            # Orders completed by the manager, and orders of paper strategies filled at the previous bars
+            completed_orders = paper_orders
+            paper_orders = []
+
+            while not completed_order_queue.empty():
+                completed_orders.append(completed_order_queue.get())
+
+            for completed_order in completed_orders:
+
+                order_market = completed_order.market
+                strategy = completed_order.strategy
+                strategy_status = market_status[strategy]
+
+                # Update market statuses with completed orders
+                if completed_order.type == OrderType.BUY.name:
+
+                    # Check if buy order skipped
+                    if completed_order.status == OrderStatus.SKIPPED.name:
+                        strategy_status[order_market].bought = False
+                        strategy_status[order_market].buy_signal = None
+                        logger.info('Tradebot: Received skipped buy order. Skipping buy order for {} ({}).'.format(
+                            order_market, strategy))
                     else:
-                        market_status[order_market].sell_order = completed_order
-                        logger.info('Tradebot: Received completed sell order for {}.'.format(order_market))
+                        strategy_status[order_market].buy_order = completed_order
+                        logger.info('Tradebot: Received completed buy order for {} ({}).'.format(
+                            order_market, strategy))
+                else:
+                    strategy_status[order_market].sell_order = completed_order
+                    logger.info('Tradebot: Received completed sell order for {} ({}).'.format(order_market, strategy))
 
-                        status = market_status[order_market]
+                    status = strategy_status[order_market]
 
-                        # Completed buy and sell order for single market
-                        if status.buy_order.status == OrderStatus.COMPLETED.name and \
-                                status.sell_order.status == OrderStatus.COMPLETED.name:
-                            profit = (status.sell_order.final_total + status.buy_order.final_total).quantize(
-                                BittrexConstants.DIGITS)
-                            percent = (profit * Decimal(-100) / status.buy_order.final_total).quantize(
-                                Decimal(10) ** -4)
+                    # Completed buy and sell order for single market
+                    if status.buy_order.status == OrderStatus.COMPLETED.name and \
+                            status.sell_order.status == OrderStatus.COMPLETED.name:
+                        profit = (status.sell_order.final_total + status.buy_order.final_total).quantize(
+                            BittrexConstants.DIGITS)
+                        percent = (profit * Decimal(-100) / status.buy_order.final_total).quantize(
+                            Decimal(10) ** -4)
 
-                            formatted_buy_time = format_time(status.buy_order.closed_time, "%Y-%m-%d %H:%M:%S")
-                            formatted_sell_time = format_time(status.sell_order.closed_time, "%Y-%m-%d %H:%M:%S")
+                        formatted_buy_time = format_time(status.buy_order.closed_time, "%Y-%m-%d %H:%M:%S")
+                        formatted_sell_time = format_time(status.sell_order.closed_time, "%Y-%m-%d %H:%M:%S")
 
-                            logger.info('Tradebot: completed buy/sell order for {}.'.format(order_market))
+                        logger.info('Tradebot: completed buy/sell order for {} ({}).'.format(order_market, strategy))
 
-                            db.insert_query(table_name, format_tradebot_entry(order_market,
+                        unsaved_trades[strategy].append(format_tradebot_entry(order_market,
                                                                               formatted_buy_time,
                                                                               status.buy_signal,
                                                                               status.buy_order.actual_price,
@@ -416,30 +927,51 @@ def run_tradebot(control_queue, data_queue, pending_order_queue, completed_order
                                                                               profit,
                                                                               percent))
 
-                            # Reset buy/sell orders and buy/sell signals
-                            status.clear_orders()
-                            status.buy_signal = None
-                            status.sell_signal = None
-                        else:
-                            logger.error('Tradebot: Attempted to insert INCOMPLETE BUY and SELL order into database.')
+                        insert_trades(db, trade_tables[strategy], unsaved_trades[strategy], logger)
+
+                        # Reset buy/sell orders and buy/sell signals
+                        status.clear_orders()
+                        status.buy_signal = None
+                        status.sell_signal = None
+                    else:
+                        logger.error('Tradebot: Attempted to insert INCOMPLETE BUY and SELL order into database.')
+
+            if TRADEBOT_BATCH:
+                received = [x for x in scraper_data if x not in skip_list]
+                ready = list(compress(received, (market_data.size[market_data.get_rows(received)] >
+                                                 TRADEBOT_LOOKBACK).tolist()))
+
+                # Clear the first entries
+                market_data.clear_first(ready)
 
-            for market in scraper_data.keys():
+                for strategy in strategy_list:
+                    strategy.run_batch(market_data,
+                                       market_status[strategy.name],
+                                       ready,
+                                       amount_per_call,
+                                       routers[strategy.name],
+                                       logger)
+            else:
+                for market in scraper_data.keys():
 
-                data = market_data.get(market)
+                    data = market_data.get(market)
 
-                if market not in skip_list:
-                    if len(data.datetime) > 65:
+                    if market not in skip_list:
+                        if len(data) > TRADEBOT_LOOKBACK:
 
-                        # Clear the first entries
-                        data.clear_first()
+                            # Clear the first entries
+                            data.clear_first()
 
-                        status = market_status.get(market)
+                            for strategy in strategy_list:
+                                strategy.run(data,
+                                             market_status[strategy.name][market],
+                                             amount_per_call,
+                                             routers[strategy.name],
+                                             logger)
 
-                        run_algorithm(data,
-                                      status,
-                                      amount_per_call,
-                                      pending_order_queue,
-                                      logger)
+            # Fill orders of paper strategies at the latest bars
+            for router in paper_routers:
+                paper_orders += router.fill(get_data)
 
             if not control_queue.empty():
 
@@ -454,6 +986,9 @@ def run_tradebot(control_queue, data_queue, pending_order_queue, completed_order
         #logger.error(e)
         #logger.info('Tradebot: Stopping tradebot ...')
     finally:
+        for trade in chain.from_iterable(unsaved_trades.values()):
+            logger.error('Tradebot: Trade not inserted: {}'.format(trade))
+
         db.close()
         logger.info('Tradebot: Database connection closed.')
 
@@ -1,31 +1,48 @@
 from concurrent.futures import as_completed
-from copy import deepcopy
 from decimal import Decimal
-from datetime import timedelta
+from datetime import timedelta, timezone
+from json import loads
+from math import floor
+from time import sleep, time
+from numpy import asarray, dot, float64, int64, ndarray
 from requests.exceptions import ConnectTimeout, ConnectionError, ProxyError, ReadTimeout
 
+from bittrex.bittrex2 import Bittrex, format_bittrex_entry, return_request_input
+from bittrex.BittrexTrades import BittrexTrades
+from utilities.async_network import AsyncSession
+from utilities.constants import BittrexConstants
 from utilities.network import configure_ip, process_response
-from utilities.time import convert_bittrex_timestamp_to_datetime, format_time, utc_to_local
+from utilities.ResponseRecorder import ReplayTransport
+from utilities.satoshi import FLOAT_TOLERANCE, SATOSHI_DIGITS, divide_round_half_even, from_satoshi, to_satoshi, \
+    to_satoshi_array
+from utilities.time import convert_bittrex_timestamp_to_datetime, convert_datetime_to_epoch, format_time
 
+# Minimum number of orders in an interval before prices are converted with numpy
+NUMPY_MIN_ORDERS = 32
 
-def get_interval_index(timestamp_list, target_datetime, interval):
+# Fields of a market summary that change when the market trades
+SUMMARY_FIELDS = ('Last', 'Volume', 'BaseVolume')
+
+
+def get_interval_index(timestamps, start_timestamp, interval):
     """
-    Get index of start and stop positions of interval from a list of data entries.
-    :param timestamp_list: list
-    :param target_datetime: (datetime) Start of interval
+    Get index of start and stop positions of interval from sorted timestamps (binary search).
+    Interval contains timestamps t where start_timestamp < t <= start_timestamp + interval.
+    :param timestamps: (numpy.ndarray) Microseconds since epoch in ascending order
+    :param start_timestamp: (int) Start of interval in microseconds since epoch
     :param interval: (int) Seconds between data points
     :return:
     """
 
-    stop_index = len([x for x in timestamp_list if x > target_datetime])
-    start_index = len([x for x in timestamp_list if (x - target_datetime).total_seconds() > interval])
+    start_index, stop_index = timestamps.searchsorted((start_timestamp, start_timestamp + interval * 1000000),
+                                                      side='right').tolist()
 
     return start_index, stop_index
 
 
-def calculate_metrics(data, start_datetime, digits=8):
+def calculate_metrics_decimal(data, start_datetime, digits=8):
     """
-    Calculate metrics.
+    Calculate metrics using Decimal arithmetic (reference implementation of calculate_metrics).
     :param data: (list(dict)) Buy/sell orders over an interval
     :param start_datetime: Start of interval
     :param digits: (int) Number of decimal places
@@ -76,11 +93,143 @@ def calculate_metrics(data, start_datetime, digits=8):
     return metrics
 
 
-def get_data(markets, bittrex, session, proxies, proxy_indexes, logger=None):
+def _weighted_price_satoshi(price_satoshis, totals, volume_total, dot_product=False):
+    """
+    Volume weighted price in satoshi units, rounded like the Decimal reference implementation.
+    The float estimate is used unless it lies within its error bound of a half satoshi,
+    in which case the Decimal computation decides the rounding.
+    :param price_satoshis: Prices in satoshi units
+    :param totals: (tuple(float)) Order totals
+    :param volume_total: (float) Sum of order totals
+    :param dot_product: (bool) Price satoshis are a numpy array
+    :return: (int)
+    """
+
+    if dot_product:
+        estimate = float(dot(price_satoshis.astype(float64), asarray(totals, dtype=float64))) / volume_total
+    else:
+        estimate = sum(p * v for p, v in zip(price_satoshis, totals)) / volume_total
+
+    lower = floor(estimate)
+    fraction = estimate - lower
+
+    if abs(fraction - 0.5) > estimate * (len(totals) + 2) * FLOAT_TOLERANCE:
+        return int(lower) + (fraction > 0.5)
+
+    weighted_price = sum([from_satoshi(p) * Decimal(v) for p, v in zip(price_satoshis, totals)]) / Decimal(volume_total)
+
+    return to_satoshi(weighted_price)
+
+
+def calculate_metrics_satoshi(price_satoshis, totals, buy_totals, sell_totals, start_datetime):
+    """
+    Calculate metrics from orders parsed into satoshi prices.
+    All metrics are computed with integer arithmetic; results are identical to calculate_metrics_decimal.
+    :param price_satoshis: (list(int) or numpy.ndarray) Prices in satoshi units, newest order first
+    :param totals: (list(float)) Order totals, newest order first
+    :param buy_totals: (list(float)) Totals of buy orders, newest order first
+    :param sell_totals: (list(float)) Totals of sell orders, newest order first
+    :param start_datetime: Start of interval
+    :return:
+    """
+
+    volume = 0
+    buy_volume = 0
+    sell_volume = 0
+    buy_order = 0
+    sell_order = 0
+    price = 0
+    price_volume_weighted = 0
+    formatted_time = format_time(start_datetime,
+                                 "%Y-%m-%d %H:%M:%S")
+
+    if totals:
+        # Volumes are summed as floats before rounding, as in calculate_metrics_decimal
+        volume_total = sum(totals)
+        volume = from_satoshi(to_satoshi(volume_total))
+
+        # Need this: volume can be 0
+        if volume != 0:
+            buy_volume = from_satoshi(to_satoshi(sum(buy_totals)))
+            sell_volume = from_satoshi(to_satoshi(sum(sell_totals)))
+            buy_order = len(buy_totals)
+            sell_order = len(totals) - buy_order
+
+            use_numpy = len(totals) >= NUMPY_MIN_ORDERS
+
+            if use_numpy:
+                price_satoshis = asarray(price_satoshis, dtype=int64)
+                price_total = int(price_satoshis.sum())
+            else:
+                if isinstance(price_satoshis, ndarray):
+                    price_satoshis = price_satoshis.tolist()
+                price_total = sum(price_satoshis)
+
+            price = from_satoshi(divide_round_half_even(price_total, len(totals)))
+            price_volume_weighted = from_satoshi(
+                _weighted_price_satoshi(price_satoshis, totals, volume_total, dot_product=use_numpy))
+
+    metrics = {'base_volume': volume,
+               'buy_order': buy_order,
+               'sell_order': sell_order,
+               'buy_volume': buy_volume,
+               'sell_volume': sell_volume,
+               'price': price,
+               'wprice': price_volume_weighted,
+               'datetime': start_datetime,
+               'time': formatted_time}
+
+    return metrics
+
+
+def calculate_metrics(data, start_datetime, digits=8):
+    """
+    Calculate metrics.
+    Prices are parsed once into satoshi units (see calculate_metrics_satoshi).
+    :param data: (list(dict)) Buy/sell orders over an interval
+    :param start_datetime: Start of interval
+    :param digits: (int) Number of decimal places
+    :return:
+    """
+    if digits != SATOSHI_DIGITS:
+        return calculate_metrics_decimal(data, start_datetime, digits)
+
+    if not (data and isinstance(data[0], dict)):
+        return calculate_metrics_satoshi([], [], [], [], start_datetime)
+
+    prices, totals, order_types = zip(*[(x.get('Price'), x.get('Total'), x.get('OrderType')) for x in data])
+
+    buy_totals = [x for x, y in zip(totals, order_types) if y == 'BUY']
+    sell_totals = [x for x, y in zip(totals, order_types) if y == 'SELL']
+
+    if len(prices) >= NUMPY_MIN_ORDERS:
+        price_satoshis = to_satoshi_array(prices)
+    else:
+        price_satoshis = [to_satoshi(x) for x in prices]
+
+    return calculate_metrics_satoshi(price_satoshis, totals, buy_totals, sell_totals, start_datetime)
+
+
+def get_data(markets, bittrex, session, proxies, proxy_indexes, logger=None, proxy_pool=None, recorder=None):
+    """
+    Get market history of all markets with a FuturesSession.
+    :param markets: List of markets
+    :param bittrex: Bittrex returning request input
+    :param session: FuturesSession
+    :param proxies: List of proxies
+    :param proxy_indexes: Proxy index per market (ignored if proxy_pool is given)
+    :param logger:
+    :param proxy_pool: ProxyPool assigning proxies and recording their latency and failures
+    :param recorder: ResponseRecorder recording raw responses
+    :return: (dict) Market history per market
+    """
 
     futures = []
     response_dict = {}
 
+    if proxy_pool:
+        proxy_indexes = proxy_pool.assign(len(markets))
+
     for index in range(len(markets)):
         market = markets[index]
         request_input = bittrex.get_market_history(market)
@@ -99,13 +248,24 @@ def get_data(markets, bittrex, session, proxies, proxy_indexes, logger=None):
         response.market = market
         response.url = request_input.get('url')
         response.headers = headers
+        response.proxy_index = proxy_indexes[index]
 
         futures.append(response)
 
     for future in as_completed(futures):
 
         try:
-            response_data = future.result().data
+            result = future.result()
+            response_data = result.data
+
+            if recorder:
+                recorder.record_response(future.market, time(), result.content)
+
+            if proxy_pool:
+                if response_data.get('message') == "NO_API_RESPONSE":
+                    proxy_pool.record_failure(future.proxy_index)
+                else:
+                    proxy_pool.record_success(future.proxy_index, result.elapsed.total_seconds())
 
             if not response_data.get('success'):
                 if response_data.get('message') == "INVALID_MARKET":
@@ -120,26 +280,262 @@ def get_data(markets, bittrex, session, proxies, proxy_indexes, logger=None):
 
         except (ProxyError, ConnectTimeout, ConnectionError, ReadTimeout):
 
+            if proxy_pool and future.exception():
+                proxy_pool.record_failure(future.proxy_index)
+
             # logger.info('Failed API call for {}, skipping.'.format(future.market))
             pass
 
     return response_dict
 
 
-def process_data(input_data, working_data, market_datetime, last_price, weighted_price, logger, interval=60):
+def get_data_async(markets, bittrex, session, proxies, proxy_indexes, logger=None, proxy_pool=None, recorder=None):
+    """
+    Get market history of all markets concurrently (drop-in replacement for get_data).
+    :param markets: List of markets
+    :param bittrex: Bittrex returning request input
+    :param session: AsyncSession
+    :param proxies: List of proxies
+    :param proxy_indexes: Proxy index per market (ignored if proxy_pool is given)
+    :param logger:
+    :param proxy_pool: ProxyPool assigning proxies and recording their latency and failures
+    :param recorder: ResponseRecorder recording raw responses
+    :return: (dict) Market history per market
+    """
+
+    response_dict = {}
+    requests = []
+
+    if proxy_pool:
+        proxy_indexes = proxy_pool.assign(len(markets))
+
+    for index in range(len(markets)):
+        request_input = bittrex.get_market_history(markets[index])
+
+        requests.append({'url': request_input.get('url'),
+                         'headers': {"apisign": request_input.get('apisign')},
+                         'proxy': proxies[proxy_indexes[index]]})
+
+    start = time()
+
+    for market, proxy_index, response in zip(list(markets), proxy_indexes, session.get_all(requests)):
+
+        # Any exception of a request is a failed request (network error or malformed response)
+        if isinstance(response, BaseException):
+            if proxy_pool:
+                proxy_pool.record_failure(proxy_index)
+
+            # logger.info('Failed API call for {}, skipping.'.format(market))
+            continue
+
+        if recorder:
+            recorder.record_response(market, start + response[2], response[1])
+
+        try:
+            response_data = loads(response[1].decode('utf-8'))
+        except ValueError:
+            response_data = {'success': False, 'message': 'NO_API_RESPONSE', 'result': None}
+
+        if proxy_pool:
+            if response_data.get('message') == "NO_API_RESPONSE":
+                proxy_pool.record_failure(proxy_index)
+            else:
+                proxy_pool.record_success(proxy_index, response[2])
+
+        if not response_data.get('success'):
+            if response_data.get('message') == "INVALID_MARKET":
+                markets.remove(market)
+                logger.debug('Removed {}: invalid market ...'.format(market))
+            continue
+
+        response_dict[market] = response_data.get('result')
+
+    return response_dict
+
+
+def get_market_summaries(bittrex, session, proxy, logger=None):
+    """
+    Get summaries of all markets in one API call.
+    :param bittrex: Bittrex returning request input
+    :param session: FuturesSession or AsyncSession
+    :param proxy: Proxy address
+    :param logger:
+    :return: (dict) Summary per market or None if the API call failed
+    """
+
+    request_input = bittrex.get_market_summaries()
+    url = request_input.get('url')
+    headers = {"apisign": request_input.get('apisign')}
+
+    if isinstance(session, AsyncSession):
+        response = session.get_all([{'url': url, 'headers': headers, 'proxy': proxy}])[0]
+
+        if isinstance(response, BaseException):
+            return None
+
+        body = response[1]
+    else:
+        try:
+            body = session.get(url, headers=headers, timeout=3, proxies=configure_ip(proxy)).result().content
+        except (ProxyError, ConnectTimeout, ConnectionError, ReadTimeout):
+            return None
+
+    try:
+        response_data = loads(body.decode('utf-8'))
+    except ValueError:
+        return None
+
+    if not response_data.get('success') or not response_data.get('result'):
+        if logger:
+            logger.debug('Failed to get market summaries: {}'.format(response_data.get('message')))
+        return None
+
+    return {x.get('MarketName'): x for x in response_data.get('result')}
+
+
+def get_changed_markets(markets, summaries, previous_summaries, histories):
+    """
+    Get markets that traded since their last market history (or have no summary or history).
+    :param markets: List of markets
+    :param summaries: (dict) Current summary per market
+    :param previous_summaries: (dict) Summary per market when its last market history was received
+    :param histories: (dict) Last market history per market
+    :return: (list) Markets
+    """
+
+    changed_markets = []
+
+    for market in markets:
+        summary = summaries.get(market)
+        previous_summary = previous_summaries.get(market)
+
+        if summary is None or previous_summary is None or market not in histories or \
+                any(summary.get(x) != previous_summary.get(x) for x in SUMMARY_FIELDS):
+            changed_markets.append(market)
+
+    return changed_markets
+
+
+def get_data_summary_first(markets, bittrex, session, proxies, proxy_indexes, previous_summaries, histories,
+                           get_function=get_data_async,
+                           logger=None,
+                           proxy_pool=None,
+                           recorder=None):
+    """
+    Get market history of markets whose summary changed (drop-in replacement for get_data).
+    Markets are checked with one getmarketsummaries call, then market history is fetched only for
+    markets that traded; unchanged markets return their last market history.
+    If the summaries cannot be fetched, market history of all markets is fetched.
+    :param markets: List of markets
+    :param bittrex: Bittrex returning request input
+    :param session: FuturesSession or AsyncSession
+    :param proxies: List of proxies
+    :param proxy_indexes: Proxy index per market (ignored if proxy_pool is given)
+    :param previous_summaries: (dict) Summary per market when its last market history was received (updated)
+    :param histories: (dict) Last market history per market (updated)
+    :param get_function: get_data or get_data_async
+    :param logger:
+    :param proxy_pool: ProxyPool assigning proxies and recording their latency and failures
+    :param recorder: ResponseRecorder recording raw market history responses
+    :return: (tuple) market history per market, time up to which summaries are complete (UTC) or None
+    """
+
+    if not markets:
+        return {}, None
+
+    summary_proxy_index = proxy_pool.assign(1)[0] if proxy_pool else proxy_indexes[-1]
+    summaries = get_market_summaries(bittrex, session, proxies[summary_proxy_index], logger=logger)
+
+    if summaries is None:
+        changed_markets = list(markets)
+        summaries = {}
+        summary_datetime = None
+    else:
+        changed_markets = get_changed_markets(markets, summaries, previous_summaries, histories)
+        summary_datetime = min([convert_bittrex_timestamp_to_datetime(summaries[x].get('TimeStamp'))
+                                for x in markets if x in summaries] or [None])
+
+        if summary_datetime:
+            summary_datetime = summary_datetime.replace(tzinfo=timezone.utc)
+
+    requested_markets = list(changed_markets)
+    response_dict = get_function(changed_markets, bittrex, session, proxies, proxy_indexes,
+                                 logger=logger,
+                                 proxy_pool=proxy_pool,
+                                 recorder=recorder)
+
+    # Invalid markets are removed from the list of changed markets
+    for market in set(requested_markets) - set(changed_markets):
+        markets.remove(market)
+
+    for market, history in response_dict.items():
+        histories[market] = history
+
+        if market in summaries:
+            previous_summaries[market] = summaries.get(market)
+        else:
+            previous_summaries.pop(market, None)
+
+    # Unchanged markets did not trade since their last market history
+    for market in markets:
+        if market not in response_dict and market not in requested_markets:
+            response_dict[market] = histories.get(market)
+
+    return response_dict, summary_datetime
+
+
+def is_bar_closed(timestamps, bar_end, complete_timestamp=None):
+    """
+    Check if all trades of a bar are known: a later trade exists or the data is complete past the end of the bar.
+    :param timestamps: Trade timestamps (microseconds since epoch, oldest first)
+    :param bar_end: End of bar (microseconds since epoch)
+    :param complete_timestamp: Time up to which all trades are known (microseconds since epoch)
+    :return: (bool)
+    """
+
+    if len(timestamps) and timestamps[-1] > bar_end:
+        return True
+
+    return complete_timestamp is not None and complete_timestamp >= bar_end
+
+
+def process_data(input_data, working_data, market_datetime, last_price, weighted_price, logger, interval=60,
+                 complete_datetime=None,
+                 bar_builder=None):
+    """
+    Add market histories to working data and compute all closed bars.
+    Quiet bars are forward-filled with the last price once a later trade arrives or,
+    if complete_datetime is given, once they end before complete_datetime.
+    :param input_data: (dict) Market history per polled market
+    :param working_data: (dict) BittrexTrades per market
+    :param market_datetime: (dict) Start of current bar per market
+    :param last_price: (dict) Last price per market
+    :param weighted_price: (dict) Last weighted price per market
+    :param logger:
+    :param interval: Duration of bars in seconds
+    :param complete_datetime: Time up to which input data holds all trades of the polled markets
+    :param bar_builder: BarBuilder receiving new trades of all markets (bars are collected with pop_entries)
+    :return: (tuple) working_data, market_datetime, last_price, weighted_price, entries
+    """
 
     entries = {}
+    interval_length = interval * 1000000
+    complete_timestamp = convert_datetime_to_epoch(complete_datetime) if complete_datetime else None
 
     if not working_data:
-        working_data = deepcopy(input_data)
+        working_data = {k: BittrexTrades(market=k, trades=v) for k, v in input_data.items()}
+
+        if bar_builder:
+            for market, working_trades in working_data.items():
+                bar_builder.start(market, market_datetime.get(market))
+                bar_builder.add_trades(market, *working_trades.get_latest(len(working_trades)))
 
-    for market in working_data:
+    for market, working_trades in working_data.items():
 
         input_list = input_data.get(market)
-        working_list = working_data.get(market)
 
         try:
-            last_id = working_list[0].get('Id')
+            last_id = working_trades.last_id
 
             if input_list[0].get('Id') < last_id:  # TODO: Why does this happen? current response has smaller ID than previous response
                 continue
@@ -150,55 +546,154 @@ def process_data(input_data, working_data, market_datetime, last_price, weighted
 
         current_datetime = market_datetime.get(market)
 
-        id_list = [x.get('Id') for x in input_list]
+        num_added = working_trades.add(input_list)
 
-        if last_id in id_list:
-            overlap_index = id_list.index(last_id)
-            working_list = input_list[:overlap_index] + working_list
-        else:
-            working_list = input_list + working_list
+        if num_added == len(input_list):
             logger.debug('SKIPPED NUMBER OF ORDERS, HIGH ORDER VOLUME!!!!!!!!')
             logger.debug('Latest ID in {} working list not found in input data. Adding all input data to working list.'.format(market))
 
-        working_data[market] = working_list
+        if bar_builder:
+            if market not in bar_builder:
+                bar_builder.start(market, current_datetime)
 
-        latest_datetime = utc_to_local(convert_bittrex_timestamp_to_datetime(working_list[0].get('TimeStamp')))
+            if num_added:
+                bar_builder.add_trades(market, *working_trades.get_latest(num_added))
 
-        if (latest_datetime - current_datetime).total_seconds() > interval:
+            if complete_datetime:
+                bar_builder.close_bars(market, complete_datetime)
 
-            entries[market] = []
+        timestamps = working_trades.timestamps
+        current_timestamp = convert_datetime_to_epoch(current_datetime)
 
-            timestamp_list = [utc_to_local(convert_bittrex_timestamp_to_datetime(x.get('TimeStamp')))
-                              for x in working_list]
+        while is_bar_closed(timestamps, current_timestamp + interval_length, complete_timestamp):
 
-            start, stop = get_interval_index(timestamp_list, current_datetime, interval)
+            start, stop = get_interval_index(timestamps, current_timestamp, interval)
 
             if start == stop:
-                while (current_datetime + timedelta(seconds=interval)) < timestamp_list[start - 1]:
-                    metrics = calculate_metrics(working_list[start:stop], current_datetime)
-
-                    metrics['price'] = last_price.get(market)
-                    metrics['wprice'] = weighted_price.get(market)
-
-                    entries[market].append(metrics)
+                metrics = calculate_metrics([], current_datetime)
 
-                    current_datetime = current_datetime + timedelta(seconds=interval)
-
-                market_datetime[market] = current_datetime
-
-                if len(entries[market]) == 0:
-                    print("0 ENTIRES!!!")
+                metrics['price'] = last_price.get(market)
+                metrics['wprice'] = weighted_price.get(market)
             else:
-                metrics = calculate_metrics(working_list[start:stop], current_datetime)
-                entries[market].append(metrics)
+                metrics = calculate_metrics_satoshi(*working_trades.get_interval(start, stop), current_datetime)
 
-                market_datetime[market] = current_datetime + timedelta(seconds=interval)
                 last_price[market] = metrics.get('price')
                 weighted_price[market] = metrics.get('wprice')
 
-                if len(entries[market]) == 0:
-                    print("0 ENTIRES!!!")
+            entries.setdefault(market, []).append(metrics)
+
+            working_trades.clear_before(stop)
+            timestamps = working_trades.timestamps
 
-            working_data[market] = working_list[:start]
+            current_datetime = current_datetime + timedelta(seconds=interval)
+            current_timestamp = convert_datetime_to_epoch(current_datetime)
+
+        market_datetime[market] = current_datetime
 
     return working_data, market_datetime, last_price, weighted_price, entries
+
+
+def merge_entries(pending_entries, entries):
+    """
+    Add entries of several markets to pending entries grouped by interval.
+    :param pending_entries: (dict) Entry per market by start of interval (updated)
+    :param entries: (dict) List of entries per market
+    :return:
+    """
+
+    for market, market_entries in entries.items():
+        for entry in market_entries:
+            pending_entries.setdefault(entry.get('datetime'), {})[market] = entry
+
+
+def pop_closed_entries(pending_entries, closed_datetime):
+    """
+    Remove and return pending entries of intervals starting before closed_datetime.
+    :param pending_entries: (dict) Entry per market by start of interval
+    :param closed_datetime: Start of first open interval (all intervals are closed if None)
+    :return: (list(tuple)) Start of interval and entry per market, oldest interval first
+    """
+
+    closed = sorted(x for x in pending_entries if closed_datetime is None or x < closed_datetime)
+
+    return [(x, pending_entries.pop(x)) for x in closed]
+
+
+def group_entries_by_market(interval_entries):
+    """
+    Group entries of several intervals by market.
+    :param interval_entries: (list(tuple)) Start of interval and entry per market
+    :return: (dict) List of entries per market
+    """
+
+    entries = {}
+
+    for _, market_entries in interval_entries:
+        for market, entry in market_entries.items():
+            entries.setdefault(market, []).append(entry)
+
+    return entries
+
+
+def replay_cycles(cycles, speed=None, interval=60, logger=None):
+    """
+    Feed recorded scraper cycles through get_data_async and process_data.
+    :param cycles: Recorded cycles (see ResponseRecorder.read_cycles)
+    :param speed: Speed-up relative to the recorded cycle times (as fast as possible if None)
+    :param interval: Duration of bars in seconds
+    :param logger:
+    :return: (generator) recorded cycle and replayed entries (formatted like recorded bars) of each cycle
+    """
+
+    bittrex = Bittrex(api_key=None, api_secret=None, dispatch=return_request_input, api_version='v1.1')
+    transport = ReplayTransport()
+
+    start_datetime = None
+    first_cycle_time = None
+    replay_start = time()
+
+    with AsyncSession(transport=transport) as session:
+
+        for cycle in cycles:
+
+            # New scraper session
+            if cycle.get('start_datetime') != start_datetime:
+                start_datetime = cycle.get('start_datetime')
+
+                working_data = {}
+                histories = {}
+                market_datetime = {}
+                last_price = {}
+                weighted_price = {}
+
+            if speed:
+                if first_cycle_time is None:
+                    first_cycle_time = cycle.get('cycle_time')
+
+                delay = (cycle.get('cycle_time') - first_cycle_time) / speed - (time() - replay_start)
+
+                if delay > 0:
+                    sleep(delay)
+
+            markets = [x[1] for x in cycle.get('responses')]
+            transport.responses = {x[1]: x[2] for x in cycle.get('responses')}
+
+            response_dict = get_data_async(markets, bittrex, session, [None], [0] * len(markets), logger=logger)
+            histories.update(response_dict)
+
+            # Markets not fetched in summary first mode
+            for market in cycle.get('reused'):
+                response_dict[market] = histories.get(market)
+
+            for market in response_dict:
+                if market not in market_datetime:
+                    market_datetime[market] = start_datetime
+                    last_price[market] = Decimal(0).quantize(BittrexConstants.DIGITS)
+                    weighted_price[market] = Decimal(0).quantize(BittrexConstants.DIGITS)
+
+            working_data, market_datetime, last_price, weighted_price, entries = \
+                process_data(response_dict, working_data, market_datetime, last_price, weighted_price, logger,
+                             interval,
+                             complete_datetime=cycle.get('complete_datetime'))
+
+            yield cycle, {k: [list(map(str, format_bittrex_entry(x)[1])) for x in v] for k, v in entries.items()}
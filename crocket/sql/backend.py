@@ -0,0 +1,320 @@
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from numpy import empty, resize
+
+from utilities.satoshi import SATOSHI_DIGITS, from_satoshi
+
+PRICE_COLUMNS = ('price', 'wprice', 'base_volume', 'buy_volume', 'sell_volume', 'buy_order', 'sell_order')
+
+OHLC_COLUMNS = ('open', 'high', 'low', 'close')
+
+# DECIMAL columns of price and rollup tables (read as float64 or int64 satoshi by read_arrays)
+DECIMAL_COLUMNS = ('price', 'wprice', 'base_volume', 'buy_volume', 'sell_volume') + OHLC_COLUMNS
+
+BACKENDS = ('mysql', 'sqlite')
+
+# Schema version per price storage: DECIMAL columns of version 2 databases are BIGINT satoshi units
+SCHEMA_VERSIONS = {'decimal': 1, 'satoshi': 2}
+
+# Table of the schema version of a database (databases without it are version 1)
+SCHEMA_TABLE = 'schema_version'
+
+
+def get_month_starts(start_datetime, end_datetime):
+    """
+    Get first days of months from the month of start_datetime up to the month after end_datetime
+    :param start_datetime:
+    :param end_datetime:
+    :return: (list(datetime))
+    """
+
+    month = datetime(start_datetime.year, start_datetime.month, 1)
+    months = [month]
+
+    while month <= end_datetime.replace(tzinfo=None):
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        months.append(month)
+
+    return months
+
+
+def format_range_condition(start_datetime, end_datetime,
+                           market_id=None,
+                           order=True):
+    """
+    Format condition selecting rows in [start_datetime, end_datetime) in time order (a range of the primary key)
+    :param start_datetime:
+    :param end_datetime:
+    :param market_id: Id of market in a long price table
+    :param order: Order rows by time (no ORDER BY in aggregate queries such as COUNT(*) if False)
+    :return: (str)
+    """
+
+    condition = 'WHERE {}time >= \'{:%Y-%m-%d %H:%M:%S}\' AND time < \'{:%Y-%m-%d %H:%M:%S}\''.format(
+        'market_id = {:d} AND '.format(market_id) if market_id is not None else '', start_datetime, end_datetime)
+
+    return condition + ' ORDER BY time' if order else condition
+
+
+class StorageBackend:
+    """
+    Interface of the storage of price, rollup, market and trade tables.
+
+    Backends implement the methods raising NotImplementedError, plus create_trade_table,
+    create_market_table, create_long_price_table, add_price_partitions, get_market_ids,
+    get_tables_with_column, add_ohlc_columns, copy_price_table, execute_query and insert_query.
+    Failed queries return False or None; errors in unavailable_errors are raised when the storage
+    stays unreachable after retries, so callers can keep rows for later.
+
+    In satoshi price storage (schema version 2), DECIMAL columns are stored as integer satoshi units.
+    Inserted values are converted with to_satoshi and selected columns back to Decimal, so callers
+    see the same rows in both storages.
+    """
+
+    unavailable_errors = ()
+
+    _schema_version = None
+
+    def create_database(self, database_name):
+
+        raise NotImplementedError
+
+    def create_price_table(self, table_name):
+
+        raise NotImplementedError
+
+    def create_rollup_table(self, table_name):
+
+        raise NotImplementedError
+
+    def insert_transaction_query(self, entries, batch_size=None):
+
+        raise NotImplementedError
+
+    def select_query(self, table, columns, condition=''):
+
+        raise NotImplementedError
+
+    def stream_query(self, table, columns, condition='', chunk_size=10000):
+
+        raise NotImplementedError
+
+    def get_array_column(self, column, prices='float'):
+
+        raise NotImplementedError
+
+    def get_all_tables(self):
+
+        raise NotImplementedError
+
+    def close(self):
+
+        raise NotImplementedError
+
+    def _run(self, function, commit=True):
+
+        raise NotImplementedError
+
+    def get_schema_version(self):
+        """
+        Get schema version of the database from its marker table
+        :return: (int) Version (None if not marked)
+        """
+
+        def select(cursor):
+            cursor.execute('SELECT version FROM `{}`'.format(SCHEMA_TABLE))
+            return cursor.fetchall()
+
+        rows = self._run(select)[1]
+
+        return rows[0][0] if rows else None
+
+    def initialize_schema(self, price_storage='decimal'):
+        """
+        Mark a new database with the schema version of price_storage. Databases with tables but
+        no marker were created before schema versions and keep DECIMAL columns.
+        :param price_storage: 'decimal' or 'satoshi'
+        :return: (str) Price storage of the database
+        """
+
+        version = self.get_schema_version()
+
+        if version is None:
+            version = SCHEMA_VERSIONS[price_storage] if not self.get_all_tables() else SCHEMA_VERSIONS['decimal']
+
+            self.execute_query('CREATE TABLE IF NOT EXISTS `{}` (version SMALLINT NOT NULL)'.format(SCHEMA_TABLE))
+            self.insert_query(SCHEMA_TABLE, [('version', version)])
+
+        self._schema_version = version
+
+        return self.price_storage
+
+    @property
+    def price_storage(self):
+        """
+        Storage of DECIMAL columns ('decimal' or 'satoshi'), read from the schema marker on first use
+        """
+
+        if self._schema_version is None:
+            self._schema_version = self.get_schema_version() or SCHEMA_VERSIONS['decimal']
+
+        return 'satoshi' if self._schema_version == SCHEMA_VERSIONS['satoshi'] else 'decimal'
+
+    def to_storage(self, columns, rows):
+        """
+        Convert DECIMAL columns of rows to satoshi units in satoshi price storage
+        :param columns: Column names
+        :param rows: List of value tuples
+        :return: (list) tuples
+        """
+
+        if self.price_storage != 'satoshi':
+            return rows
+
+        indices = [i for i, x in enumerate(columns) if x in DECIMAL_COLUMNS]
+
+        if not indices:
+            return rows
+
+        converted = []
+
+        for row in rows:
+            row = list(row)
+
+            # Same rounding as to_satoshi; rows replayed from the writer's spill file hold strings
+            for index in indices:
+                value = row[index] if isinstance(row[index], Decimal) else Decimal(row[index])
+                row[index] = int(value.scaleb(SATOSHI_DIGITS).to_integral_value(ROUND_HALF_EVEN))
+
+            converted.append(tuple(row))
+
+        return converted
+
+    def from_storage(self, description, rows):
+        """
+        Convert selected DECIMAL columns from satoshi units to Decimal in satoshi price storage
+        :param description: Cursor description of the select (names of selected columns)
+        :param rows: List of row tuples
+        :return: (list) tuples
+        """
+
+        indices = [i for i, x in enumerate(description or []) if x[0] in DECIMAL_COLUMNS]
+
+        if not indices or self.price_storage != 'satoshi':
+            return rows
+
+        return [tuple(from_satoshi(x) if i in indices else x for i, x in enumerate(row)) for row in rows]
+
+    def select_range(self, table, columns, start_datetime, end_datetime,
+                     market_id=None):
+        """
+        Execute a select query for rows in [start_datetime, end_datetime) in time order.
+        :param table:
+        :param columns: List of column names or "*"
+        :param start_datetime:
+        :param end_datetime:
+        :param market_id: Id of market in a long price table (all markets if None)
+        :return: (list) tuples
+        """
+
+        return self.select_query(table, columns, format_range_condition(start_datetime, end_datetime, market_id))
+
+    def read_arrays(self, table, columns, condition='',
+                    prices='float',
+                    num_rows=None,
+                    count_condition=None,
+                    chunk_size=10000):
+        """
+        Read columns of a price table into preallocated NumPy arrays with a streaming cursor.
+        time is read as int64 microseconds since epoch, DECIMAL columns as float64 or int64 satoshi units
+        and other columns as int64. Conversions run in the select, so no Decimal or datetime objects are made.
+        :param table:
+        :param columns: List of column names
+        :param condition:
+        :param prices: Read DECIMAL columns as 'float' or 'satoshi'
+        :param num_rows: Number of rows to allocate (counted with count_condition if None)
+        :param count_condition: Condition counting rows, without ORDER BY (condition if None)
+        :param chunk_size: Rows per chunk
+        :return: (dict) Array per column
+        """
+
+        expressions, dtypes = zip(*[self.get_array_column(x, prices) for x in columns])
+
+        if num_rows is None:
+            if count_condition is None:
+                count_condition = condition
+
+            count = self.select_query(table, ['COUNT(*)'], count_condition)
+            num_rows = count[0][0] if count else 0
+
+        arrays = [empty(num_rows, dtype=x) for x in dtypes]
+        size = 0
+
+        for rows in self.stream_query(table, list(expressions), condition, chunk_size=chunk_size):
+            end = size + len(rows)
+
+            # Rows inserted after counting
+            if end > len(arrays[0]):
+                arrays = [resize(x, max(end, 2 * len(x))) for x in arrays]
+
+            for array, values in zip(arrays, zip(*rows)):
+                array[size:end] = values
+
+            size = end
+
+        return {column: array[:size] for column, array in zip(columns, arrays)}
+
+    def read_range_arrays(self, table, columns, start_datetime, end_datetime,
+                          market_id=None,
+                          prices='float'):
+        """
+        Read columns of rows in [start_datetime, end_datetime) into NumPy arrays in time order (see read_arrays).
+        :param table:
+        :param columns: List of column names
+        :param start_datetime:
+        :param end_datetime:
+        :param market_id: Id of market in a long price table (all markets if None)
+        :param prices: Read DECIMAL columns as 'float' or 'satoshi'
+        :return: (dict) Array per column
+        """
+
+        return self.read_arrays(table, columns, format_range_condition(start_datetime, end_datetime, market_id),
+                                prices=prices,
+                                count_condition=format_range_condition(start_datetime, end_datetime, market_id,
+                                                                       order=False))
+
+
+def get_database(backend, database_name,
+                 hostname=None,
+                 username=None,
+                 password=None,
+                 directory=None,
+                 logger=None):
+    """
+    Open a database of a storage backend. Only the selected backend's driver is imported.
+    :param backend: 'mysql' or 'sqlite'
+    :param database_name: Name of database
+    :param hostname: MySQL server
+    :param username: MySQL user
+    :param password: MySQL password
+    :param directory: Directory of SQLite database files
+    :param logger:
+    :return: (StorageBackend)
+    """
+
+    if backend == 'mysql':
+        from sql.sql import Database
+
+        return Database(hostname=hostname,
+                        username=username,
+                        password=password,
+                        database_name=database_name,
+                        logger=logger)
+
+    if backend == 'sqlite':
+        from sql.sqlite import SQLiteDatabase
+
+        return SQLiteDatabase(directory, database_name, logger=logger)
+
+    raise ValueError('Unknown storage backend {} (one of {}).'.format(backend, ', '.join(BACKENDS)))
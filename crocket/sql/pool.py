@@ -0,0 +1,215 @@
+from os import getpid
+from threading import Condition
+from time import time
+
+from MySQLdb import connect, OperationalError
+
+# Client errors of dropped or unreachable connections (CR_CONNECTION_ERROR, CR_CONN_HOST_ERROR,
+# CR_SERVER_GONE_ERROR, CR_SERVER_LOST, CR_SERVER_LOST_EXTENDED)
+DISCONNECT_ERRORS = (2002, 2003, 2006, 2013, 2055)
+
+_pools = {}
+
+
+def is_disconnect(error):
+    """
+    Check if a MySQL error is caused by a dropped connection
+    :param error: MySQLdb error
+    :return: (bool)
+    """
+
+    return isinstance(error, OperationalError) and bool(error.args) and error.args[0] in DISCONNECT_ERRORS
+
+
+class _PooledConnection:
+    """
+    MySQL connection with the database it currently uses
+    """
+
+    __slots__ = ('connection', 'database_name', 'last_used')
+
+    def __init__(self, connection, database_name):
+
+        self.connection = connection
+        self.database_name = database_name
+        self.last_used = time()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of MySQL connections to one server, shared by all Database objects of a process.
+
+    Connections are checked out for a single query or transaction and returned afterwards. A
+    connection idle for more than ping_interval seconds is pinged before it is handed out and
+    replaced if the server dropped it. Connections switch databases with select_db, so one
+    connection serves all databases on the server.
+    """
+
+    def __init__(self,
+                 hostname,
+                 username,
+                 password,
+                 port=3306,
+                 max_size=4,
+                 ping_interval=30,
+                 logger=None):
+
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.port = port
+        self.max_size = max_size
+        self.ping_interval = ping_interval
+        self.logger = logger
+
+        self.num_connections = 0
+        self.num_users = 0
+
+        self._idle = []
+        self._condition = Condition()
+
+    def _connect(self, database_name):
+
+        connection = connect(host=self.hostname,
+                             user=self.username,
+                             passwd=self.password,
+                             db=database_name,
+                             port=self.port)
+
+        return _PooledConnection(connection, database_name)
+
+    def _prepare(self, pooled, database_name):
+        """
+        Check that an idle connection is alive and uses database_name
+        :return: (bool) Connection usable
+        """
+
+        try:
+            if time() - pooled.last_used > self.ping_interval:
+                pooled.connection.ping()
+
+            if pooled.database_name != database_name:
+                pooled.connection.select_db(database_name)
+                pooled.database_name = database_name
+
+            return True
+
+        except OperationalError as e:
+
+            if self.logger:
+                self.logger.debug('Database: Dropping connection ({}).'.format(e))
+
+            self.close_connection(pooled)
+
+            return False
+
+    def get_connection(self, database_name, timeout=None):
+        """
+        Check out a connection using database_name, waiting while max_size connections are in use
+        :param database_name:
+        :param timeout: Seconds to wait for a free connection (wait indefinitely if None)
+        :return: (_PooledConnection)
+        """
+
+        deadline = time() + timeout if timeout is not None else None
+
+        while True:
+            with self._condition:
+
+                while not self._idle and self.num_connections >= self.max_size:
+                    remaining = deadline - time() if deadline is not None else None
+
+                    if remaining is not None and remaining <= 0:
+                        raise OperationalError(2002, 'No free connection in pool after {}s.'.format(timeout))
+
+                    self._condition.wait(remaining)
+
+                if self._idle:
+                    # Prefer a connection already using database_name
+                    index = next((i for i, x in enumerate(self._idle) if x.database_name == database_name), -1)
+                    pooled = self._idle.pop(index)
+                else:
+                    pooled = None
+                    self.num_connections += 1
+
+            if pooled is None:
+                try:
+                    return self._connect(database_name)
+
+                except OperationalError:
+                    with self._condition:
+                        self.num_connections -= 1
+                        self._condition.notify()
+                    raise
+
+            if self._prepare(pooled, database_name):
+                return pooled
+
+    def put_connection(self, pooled):
+        """
+        Return a checked out connection to the pool
+        :param pooled:
+        :return:
+        """
+
+        pooled.last_used = time()
+
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def close_connection(self, pooled):
+        """
+        Close a checked out connection (after it was dropped) and free its slot
+        :param pooled:
+        :return:
+        """
+
+        try:
+            pooled.connection.close()
+        except OperationalError:
+            pass
+
+        with self._condition:
+            self.num_connections -= 1
+            self._condition.notify()
+
+    def close(self):
+        """
+        Close idle connections
+        :return:
+        """
+
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+
+        for pooled in idle:
+            self.close_connection(pooled)
+
+
+def get_pool(hostname, username, password,
+             port=3306,
+             max_size=4,
+             logger=None):
+    """
+    Get the connection pool of the current process for a server, creating it on first use.
+    Pools inherited from a parent process are not reused.
+    :param hostname:
+    :param username:
+    :param password:
+    :param port:
+    :param max_size: Maximum number of connections of a new pool
+    :param logger:
+    :return: (ConnectionPool)
+    """
+
+    key = (getpid(), hostname, username, port)
+
+    if key not in _pools:
+        _pools[key] = ConnectionPool(hostname, username, password,
+                                     port=port,
+                                     max_size=max_size,
+                                     logger=logger)
+
+    return _pools[key]
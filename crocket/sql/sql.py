@@ -1,58 +1,217 @@
 from contextlib import closing
+from datetime import datetime
 from itertools import chain
+from time import sleep, time
+
+from MySQLdb import OperationalError, ProgrammingError
+from MySQLdb.cursors import SSCursor
+from numpy import float64, int64
+
+from sql.backend import DECIMAL_COLUMNS, OHLC_COLUMNS, PRICE_COLUMNS, StorageBackend, get_month_starts
+from sql.pool import get_pool, is_disconnect
+
+PRICE_COLUMN_DEFINITIONS = 'price DECIMAL(15,8) UNSIGNED NOT NULL,' \
+                           'wprice DECIMAL(15,8) UNSIGNED NOT NULL,' \
+                           'base_volume DECIMAL(15,8) UNSIGNED NOT NULL,' \
+                           'buy_volume DECIMAL(15,8) UNSIGNED NOT NULL,' \
+                           'sell_volume DECIMAL(15,8) UNSIGNED NOT NULL,' \
+                           'buy_order MEDIUMINT UNSIGNED NOT NULL,' \
+                           'sell_order MEDIUMINT UNSIGNED NOT NULL'
+
+# Defaults allow adding the columns to existing tables
+OHLC_COLUMN_DEFINITIONS = 'open DECIMAL(15,8) UNSIGNED NOT NULL DEFAULT 0,' \
+                          'high DECIMAL(15,8) UNSIGNED NOT NULL DEFAULT 0,' \
+                          'low DECIMAL(15,8) UNSIGNED NOT NULL DEFAULT 0,' \
+                          'close DECIMAL(15,8) UNSIGNED NOT NULL DEFAULT 0'
+
+# Columns of satoshi price storage (schema version 2)
+SATOSHI_PRICE_COLUMN_DEFINITIONS = 'price BIGINT UNSIGNED NOT NULL,' \
+                                   'wprice BIGINT UNSIGNED NOT NULL,' \
+                                   'base_volume BIGINT UNSIGNED NOT NULL,' \
+                                   'buy_volume BIGINT UNSIGNED NOT NULL,' \
+                                   'sell_volume BIGINT UNSIGNED NOT NULL,' \
+                                   'buy_order MEDIUMINT UNSIGNED NOT NULL,' \
+                                   'sell_order MEDIUMINT UNSIGNED NOT NULL'
+
+SATOSHI_OHLC_COLUMN_DEFINITIONS = 'open BIGINT UNSIGNED NOT NULL DEFAULT 0,' \
+                                  'high BIGINT UNSIGNED NOT NULL DEFAULT 0,' \
+                                  'low BIGINT UNSIGNED NOT NULL DEFAULT 0,' \
+                                  'close BIGINT UNSIGNED NOT NULL DEFAULT 0'
+
+
+def get_array_column(column, prices='float',
+                     price_storage='decimal'):
+    """
+    Get select expression and NumPy dtype reading a column of a price table as a number
+    :param column: Column name
+    :param prices: Read DECIMAL columns as 'float' (float64) or 'satoshi' (int64 satoshi units)
+    :param price_storage: Storage of DECIMAL columns ('decimal' or 'satoshi')
+    :return: (tuple) select expression, dtype
+    """
+
+    if column == 'time':
+        # Microseconds since epoch of the stored (local) time, as for naive datetimes in convert_datetime_to_epoch
+        return 'TIMESTAMPDIFF(MICROSECOND, \'1970-01-01\', time)', int64
+
+    if column in DECIMAL_COLUMNS:
+        if price_storage == 'satoshi':
+            # Division of exact integers rounds to the same float64 as the DECIMAL
+            return (column, int64) if prices == 'satoshi' else ('{} / 1E8'.format(column), float64)
+
+        if prices == 'satoshi':
+            return 'CAST({} * 100000000 AS SIGNED)'.format(column), int64
+
+        return '{} + 0E0'.format(column), float64
+
+    return column, int64
+
+
+def format_partitions(months):
+    """
+    Format monthly range partitions on time, one per month starting in months, and a catch-all partition
+    :param months: (list(datetime)) First days of months
+    :return: (str)
+    """
+
+    partitions = ['PARTITION p{:%Y%m} VALUES LESS THAN (\'{:%Y-%m-%d}\')'.format(x, y)
+                  for x, y in zip(months, months[1:])]
 
-from MySQLdb import connect, OperationalError, ProgrammingError
+    return ', '.join(partitions + ['PARTITION pmax VALUES LESS THAN (MAXVALUE)'])
 
 
-class Database:
+class Database(StorageBackend):
     """
-    The database object.
+    The database object (MySQL storage backend).
+
+    Queries run on connections of the shared connection pool of the process. A query interrupted
+    by a dropped connection is retried on a new connection up to retries times.
     """
 
+    unavailable_errors = (OperationalError,)
+
     def __init__(self,
                  hostname,
                  username,
                  password,
                  database_name,
                  port=3306,
-                 logger=None):
+                 logger=None,
+                 pool=None,
+                 retries=3,
+                 retry_delay=1,
+                 batch_size=500):
 
         self.database_name = database_name
         self.logger = logger
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.batch_size = batch_size
 
-        try:
-            self.connection = connect(host=hostname,
-                                      user=username,
-                                      passwd=password,
-                                      db=database_name,
-                                      port=port)
-        except OperationalError:
-            self.connection = None
+        self.pool = pool or get_pool(hostname, username, password, port=port, logger=logger)
+        self.pool.num_users += 1
 
-    def execute_query(self, query):
+        self.closed = False
+
+    def _run(self, function, commit=True):
         """
-        Execute a query
-        :param query:
-        :return:
+        Run function with a cursor on a pooled connection and commit (or roll back on error)
+        :param function: Function of cursor
+        :param commit: Commit after function (ends the transaction and read snapshot of the connection)
+        :return: (tuple) success, result of function (success is False if the query failed)
+        :raises OperationalError: Server unreachable after all retries
+        :raises: Other errors of function, after rolling back and returning the connection
         """
 
-        with closing(self.connection.cursor()) as cursor:
+        error = None
+
+        for attempt in range(self.retries + 1):
+
+            if attempt:
+                sleep(self.retry_delay * attempt)
 
             try:
-                cursor.execute(query)
+                pooled = self.pool.get_connection(self.database_name)
+            except OperationalError as e:
+                error = e
+
+                if self.logger:
+                    self.logger.debug('Database: Could not connect ({}).'.format(e))
+                continue
+
+            try:
+                with closing(pooled.connection.cursor()) as cursor:
+                    result = function(cursor)
+
+                if commit:
+                    pooled.connection.commit()
+
             except (OperationalError, ProgrammingError) as e:
 
-                self.connection.rollback()
+                if is_disconnect(e):
+                    error = e
+                    self.pool.close_connection(pooled)
+
+                    if self.logger:
+                        self.logger.debug('Database: Connection dropped ({}). Retrying ...'.format(e))
+                    continue
+
+                self._release(pooled)
 
                 if self.logger:
                     self.logger.debug(e)
 
+                return False, None
+
+            except BaseException:
+                # Other errors (e.g. IntegrityError) are raised, without leaving the transaction open
+                self._release(pooled)
+                raise
+
+            self.pool.put_connection(pooled)
+
+            return True, result
+
+        if self.logger:
+            self.logger.error('Database: Query on {} failed after {} retries.'.format(self.database_name,
+                                                                                      self.retries))
+
+        raise error
+
+    def _release(self, pooled,
+                 cursor=None):
+        """
+        Close cursor, roll back the transaction of a checked out connection and return it to the pool
+        (closed instead if it fails)
+        :param pooled:
+        :param cursor:
+        :return:
+        """
+
+        try:
+            if cursor is not None:
+                cursor.close()
+
+            pooled.connection.rollback()
+            self.pool.put_connection(pooled)
+
+        except Exception:
+            self.pool.close_connection(pooled)
+
+    def execute_query(self, query):
+        """
+        Execute a query
+        :param query:
+        :return: (bool) Query succeeded
+        """
+
+        return self._run(lambda cursor: cursor.execute(query))[0]
+
     def insert_query(self, table, tuples):
         """
         Execute an insert query.
         :param table:
         :param tuples:
-        :return:
+        :return: (bool) Row inserted
         """
         columns, data = zip(*tuples)
 
@@ -62,41 +221,51 @@ class Database:
 
         query = 'INSERT INTO `{}` ({}) VALUES ({})'.format(table, formatted_columns, data_format)
 
-        with closing(self.connection.cursor()) as cursor:
+        data, = self.to_storage(columns, [data])
 
-            try:
+        return self._run(lambda cursor: cursor.execute(query, data))[0]
 
-                cursor.execute(query, data)
-                self.connection.commit()
+    def insert_transaction_query(self, entries,
+                                 batch_size=None):
+        """
+        Insert rows of several tables in a single transaction. Rows are grouped by table and columns
+        and inserted with parameterized multi-row INSERT statements of up to batch_size rows.
+        :param entries: tuple(table, columns, values)
+        :param batch_size: Rows per INSERT statement (batch_size of database if None)
+        :return: (bool) Rows inserted
+        """
 
-            except (OperationalError, ProgrammingError) as e:
+        batch_size = batch_size or self.batch_size
+        groups = {}
 
-                self.connection.rollback()
+        for table, columns, values in entries:
+            groups.setdefault((table, tuple(columns)), []).append(tuple(values))
 
-                if self.logger:
-                    self.logger.debug(e)
+        if not groups:
+            return True
 
-    def insert_transaction_query(self, entries):
-        """
-        Execute multiple insert queries in a single transaction
-        :param entries: tuple(market, columns, values)
-        :return:
-        """
+        groups = {k: self.to_storage(k[1], v) for k, v in groups.items()}
 
-        query = ['INSERT INTO `{}` ({}) VALUES ({})'.format(entry[0], ','.join(entry[1]), ','.join(map(lambda x: "'{}'".format(str(x)), entry[2])))
-                 for entry in entries]
+        def insert(cursor):
+            for (table, columns), rows in groups.items():
+                query = 'INSERT INTO `{}` ({}) VALUES ({})'.format(table, ','.join(columns),
+                                                                  ','.join(['%s'] * len(columns)))
 
-        query = '{};COMMIT;'.format(';'.join(query))
+                # Rewritten by executemany into one INSERT with a VALUES list per batch
+                for index in range(0, len(rows), batch_size):
+                    cursor.executemany(query, rows[index:index + batch_size])
 
-        with closing(self.connection.cursor()) as cursor:
+        start = time()
+        inserted = self._run(insert)[0]
+        run_time = time() - start
 
-            try:
-                cursor.execute(query)
+        if inserted and self.logger:
+            num_rows = sum(map(len, groups.values()))
 
-            except (OperationalError, ProgrammingError) as e:
+            self.logger.debug('Database: Inserted {} rows into {} tables in {:.3f}s ({:.0f} rows/s).'.format(
+                num_rows, len(groups), run_time, num_rows / run_time if run_time else 0))
 
-                if self.logger:
-                    self.logger.debug(e)
+        return inserted
 
     def select_query(self, table, columns, condition=''):
         """
@@ -121,19 +290,125 @@ class Database:
 
         query = 'SELECT {} from `{}` {}'.format(formatted_columns, table, condition)
 
-        with closing(self.connection.cursor()) as cursor:
+        def select(cursor):
+            cursor.execute(query)
+            return cursor.description, list(cursor)
 
-            try:
+        success, result = self._run(select)
+
+        return self.from_storage(*result) if success else None
+
+    def _open_cursor(self, query, cursor_class, args=None):
+        """
+        Execute a query on a pooled connection with a cursor of cursor_class, retrying dropped connections
+        :return: (tuple) pooled connection and cursor (None if the query failed)
+        :raises OperationalError: Server unreachable after all retries
+        :raises: Other errors of the query, after rolling back and returning the connection
+        """
 
-                cursor.execute(query)
-                entries = list(cursor)
-                return entries
+        error = None
 
+        for attempt in range(self.retries + 1):
+
+            if attempt:
+                sleep(self.retry_delay * attempt)
+
+            try:
+                pooled = self.pool.get_connection(self.database_name)
             except OperationalError as e:
+                error = e
+                continue
+
+            cursor = None
+
+            try:
+                cursor = pooled.connection.cursor(cursor_class)
+                cursor.execute(query, args)
+
+                return pooled, cursor
+
+            except (OperationalError, ProgrammingError) as e:
+
+                if is_disconnect(e):
+                    error = e
+                    self.pool.close_connection(pooled)
+                    continue
+
+                self._release(pooled, cursor)
 
                 if self.logger:
                     self.logger.debug(e)
 
+                return None, None
+
+            except BaseException:
+                self._release(pooled, cursor)
+                raise
+
+        if self.logger:
+            self.logger.error('Database: Query on {} failed after {} retries.'.format(self.database_name,
+                                                                                      self.retries))
+
+        raise error
+
+    def stream_query(self, table, columns, condition='',
+                     chunk_size=10000):
+        """
+        Execute a select query with an unbuffered server-side cursor, fetching rows in chunks.
+        The connection is held until the generator is exhausted or closed.
+        :param table:
+        :param columns: List of column names (or select expressions) or "*"
+        :param condition:
+        :param chunk_size: Rows per chunk
+        :return: (generator) list of row tuples per chunk
+        """
+
+        formatted_columns = ','.join(columns) if isinstance(columns, list) else columns
+
+        query = 'SELECT {} from `{}` {}'.format(formatted_columns, table, condition)
+
+        pooled, cursor = self._open_cursor(query, SSCursor)
+
+        if pooled is None:
+            return
+
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+
+                if not rows:
+                    break
+
+                yield rows
+
+        except (OperationalError, ProgrammingError) as e:
+
+            if is_disconnect(e):
+                self.pool.close_connection(pooled)
+                pooled = None
+
+            raise
+
+        finally:
+            if pooled is not None:
+                # Reads and discards rows not fetched if closed early
+                self._release(pooled, cursor)
+
+    def get_array_column(self, column, prices='float'):
+
+        return get_array_column(column, prices, self.price_storage)
+
+    def get_column_definitions(self):
+        """
+        Get definitions of the price and OHLC columns in the price storage of the database
+        :return: (tuple) price column definitions, OHLC column definitions
+        """
+
+        if self.price_storage == 'satoshi':
+            return SATOSHI_PRICE_COLUMN_DEFINITIONS, SATOSHI_OHLC_COLUMN_DEFINITIONS
+
+        return PRICE_COLUMN_DEFINITIONS, OHLC_COLUMN_DEFINITIONS
+
     def create_price_table(self, table_name):
         """
         Execute a create table query with sic columns: (DATETIME, PRICE, WPRICE, BASEVOLUME, BUYORDER, SELLORDER).
@@ -142,16 +417,165 @@ class Database:
         """
         query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
                 'time DATETIME NOT NULL PRIMARY KEY, ' \
-                'price DECIMAL(15,8) UNSIGNED NOT NULL,' \
-                'wprice DECIMAL(15,8) UNSIGNED NOT NULL,' \
-                'base_volume DECIMAL(15,8) UNSIGNED NOT NULL,' \
-                'buy_volume DECIMAL(15,8) UNSIGNED NOT NULL,' \
-                'sell_volume DECIMAL(15,8) UNSIGNED NOT NULL,' \
-                'buy_order MEDIUMINT UNSIGNED NOT NULL,' \
-                'sell_order MEDIUMINT UNSIGNED NOT NULL)'.format(table_name)
+                '{})'.format(table_name, self.get_column_definitions()[0])
+
+        self.execute_query(query)
+
+    def create_rollup_table(self, table_name):
+        """
+        Execute a create table query with the price columns and (OPEN, HIGH, LOW, CLOSE).
+        :param table_name: Table name
+        :return:
+        """
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'time DATETIME NOT NULL PRIMARY KEY, ' \
+                '{},' \
+                '{})'.format(table_name, *self.get_column_definitions())
+
+        self.execute_query(query)
+
+    def get_tables_with_column(self, column):
+        """
+        Get tables in current database having a column.
+        :param column: Column name
+        :return: (list)
+        """
+        query = 'SELECT table_name FROM information_schema.columns WHERE table_schema=%s AND column_name=%s'
+
+        def select(cursor):
+            cursor.execute(query, (self.database_name, column))
+            return list(chain.from_iterable(cursor))
+
+        return self._run(select)[1]
+
+    def add_ohlc_columns(self, table_name):
+        """
+        Add (OPEN, HIGH, LOW, CLOSE) to a price table created before rollup tables had them.
+        :param table_name: Table name
+        :return: (bool) Columns added
+        """
+        definitions = self.get_column_definitions()[1].split(',')
+
+        query = 'ALTER TABLE `{}` {}'.format(table_name, ', '.join('ADD COLUMN {}'.format(x) for x in definitions))
+
+        return self.execute_query(query)
+
+    def create_market_table(self, table_name):
+        """
+        Execute a create table query for the market dimension: (ID, MARKET).
+        :param table_name: Table name
+        :return:
+        """
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'id SMALLINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY, ' \
+                'market VARCHAR(16) NOT NULL UNIQUE)'.format(table_name)
 
         self.execute_query(query)
 
+    def create_long_price_table(self, table_name, start_datetime, end_datetime,
+                                ohlc=False):
+        """
+        Execute a create table query for the price columns of all markets keyed by (MARKET_ID, DATETIME),
+        range partitioned by month.
+        :param table_name: Table name
+        :param start_datetime: Start of first monthly partition
+        :param end_datetime: Monthly partitions are created up to end_datetime (later rows go to a catch-all)
+        :param ohlc: Add (OPEN, HIGH, LOW, CLOSE) for rollup tables
+        :return:
+        """
+        price_columns, ohlc_columns = self.get_column_definitions()
+        columns = price_columns + (',' + ohlc_columns if ohlc else '')
+
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'market_id SMALLINT UNSIGNED NOT NULL, ' \
+                'time DATETIME NOT NULL, ' \
+                '{}, ' \
+                'PRIMARY KEY (market_id, time)) ' \
+                'PARTITION BY RANGE COLUMNS(time) ({})'.format(table_name, columns,
+                                                               format_partitions(get_month_starts(start_datetime,
+                                                                                                  end_datetime)))
+
+        self.execute_query(query)
+
+    def get_partitions(self, table_name):
+        """
+        Get partitions of a table in current database.
+        :param table_name: Table name
+        :return: (list) Partition names in order
+        """
+        query = 'SELECT partition_name FROM information_schema.partitions ' \
+                'WHERE table_schema=%s AND table_name=%s ORDER BY partition_ordinal_position'
+
+        def select(cursor):
+            cursor.execute(query, (self.database_name, table_name))
+            return [x[0] for x in cursor if x[0]]
+
+        return self._run(select)[1]
+
+    def add_price_partitions(self, table_name, end_datetime):
+        """
+        Split monthly partitions up to end_datetime off the catch-all partition of a long price table.
+        :param table_name: Table name
+        :param end_datetime:
+        :return: (bool) Partitions added
+        """
+        partitions = self.get_partitions(table_name) or []
+        months = [datetime.strptime(x[1:], '%Y%m') for x in partitions if x != 'pmax']
+
+        if not months:
+            return False
+
+        new_months = get_month_starts(months[-1], end_datetime)[1:]
+
+        if len(new_months) < 2:
+            return False
+
+        query = 'ALTER TABLE `{}` REORGANIZE PARTITION pmax INTO ({})'.format(table_name,
+                                                                              format_partitions(new_months))
+
+        return self.execute_query(query)
+
+    def get_market_ids(self, table_name, markets):
+        """
+        Get ids of markets in the market dimension, adding missing markets.
+        :param table_name: Market table name
+        :param markets: List of markets
+        :return: (dict) Id per market
+        """
+        insert = 'INSERT IGNORE INTO `{}` (market) VALUES (%s)'.format(table_name)
+        select = 'SELECT market, id FROM `{}`'.format(table_name)
+
+        def get_ids(cursor):
+            cursor.executemany(insert, [(x,) for x in markets])
+            cursor.execute(select)
+            return dict(cursor)
+
+        return self._run(get_ids)[1]
+
+    def copy_price_table(self, source_table, table_name, market_id, start_datetime, end_datetime,
+                         columns=PRICE_COLUMNS):
+        """
+        Copy rows of a per-market price table in [start_datetime, end_datetime) into a long price table.
+        Rows already copied are skipped.
+        :param source_table: Per-market price table
+        :param table_name: Long price table
+        :param market_id: Id of market of source_table
+        :param start_datetime:
+        :param end_datetime:
+        :param columns: Columns copied besides time
+        :return: (int) Number of rows copied (None if failed)
+        """
+        columns = ','.join(('time',) + tuple(columns))
+
+        query = 'INSERT IGNORE INTO `{}` (market_id,{}) SELECT %s,{} FROM `{}` ' \
+                'WHERE time >= %s AND time < %s'.format(table_name, columns, columns, source_table)
+
+        def copy(cursor):
+            cursor.execute(query, (market_id, start_datetime, end_datetime))
+            return cursor.rowcount
+
+        return self._run(copy)[1]
+
     def create_trade_table(self, table_name):
         """
         Execute a create table query with sic columns: (DATETIME, PRICE, WPRICE, BASEVOLUME, BUYORDER, SELLORDER).
@@ -201,22 +625,23 @@ class Database:
         """
         query = 'select table_name from information_schema.tables where table_schema="{}"'.format(self.database_name)
 
-        with closing(self.connection.cursor()) as cursor:
+        def select(cursor):
+            cursor.execute(query)
+            return list(chain.from_iterable(cursor))
 
-            try:
-
-                cursor.execute(query)
-                tables = list(chain.from_iterable(cursor))
-                return tables
-
-            except (OperationalError, ProgrammingError) as e:
-
-                if self.logger:
-                    self.logger.debug(e)
+        return self._run(select)[1]
 
     def close(self):
         """
-        Close the database connection
+        Release the database, closing idle pooled connections once no database of the process uses the pool
         :return:
         """
-        self.connection.close()
+
+        if self.closed:
+            return
+
+        self.closed = True
+        self.pool.num_users -= 1
+
+        if not self.pool.num_users:
+            self.pool.close()
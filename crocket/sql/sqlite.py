@@ -0,0 +1,543 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+from itertools import chain
+from os import makedirs
+from os.path import join
+from threading import Lock, local
+from time import sleep, time
+
+from numpy import float64, int64
+
+from sql.backend import DECIMAL_COLUMNS, PRICE_COLUMNS, StorageBackend
+
+# Decimals are stored as text so NUMERIC affinity keeps them exact up to 15 digits; declared types
+# are converted back to Decimal and datetime when read
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda x: x.isoformat(' '))
+sqlite3.register_converter('DECIMAL', lambda x: Decimal(x.decode()))
+sqlite3.register_converter('DATETIME', lambda x: datetime.fromisoformat(x.decode()))
+
+PRICE_COLUMN_DEFINITIONS = 'price DECIMAL NOT NULL,' \
+                           'wprice DECIMAL NOT NULL,' \
+                           'base_volume DECIMAL NOT NULL,' \
+                           'buy_volume DECIMAL NOT NULL,' \
+                           'sell_volume DECIMAL NOT NULL,' \
+                           'buy_order INTEGER NOT NULL,' \
+                           'sell_order INTEGER NOT NULL'
+
+OHLC_COLUMN_DEFINITIONS = 'open DECIMAL NOT NULL DEFAULT 0,' \
+                          'high DECIMAL NOT NULL DEFAULT 0,' \
+                          'low DECIMAL NOT NULL DEFAULT 0,' \
+                          'close DECIMAL NOT NULL DEFAULT 0'
+
+# Columns of satoshi price storage (schema version 2)
+SATOSHI_PRICE_COLUMN_DEFINITIONS = 'price INTEGER NOT NULL,' \
+                                   'wprice INTEGER NOT NULL,' \
+                                   'base_volume INTEGER NOT NULL,' \
+                                   'buy_volume INTEGER NOT NULL,' \
+                                   'sell_volume INTEGER NOT NULL,' \
+                                   'buy_order INTEGER NOT NULL,' \
+                                   'sell_order INTEGER NOT NULL'
+
+SATOSHI_OHLC_COLUMN_DEFINITIONS = 'open INTEGER NOT NULL DEFAULT 0,' \
+                                  'high INTEGER NOT NULL DEFAULT 0,' \
+                                  'low INTEGER NOT NULL DEFAULT 0,' \
+                                  'close INTEGER NOT NULL DEFAULT 0'
+
+
+def is_busy(error):
+    """
+    Check if an SQLite error is caused by another connection holding a lock
+    :param error: sqlite3 error
+    :return: (bool)
+    """
+
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+
+def get_array_column(column, prices='float',
+                     price_storage='decimal'):
+    """
+    Get select expression and NumPy dtype reading a column of a price table as a number
+    :param column: Column name
+    :param prices: Read DECIMAL columns as 'float' (float64) or 'satoshi' (int64 satoshi units)
+    :param price_storage: Storage of DECIMAL columns ('decimal' or 'satoshi')
+    :return: (tuple) select expression, dtype
+    """
+
+    if column == 'time':
+        # Microseconds since epoch of the stored (local) time, as for naive datetimes in convert_datetime_to_epoch
+        return 'CAST(strftime(\'%s\', time) AS INTEGER) * 1000000', int64
+
+    if column in DECIMAL_COLUMNS:
+        if price_storage == 'satoshi':
+            return (column, int64) if prices == 'satoshi' else ('{} / 100000000.0'.format(column), float64)
+
+        if prices == 'satoshi':
+            return 'CAST(ROUND({} * 100000000) AS INTEGER)'.format(column), int64
+
+        return 'CAST({} AS REAL)'.format(column), float64
+
+    return column, int64
+
+
+class SQLiteDatabase(StorageBackend):
+    """
+    Embedded storage backend keeping each database in one SQLite file in WAL mode.
+
+    Each thread uses its own connection, so the scraper's writer thread and readers do not block
+    each other: WAL lets readers see the last commit while one writer appends. Tables are
+    clustered on their primary key (WITHOUT ROWID) like InnoDB, so range reads scan in time order.
+    A query blocked by another writer for longer than busy_timeout is retried up to retries times.
+    """
+
+    unavailable_errors = (sqlite3.OperationalError,)
+
+    def __init__(self,
+                 directory,
+                 database_name,
+                 logger=None,
+                 retries=3,
+                 retry_delay=1,
+                 busy_timeout=5,
+                 batch_size=500):
+
+        makedirs(directory, exist_ok=True)
+
+        self.database_name = database_name
+        self.path = join(directory, database_name + '.db')
+        self.logger = logger
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.busy_timeout = busy_timeout
+        self.batch_size = batch_size
+
+        self._local = local()
+        self._connections = []
+        self._lock = Lock()
+
+        self.closed = False
+
+    def _get_connection(self):
+
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path,
+                                         timeout=self.busy_timeout,
+                                         detect_types=sqlite3.PARSE_DECLTYPES,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+
+            self._local.connection = connection
+
+            with self._lock:
+                self._connections.append(connection)
+
+        return connection
+
+    def _run(self, function, commit=True):
+        """
+        Run function with a cursor on the connection of the thread and commit (or roll back on error)
+        :param function: Function of cursor
+        :param commit: Commit after function
+        :return: (tuple) success, result of function (success is False if the query failed)
+        :raises sqlite3.OperationalError: Database locked after all retries
+        """
+
+        error = None
+
+        for attempt in range(self.retries + 1):
+
+            if attempt:
+                sleep(self.retry_delay * attempt)
+
+            connection = self._get_connection()
+            cursor = connection.cursor()
+
+            try:
+                result = function(cursor)
+
+                if commit:
+                    connection.commit()
+
+                return True, result
+
+            except sqlite3.DatabaseError as e:
+                connection.rollback()
+
+                if is_busy(e):
+                    error = e
+
+                    if self.logger:
+                        self.logger.debug('Database: Database locked ({}). Retrying ...'.format(e))
+                    continue
+
+                if self.logger:
+                    self.logger.debug(e)
+
+                return False, None
+
+            finally:
+                cursor.close()
+
+        if self.logger:
+            self.logger.error('Database: Query on {} failed after {} retries.'.format(self.database_name,
+                                                                                      self.retries))
+
+        raise error
+
+    def execute_query(self, query):
+        """
+        Execute a query
+        :param query:
+        :return: (bool) Query succeeded
+        """
+
+        return self._run(lambda cursor: cursor.execute(query))[0]
+
+    def insert_query(self, table, tuples):
+        """
+        Execute an insert query.
+        :param table:
+        :param tuples:
+        :return: (bool) Row inserted
+        """
+        columns, data = zip(*tuples)
+
+        query = 'INSERT INTO `{}` ({}) VALUES ({})'.format(table, ','.join(columns), ','.join(['?'] * len(columns)))
+
+        data, = self.to_storage(columns, [data])
+
+        return self._run(lambda cursor: cursor.execute(query, data))[0]
+
+    def insert_transaction_query(self, entries,
+                                 batch_size=None):
+        """
+        Insert rows of several tables in a single transaction. Rows are grouped by table and columns
+        and inserted with executemany of a prepared statement, up to batch_size rows per call.
+        :param entries: tuple(table, columns, values)
+        :param batch_size: Rows per executemany (batch_size of database if None)
+        :return: (bool) Rows inserted
+        """
+
+        batch_size = batch_size or self.batch_size
+        groups = {}
+
+        for table, columns, values in entries:
+            groups.setdefault((table, tuple(columns)), []).append(tuple(values))
+
+        if not groups:
+            return True
+
+        groups = {k: self.to_storage(k[1], v) for k, v in groups.items()}
+
+        def insert(cursor):
+            for (table, columns), rows in groups.items():
+                query = 'INSERT INTO `{}` ({}) VALUES ({})'.format(table, ','.join(columns),
+                                                                  ','.join(['?'] * len(columns)))
+
+                for index in range(0, len(rows), batch_size):
+                    cursor.executemany(query, rows[index:index + batch_size])
+
+        start = time()
+        inserted = self._run(insert)[0]
+        run_time = time() - start
+
+        if inserted and self.logger:
+            num_rows = sum(map(len, groups.values()))
+
+            self.logger.debug('Database: Inserted {} rows into {} tables in {:.3f}s ({:.0f} rows/s).'.format(
+                num_rows, len(groups), run_time, num_rows / run_time if run_time else 0))
+
+        return inserted
+
+    def select_query(self, table, columns, condition=''):
+        """
+        Execute a select query.
+        :param table:
+        :param columns: List of column names or "*"
+        :param condition:
+        :return:
+        """
+        if isinstance(columns, list):
+
+            formatted_columns = ','.join(columns)
+
+        elif isinstance(columns, str) and columns == '*':
+
+            formatted_columns = columns
+
+        else:
+
+            print('Columns must be list of column names or "*"')
+            return
+
+        query = 'SELECT {} from `{}` {}'.format(formatted_columns, table, condition)
+
+        def select(cursor):
+            cursor.execute(query)
+            return cursor.description, cursor.fetchall()
+
+        success, result = self._run(select)
+
+        return self.from_storage(*result) if success else None
+
+    def stream_query(self, table, columns, condition='',
+                     chunk_size=10000):
+        """
+        Execute a select query, fetching rows in chunks (SQLite steps through rows as they are fetched).
+        :param table:
+        :param columns: List of column names (or select expressions) or "*"
+        :param condition:
+        :param chunk_size: Rows per chunk
+        :return: (generator) list of row tuples per chunk
+        """
+
+        formatted_columns = ','.join(columns) if isinstance(columns, list) else columns
+
+        query = 'SELECT {} from `{}` {}'.format(formatted_columns, table, condition)
+
+        # Opened on a separate cursor, so the thread's connection can run other queries between chunks
+        success, cursor = self._run(lambda x: x.connection.cursor().execute(query), commit=False)
+
+        if not success:
+            return
+
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+
+                if not rows:
+                    break
+
+                yield rows
+
+        finally:
+            cursor.close()
+
+    def get_array_column(self, column, prices='float'):
+
+        return get_array_column(column, prices, self.price_storage)
+
+    def get_column_definitions(self):
+        """
+        Get definitions of the price and OHLC columns in the price storage of the database
+        :return: (tuple) price column definitions, OHLC column definitions
+        """
+
+        if self.price_storage == 'satoshi':
+            return SATOSHI_PRICE_COLUMN_DEFINITIONS, SATOSHI_OHLC_COLUMN_DEFINITIONS
+
+        return PRICE_COLUMN_DEFINITIONS, OHLC_COLUMN_DEFINITIONS
+
+    def create_price_table(self, table_name):
+        """
+        Execute a create table query with the price columns.
+        :param table_name: Table name
+        :return:
+        """
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'time DATETIME NOT NULL PRIMARY KEY, ' \
+                '{}) WITHOUT ROWID'.format(table_name, self.get_column_definitions()[0])
+
+        self.execute_query(query)
+
+    def create_rollup_table(self, table_name):
+        """
+        Execute a create table query with the price columns and (OPEN, HIGH, LOW, CLOSE).
+        :param table_name: Table name
+        :return:
+        """
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'time DATETIME NOT NULL PRIMARY KEY, ' \
+                '{},' \
+                '{}) WITHOUT ROWID'.format(table_name, *self.get_column_definitions())
+
+        self.execute_query(query)
+
+    def get_tables_with_column(self, column):
+        """
+        Get tables in current database having a column.
+        :param column: Column name
+        :return: (list)
+        """
+        query = 'SELECT m.name FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p ' \
+                'WHERE m.type = \'table\' AND p.name = ?'
+
+        def select(cursor):
+            cursor.execute(query, (column,))
+            return list(chain.from_iterable(cursor))
+
+        return self._run(select)[1]
+
+    def add_ohlc_columns(self, table_name):
+        """
+        Add (OPEN, HIGH, LOW, CLOSE) to a price table created before rollup tables had them.
+        :param table_name: Table name
+        :return: (bool) Columns added
+        """
+
+        # SQLite adds one column per statement
+        def add(cursor):
+            for definition in self.get_column_definitions()[1].split(','):
+                cursor.execute('ALTER TABLE `{}` ADD COLUMN {}'.format(table_name, definition))
+
+        return self._run(add)[0]
+
+    def create_market_table(self, table_name):
+        """
+        Execute a create table query for the market dimension: (ID, MARKET).
+        :param table_name: Table name
+        :return:
+        """
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, ' \
+                'market VARCHAR(16) NOT NULL UNIQUE)'.format(table_name)
+
+        self.execute_query(query)
+
+    def create_long_price_table(self, table_name, start_datetime, end_datetime,
+                                ohlc=False):
+        """
+        Execute a create table query for the price columns of all markets keyed by (MARKET_ID, DATETIME).
+        SQLite has no partitions, so start_datetime and end_datetime are unused.
+        :param table_name: Table name
+        :param start_datetime:
+        :param end_datetime:
+        :param ohlc: Add (OPEN, HIGH, LOW, CLOSE) for rollup tables
+        :return:
+        """
+        price_columns, ohlc_columns = self.get_column_definitions()
+        columns = price_columns + (',' + ohlc_columns if ohlc else '')
+
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'market_id INTEGER NOT NULL, ' \
+                'time DATETIME NOT NULL, ' \
+                '{}, ' \
+                'PRIMARY KEY (market_id, time)) WITHOUT ROWID'.format(table_name, columns)
+
+        self.execute_query(query)
+
+    def add_price_partitions(self, table_name, end_datetime):
+        """
+        SQLite tables are not partitioned.
+        :return: (bool) Partitions added
+        """
+
+        return False
+
+    def get_market_ids(self, table_name, markets):
+        """
+        Get ids of markets in the market dimension, adding missing markets.
+        :param table_name: Market table name
+        :param markets: List of markets
+        :return: (dict) Id per market
+        """
+        insert = 'INSERT OR IGNORE INTO `{}` (market) VALUES (?)'.format(table_name)
+        select = 'SELECT market, id FROM `{}`'.format(table_name)
+
+        def get_ids(cursor):
+            cursor.executemany(insert, [(x,) for x in markets])
+            cursor.execute(select)
+            return dict(cursor)
+
+        return self._run(get_ids)[1]
+
+    def copy_price_table(self, source_table, table_name, market_id, start_datetime, end_datetime,
+                         columns=PRICE_COLUMNS):
+        """
+        Copy rows of a per-market price table in [start_datetime, end_datetime) into a long price table.
+        Rows already copied are skipped.
+        :param source_table: Per-market price table
+        :param table_name: Long price table
+        :param market_id: Id of market of source_table
+        :param start_datetime:
+        :param end_datetime:
+        :param columns: Columns copied besides time
+        :return: (int) Number of rows copied (None if failed)
+        """
+        columns = ','.join(('time',) + tuple(columns))
+
+        query = 'INSERT OR IGNORE INTO `{}` (market_id,{}) SELECT ?,{} FROM `{}` ' \
+                'WHERE time >= ? AND time < ?'.format(table_name, columns, columns, source_table)
+
+        def copy(cursor):
+            cursor.execute(query, (market_id, start_datetime, end_datetime))
+            return cursor.rowcount
+
+        return self._run(copy)[1]
+
+    def create_trade_table(self, table_name):
+        """
+        Execute a create table query with the buy and sell of a trade.
+        :param table_name: Table name
+        :return:
+        """
+        query = 'CREATE TABLE IF NOT EXISTS `{}` (' \
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, ' \
+                'market CHAR(11) NOT NULL, ' \
+                'buy_time DATETIME NOT NULL, ' \
+                'buy_signal DECIMAL NOT NULL, ' \
+                'buy_price DECIMAL NOT NULL, ' \
+                'buy_total DECIMAL NOT NULL, ' \
+                'sell_time DATETIME NOT NULL, ' \
+                'sell_signal DECIMAL NOT NULL, ' \
+                'sell_price DECIMAL NOT NULL, ' \
+                'sell_total DECIMAL NOT NULL, ' \
+                'profit DECIMAL NOT NULL, ' \
+                'percent DECIMAL NOT NULL)'.format(table_name)
+
+        self.execute_query(query)
+
+    def create_database(self, database_name):
+        """
+        Databases are files created on first use.
+        :param database_name: Database name
+        :return:
+        """
+
+        return
+
+    def create_analysis_table(self, table_name):
+        """
+        Execute a create table query with two columns: (DATETIME, PRICE).
+        :param table_name: Table name
+        :return:
+        """
+        query = 'CREATE TABLE `{}` (time DATETIME NOT NULL PRIMARY KEY, price DECIMAL NOT NULL)'.format(table_name)
+
+        self.execute_query(query)
+
+    def get_all_tables(self):
+        """
+        Get all tables in current database.
+        :return: (list)
+        """
+        query = 'SELECT name FROM sqlite_master WHERE type = \'table\' AND name NOT LIKE \'sqlite_%\''
+
+        def select(cursor):
+            cursor.execute(query)
+            return list(chain.from_iterable(cursor))
+
+        return self._run(select)[1]
+
+    def close(self):
+        """
+        Close the connections of all threads
+        :return:
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+
+        for connection in connections:
+            connection.close()
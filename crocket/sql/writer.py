@@ -0,0 +1,270 @@
+from json import dumps, loads
+from os import remove, rename
+from os.path import exists
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import sleep, time
+
+
+class DatabaseWriter:
+    """
+    Write-behind writer inserting rows of several tables on a background thread.
+
+    Rows put on a bounded queue are group-committed with insert_transaction_query once commit_size
+    rows are pending, or commit_interval seconds after the oldest pending row arrived. While the
+    database is unreachable, rows stay pending and are retried every retry_interval seconds. Rows of
+    transactions failing otherwise (failed query or any other error) are counted as rejected.
+
+    Once max_pending rows are pending or the queue is full, rows are appended to spill_path as JSON
+    lines; spilled rows are inserted when the database is reachable again, also after a restart.
+    Without spill_path, the writer stops taking rows off the queue and put blocks instead.
+    """
+
+    def __init__(self,
+                 db,
+                 max_queue=100,
+                 commit_size=2000,
+                 commit_interval=5,
+                 retry_interval=10,
+                 max_pending=50000,
+                 spill_path=None,
+                 logger=None):
+
+        self.db = db
+        self.commit_size = commit_size
+        self.commit_interval = commit_interval
+        self.retry_interval = retry_interval
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.logger = logger
+
+        self.num_pending = 0
+        self.num_inserted = 0
+        self.num_spilled = 0
+        self.num_rejected = 0
+
+        self._queue = Queue(maxsize=max_queue)
+        self._spill_lock = Lock()
+        self._thread = Thread(target=self._run, name='DatabaseWriter', daemon=True)
+
+    @property
+    def queue_depth(self):
+
+        return self._queue.qsize()
+
+    def get_stats(self):
+        """
+        Get queue depth and row counts
+        :return: (dict)
+        """
+
+        return {'queue_depth': self.queue_depth,
+                'pending': self.num_pending,
+                'inserted': self.num_inserted,
+                'spilled': self.num_spilled,
+                'rejected': self.num_rejected}
+
+    def start(self):
+
+        self._thread.start()
+
+    def put(self, rows):
+        """
+        Queue rows for insertion, spilling them to file (or blocking) if the queue is full
+        :param rows: (list) tuple(table, columns, values)
+        :return:
+        """
+
+        if not rows:
+            return
+
+        try:
+            self._queue.put_nowait(rows)
+
+        except Full:
+            if self.spill_path:
+                self._spill(rows)
+            else:
+                self._queue.put(rows)
+
+    def close(self, timeout=60):
+        """
+        Insert queued rows and stop the writer thread (rows not inserted are spilled)
+        :param timeout: Seconds to wait for the writer thread
+        :return:
+        """
+
+        # The queue is not drained once the writer thread stopped
+        if not self._thread.is_alive():
+            return
+
+        try:
+            self._queue.put(None, timeout=timeout)
+
+        except Full:
+            if self.logger:
+                self.logger.error('DatabaseWriter: Writer thread did not take rows off the queue.')
+
+        self._thread.join(timeout)
+
+    def _spill(self, rows):
+
+        with self._spill_lock:
+            with open(self.spill_path, 'a') as f:
+                f.writelines(dumps(x, default=str) + '\n' for x in rows)
+
+        self.num_spilled += len(rows)
+
+        if self.logger:
+            self.logger.info('DatabaseWriter: Spilled {} rows to {}.'.format(len(rows), self.spill_path))
+
+    def _insert(self, rows):
+        """
+        Insert rows in one transaction, falling back to one transaction per table if rejected
+        :return: (bool) Database reachable
+        """
+
+        try:
+            if self.db.insert_transaction_query(rows):
+                self.num_inserted += len(rows)
+                return True
+
+        except self.db.unavailable_errors as e:
+            self._log_unavailable(e, rows)
+            return False
+
+        except Exception as e:
+            # Other errors (e.g. IntegrityError of MySQLdb) reject the transaction as a failed query does
+            if self.logger:
+                self.logger.error('DatabaseWriter: Transaction of {} rows failed ({}).'.format(len(rows), e))
+
+        tables = {}
+
+        for row in rows:
+            tables.setdefault(row[0], []).append(row)
+
+        for table, table_rows in tables.items():
+
+            try:
+                inserted = self.db.insert_transaction_query(table_rows)
+
+            except self.db.unavailable_errors as e:
+                self._log_unavailable(e, rows)
+                return False
+
+            except Exception as e:
+                inserted = False
+
+                if self.logger:
+                    self.logger.error('DatabaseWriter: Insert into {} failed ({}).'.format(table, e))
+
+            if inserted:
+                self.num_inserted += len(table_rows)
+            else:
+                self.num_rejected += len(table_rows)
+
+                if self.logger:
+                    self.logger.error('DatabaseWriter: {} rows rejected by {}.'.format(len(table_rows), table))
+
+        return True
+
+    def _log_unavailable(self, error, rows):
+
+        if self.logger:
+            self.logger.error('DatabaseWriter: Database unreachable ({}). {} rows pending.'.format(error, len(rows)))
+
+    def _insert_spilled(self):
+        """
+        Insert rows spilled to file
+        :return: (bool) Database reachable
+        """
+
+        if not self.spill_path:
+            return True
+
+        replay_path = self.spill_path + '.replay'
+
+        # Rows spilled while replaying are appended to a new spill file
+        with self._spill_lock:
+            if exists(self.spill_path) and not exists(replay_path):
+                rename(self.spill_path, replay_path)
+
+        if not exists(replay_path):
+            return True
+
+        with open(replay_path, 'r') as f:
+            rows = [tuple(loads(x)) for x in f if x.strip()]
+
+        if not self._insert(rows):
+            return False
+
+        remove(replay_path)
+
+        if self.logger:
+            self.logger.info('DatabaseWriter: Inserted {} spilled rows.'.format(len(rows)))
+
+        return True
+
+    def _run(self):
+
+        pending = []
+        first_time = None
+        next_retry = 0
+        stopping = False
+
+        self._insert_spilled()
+
+        while True:
+            now = time()
+
+            if pending and len(pending) >= self.max_pending and now < next_retry:
+
+                if self.spill_path:
+                    self._spill(pending)
+                    pending = []
+                    first_time = None
+                else:
+                    # Back-pressure: queue fills up and put blocks until the database is reachable
+                    sleep(next_retry - now)
+
+            elif not stopping:
+                timeout = max(first_time + self.commit_interval, next_retry) - now if pending else None
+
+                try:
+                    rows = self._queue.get(timeout=max(timeout, 0.01) if timeout is not None else None)
+
+                    if rows is None:
+                        stopping = True
+                    else:
+                        pending.extend(rows)
+                        first_time = first_time or time()
+
+                except Empty:
+                    pass
+
+            self.num_pending = len(pending)
+            now = time()
+
+            if pending and (stopping or
+                            (now >= next_retry and (len(pending) >= self.commit_size or
+                                                    now - first_time >= self.commit_interval))):
+
+                if self._insert(pending):
+                    pending = []
+                    first_time = None
+                    next_retry = 0
+
+                    self._insert_spilled()
+                else:
+                    next_retry = now + self.retry_interval
+
+            if stopping:
+                break
+
+        if pending:
+            if self.spill_path:
+                self._spill(pending)
+            elif self.logger:
+                self.logger.error('DatabaseWriter: {} rows could not be inserted.'.format(len(pending)))
+
+        self.num_pending = 0
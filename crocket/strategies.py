@@ -0,0 +1,168 @@
+from decimal import Decimal
+
+from bittrex.BittrexOrder import BittrexOrder
+from trade_algorithm import get_buy_candidates, run_algorithm, run_algorithm_batch
+from utilities.constants import BittrexConstants, OrderType
+from utilities.satoshi import from_satoshi
+
+# Commission of Bittrex per order, charged to orders filled on paper
+PAPER_COMMISSION = Decimal('0.0025')
+
+ROUTINGS = ('live', 'paper')
+
+
+class Strategy:
+    """
+    Trading strategy run by the tradebot on the bars shared by all strategies.
+
+    algorithm(data, status, buy_amount, order_queue, logger, **parameters) runs per market and bar as
+    run_algorithm. get_candidates(data, **parameters) evaluates its buy conditions for all markets of a
+    BittrexMarketData in batch mode as get_buy_candidates (algorithm runs for all markets if None).
+    Windows of data are shared by all strategies, so a strategy only adds the windows of its own lags.
+    """
+
+    def __init__(self, name, algorithm,
+                 get_candidates=None,
+                 parameters=None):
+
+        self.name = name
+        self.algorithm = algorithm
+        self.get_candidates = get_candidates
+        self.parameters = parameters or {}
+
+    def run(self, data, status, buy_amount, order_queue, logger):
+        """
+        Run algorithm on the bars of a market
+        :param data: (BittrexData or MarketRow) Bars of market
+        :param status: (BittrexStatus) Status of market for this strategy
+        :param buy_amount: Amount to purchase per buy order
+        :param order_queue: Queue or router of orders of this strategy
+        :param logger: Main logger
+        :return:
+        """
+
+        self.algorithm(data, status, buy_amount, order_queue, logger, **self.parameters)
+
+    def run_batch(self, data, market_status, markets, buy_amount, order_queue, logger):
+        """
+        Run algorithm on markets of a BittrexMarketData (see run_algorithm_batch)
+        :param data: (BittrexMarketData)
+        :param market_status: (dict) BittrexStatus per market for this strategy
+        :param markets: List of markets to run (in order)
+        :param buy_amount: Amount to purchase per buy order
+        :param order_queue: Queue or router of orders of this strategy
+        :param logger: Main logger
+        :return:
+        """
+
+        if self.get_candidates is None:
+            for market in markets:
+                self.run(data.get_market(market), market_status[market], buy_amount, order_queue, logger)
+        else:
+            run_algorithm_batch(data, market_status, markets, buy_amount, order_queue, logger,
+                                algorithm=self.algorithm,
+                                get_candidates=self.get_candidates,
+                                **self.parameters)
+
+
+class LiveRouter:
+    """
+    Routes orders of a strategy to the manager, which executes them on Bittrex
+    """
+
+    def __init__(self, strategy, order_queue):
+
+        self.strategy = strategy
+        self.order_queue = order_queue
+
+    def put(self, order):
+
+        order['strategy'] = self.strategy
+        self.order_queue.put(order)
+
+
+class PaperRouter:
+    """
+    Fills orders of a strategy at the latest bar of their market, without the manager
+    """
+
+    def __init__(self, strategy):
+
+        self.strategy = strategy
+        self.orders = []
+
+    def put(self, order):
+
+        order['strategy'] = self.strategy
+        self.orders.append(order)
+
+    def fill(self, get_data):
+        """
+        Fill orders put since the last fill at the wprice of the latest bar of their market
+        :param get_data: Function of market returning its bars (BittrexData or MarketRow)
+        :return: (list) Completed BittrexOrders
+        """
+
+        completed_orders = []
+
+        for order in self.orders:
+            data = get_data(order.get('market'))
+
+            completed_order = BittrexOrder.create(order)
+            completed_order.actual_price = from_satoshi(data.wprice[-1])
+            completed_order.closed_time = data.datetime[-1]
+            completed_order.current_quantity = order.get('target_quantity')
+
+            total = (completed_order.actual_price * completed_order.current_quantity).quantize(BittrexConstants.DIGITS)
+            commission = (total * PAPER_COMMISSION).quantize(BittrexConstants.DIGITS)
+
+            if completed_order.type == OrderType.BUY.name:
+                completed_order.current_total = -1 * (total + commission)
+            else:
+                completed_order.current_total = total - commission
+
+            completed_order.complete_order()
+            completed_orders.append(completed_order)
+
+        self.orders.clear()
+
+        return completed_orders
+
+
+STRATEGIES = {}
+
+
+def register_strategy(strategy):
+    """
+    Register a strategy to run in the tradebot by name (see TRADEBOT_STRATEGIES of run_server)
+    :param strategy: (Strategy)
+    :return: (Strategy)
+    """
+
+    if strategy.name in STRATEGIES:
+        raise ValueError('Strategy {} is already registered.'.format(strategy.name))
+
+    STRATEGIES[strategy.name] = strategy
+
+    return strategy
+
+
+def get_strategy(name):
+    """
+    Get a registered strategy
+    :param name: Name of strategy
+    :return: (Strategy)
+    """
+
+    if name not in STRATEGIES:
+        raise ValueError('Strategy {} is not registered ({}).'.format(name, ', '.join(STRATEGIES)))
+
+    return STRATEGIES[name]
+
+
+# Volume lag strategy of run_algorithm
+register_strategy(Strategy('volume_lag', run_algorithm, get_candidates=get_buy_candidates))
+
+# Volume lag strategy without minimum lag volumes (run_algorithm2 of develop_algorithm)
+register_strategy(Strategy('volume_lag_loose', run_algorithm, get_candidates=get_buy_candidates,
+                           parameters={'buy_volume_lag_min': 0, 'sell_volume_lag_min': 0}))
@@ -1,8 +1,15 @@
-from numpy import mean
-from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+from math import ceil, floor
+
+from numpy import abs as np_abs, errstate, minimum
 
 from bittrex.BittrexStatus import DEFAULT_STOP_GAIN_PERCENT
 from utilities.constants import BittrexConstants, OrderStatus, OrderType
+from utilities.satoshi import SATOSHI_PER_UNIT, divide_round_half_even, from_satoshi, to_satoshi
+
+# Relative error bound of the float price condition of get_buy_candidates
+PRICE_TOLERANCE = 1e-9
 
 
 def run_algorithm(data, status, buy_amount, order_queue, logger,
@@ -21,13 +28,10 @@ def run_algorithm(data, status, buy_amount, order_queue, logger,
                   wait_time=14400):
 
     market = status.market
-    time = data.datetime
-    buyvolume = data.buy_volume
-    sellvolume = data.sell_volume
-    wprice = data.wprice
+    current_time = data.datetime[-1]
 
-    current_time = time[-1]
-    current_price = wprice[-1]
+    # Signals are evaluated on integer satoshi units; Decimals are only made for orders
+    current_price = int(data.wprice[-1])
 
     last_buy_time_difference = (current_time - status.last_buy_time).total_seconds()
 
@@ -38,22 +42,28 @@ def run_algorithm(data, status, buy_amount, order_queue, logger,
         if last_buy_time_difference < wait_time:
             return
 
-        sample_buy_volume_mean = mean(buyvolume[-duration:])
-        buy_volume_lag_total = sum(buyvolume[-(duration + volume_lag_duration):-duration])
-        sell_volume_lag_total = sum(sellvolume[-(duration + volume_lag_duration):-duration])
+        # Windows are updated with each bar by data, so their cost does not grow with the lag durations
+        sample_buy_volume = data.get_window('buy_volume', duration)
+        buy_volume_lag_total = data.get_window('buy_volume', volume_lag_duration, duration).total
+        sell_volume_lag_total = data.get_window('sell_volume', volume_lag_duration, duration).total
 
-        if sample_buy_volume_mean > 0 and \
-            buy_volume_lag_min < buy_volume_lag_total < buy_volume_lag_max and \
-                sell_volume_lag_min < sell_volume_lag_total < sell_volume_lag_max:
+        # Sample buy volume mean above 0
+        if sample_buy_volume.total > 0 and \
+            _between_satoshi(buy_volume_lag_total, buy_volume_lag_min, buy_volume_lag_max) and \
+                _between_satoshi(sell_volume_lag_total, sell_volume_lag_min, sell_volume_lag_max):
 
-            previous_price = Decimal(
-                mean(wprice[-(duration + price_lag_time):-(duration + price_lag_time - price_lag_duration)])).quantize(
-                BittrexConstants.DIGITS)
+            # Mean price of the lag window quantized to satoshi
+            price_lag = data.get_window('wprice', price_lag_duration, duration + price_lag_time - price_lag_duration)
+            previous_price = divide_round_half_even(price_lag.total, price_lag.count) if price_lag.count else 0
 
-            if sample_buy_volume_mean > 2 and \
-                    abs((current_price - previous_price) / previous_price) < price_lag_threshold:
+            numerator, denominator = price_lag_threshold.as_integer_ratio()
 
-                target_quantity = (buy_amount / current_price).quantize(BittrexConstants.DIGITS)
+            # Sample buy volume mean above 2 and relative price change below threshold
+            if sample_buy_volume.total > 2 * SATOSHI_PER_UNIT * sample_buy_volume.count and \
+                    abs(current_price - previous_price) * denominator < numerator * previous_price:
+
+                buy_signal = from_satoshi(current_price)
+                target_quantity = (buy_amount / buy_signal).quantize(BittrexConstants.DIGITS)
 
                 order = {
                     'market': market,
@@ -67,7 +77,7 @@ def run_algorithm(data, status, buy_amount, order_queue, logger,
                 order_queue.put(order)
 
                 status.bought = True
-                status.buy_signal = current_price
+                status.buy_signal = buy_signal
                 status.last_buy_time = current_time
 
     # Action if have bought coin
@@ -85,14 +95,12 @@ def run_algorithm(data, status, buy_amount, order_queue, logger,
         else:
             loss_threshold = 0.01
 
-        current_stop_gain_threshold = (
-            status.buy_signal * Decimal(status.stop_gain_percent + 1)).quantize(BittrexConstants.DIGITS)
-        current_stop_gain_min_threshold = (
-            status.buy_signal * Decimal(status.stop_gain_percent - loss_threshold + 1)).quantize(
-            BittrexConstants.DIGITS)
+        current_stop_gain_threshold = get_satoshi_threshold(status.buy_signal, status.stop_gain_percent + 1)
+        current_stop_gain_min_threshold = get_satoshi_threshold(status.buy_signal,
+                                                                status.stop_gain_percent - loss_threshold + 1)
 
-        next_stop_gain_threshold = (status.buy_signal * Decimal(
-            status.stop_gain_percent + stop_gain_increment + 1)).quantize(BittrexConstants.DIGITS)
+        next_stop_gain_threshold = get_satoshi_threshold(status.buy_signal,
+                                                         status.stop_gain_percent + stop_gain_increment + 1)
 
         # Activate stop gain signal after passing threshold percentage
         if not status.stop_gain and current_price > current_stop_gain_threshold:
@@ -103,7 +111,7 @@ def run_algorithm(data, status, buy_amount, order_queue, logger,
         # Sell if hit stop loss
         # Sell after passing max hold time
         # Sell after detecting stop gain signal and price drop below stop gain price
-        if (current_price < (status.buy_signal * Decimal(1 - stop_loss_percent)).quantize(BittrexConstants.DIGITS)) or \
+        if current_price < get_satoshi_threshold(status.buy_signal, 1 - stop_loss_percent) or \
                 current_buy_hold_time > max_hold_time or \
                 (status.stop_gain and current_price < current_stop_gain_min_threshold):
 
@@ -120,6 +128,112 @@ def run_algorithm(data, status, buy_amount, order_queue, logger,
             order_queue.put(order)
 
             status.bought = False
-            status.sell_signal = current_price
+            status.sell_signal = from_satoshi(current_price)
             status.reset_stop_gain()
 
+
+@lru_cache(maxsize=1024)
+def get_satoshi_threshold(price, factor):
+    """
+    Get a price threshold in satoshi units, equal to (price * Decimal(factor)).quantize(BittrexConstants.DIGITS).
+    Thresholds of a held coin only change with its stop gain percent, so they are cached.
+    :param price: (Decimal) Buy signal
+    :param factor: (float) Factor of price
+    :return: (int)
+    """
+
+    numerator, denominator = factor.as_integer_ratio()
+
+    return divide_round_half_even(to_satoshi(price) * numerator, denominator)
+
+
+@lru_cache(maxsize=64)
+def get_satoshi_bounds(low, high):
+    """
+    Get integer bounds in satoshi units of low < total < high for bounds in base units
+    :return: (tuple) Exclusive lower and upper bound
+    """
+
+    return floor(Fraction(low) * SATOSHI_PER_UNIT), ceil(Fraction(high) * SATOSHI_PER_UNIT)
+
+
+def _between_satoshi(totals, low, high):
+    """
+    Exact low < total < high for satoshi totals (ints or arrays) and bounds in base units
+    """
+
+    lower, upper = get_satoshi_bounds(low, high)
+
+    return (totals > lower) & (totals < upper)
+
+
+def get_buy_candidates(data,
+                       duration=1,
+                       price_lag_time=30,
+                       price_lag_duration=5,
+                       price_lag_threshold=0.05,
+                       volume_lag_duration=60,
+                       buy_volume_lag_min=10,
+                       buy_volume_lag_max=40,
+                       sell_volume_lag_min=10,
+                       sell_volume_lag_max=40,
+                       **kwargs):
+    """
+    Evaluate the buy conditions of run_algorithm for all markets of data in one pass.
+    Volume conditions are exact in satoshi units. The price condition is evaluated with both roundings of the
+    previous price and a float tolerance, so it never rejects a market run_algorithm would buy. The wait time
+    since the last buy is left to run_algorithm.
+    :param data: (BittrexMarketData)
+    :param kwargs: Other parameters of run_algorithm
+    :return: (numpy.ndarray) True per row of data that may buy
+    """
+
+    sample_buy_volume = data.get_window('buy_volume', duration)
+    buy_volume_lag = data.get_window('buy_volume', volume_lag_duration, duration)
+    sell_volume_lag = data.get_window('sell_volume', volume_lag_duration, duration)
+    price_lag = data.get_window('wprice', price_lag_duration, duration + price_lag_time - price_lag_duration)
+
+    # Sample buy volume mean above 2 (and so above 0)
+    candidates = (sample_buy_volume.total > 2 * SATOSHI_PER_UNIT * sample_buy_volume.count) & \
+        _between_satoshi(buy_volume_lag.total, buy_volume_lag_min, buy_volume_lag_max) & \
+        _between_satoshi(sell_volume_lag.total, sell_volume_lag_min, sell_volume_lag_max)
+
+    # Previous price is the window mean quantized to satoshi, either rounded down or up
+    count = price_lag.count
+    price_floor = price_lag.total // (count + (count == 0))
+    price_ceil = -(-price_lag.total // (count + (count == 0)))
+    current_price = data.get_latest('wprice')
+
+    with errstate(divide='ignore', invalid='ignore'):
+        difference = minimum(np_abs(current_price - price_floor) / price_floor,
+                             np_abs(current_price - price_ceil) / price_ceil)
+
+    # Empty windows and zero prices are left to run_algorithm
+    return candidates & ((difference < price_lag_threshold * (1 + PRICE_TOLERANCE)) | (count == 0) | (price_floor <= 0))
+
+
+def run_algorithm_batch(data, market_status, markets, buy_amount, order_queue, logger,
+                        algorithm=run_algorithm,
+                        get_candidates=get_buy_candidates,
+                        **parameters):
+    """
+    Run run_algorithm on markets, skipping markets that have not bought coin and do not pass get_buy_candidates
+    :param data: (BittrexMarketData)
+    :param market_status: (dict) BittrexStatus per market
+    :param markets: List of markets to run (in order)
+    :param buy_amount: Amount to purchase per buy order
+    :param order_queue: Queue to pass orders to manager
+    :param logger: Main logger
+    :param algorithm: Algorithm run per market (run_algorithm)
+    :param get_candidates: Buy conditions of algorithm for all markets (get_buy_candidates)
+    :param parameters: Parameters of algorithm
+    :return:
+    """
+
+    candidates = get_candidates(data, **parameters)[data.get_rows(markets)].tolist()
+
+    for market, candidate in zip(markets, candidates):
+        status = market_status[market]
+
+        if candidate or status.bought:
+            algorithm(data.get_market(market), status, buy_amount, order_queue, logger, **parameters)
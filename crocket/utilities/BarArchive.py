@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta
+from json import dump, load
+from os import listdir, makedirs, replace
+from os.path import exists, getsize, isdir, join
+
+from numpy import array, empty, int64, memmap, searchsorted
+
+INDEX_FILE = 'index.json'
+COLUMN_SUFFIX = '.i64'
+
+VERSION = 1
+
+EPOCH_NAIVE = datetime(1970, 1, 1)
+
+
+class BarArchive:
+    """
+    Columnar archive of bars, one directory per market with one file of int64 values per column.
+
+    time is stored as microseconds since epoch of the stored (local) time, DECIMAL columns in satoshi
+    units and other columns as integers, the same values read_arrays reads with prices='satoshi'.
+    Column files are raw little-endian int64 and can be memory-mapped, so years of bars open without
+    parsing or copying. index.json of each market holds its columns, number of rows and time range.
+
+    Rows are only appended after the last time of a market. Column files are written before the index
+    is replaced, so rows of an interrupted append are beyond num_rows and overwritten by the next append.
+    """
+
+    def __init__(self, directory):
+
+        self.directory = directory
+
+        makedirs(directory, exist_ok=True)
+
+    def get_markets(self):
+        """
+        Get markets in the archive
+        :return: (list)
+        """
+
+        return sorted(x for x in listdir(self.directory) if exists(join(self.directory, x, INDEX_FILE)))
+
+    def get_index(self, market):
+        """
+        Get index of market
+        :param market:
+        :return: (dict) version, columns, num_rows, first_time and last_time (None if market is not archived)
+        """
+
+        path = join(self.directory, market, INDEX_FILE)
+
+        if not exists(path):
+            return None
+
+        with open(path, 'r') as f:
+            return load(f)
+
+    def _write_index(self, market, index):
+
+        path = join(self.directory, market, INDEX_FILE)
+
+        with open(path + '.tmp', 'w') as f:
+            dump(index, f)
+
+        replace(path + '.tmp', path)
+
+    def append(self, market, arrays):
+        """
+        Append rows of market later than its last archived time
+        :param market:
+        :param arrays: (dict) Array per column in time order (columns must match the archived columns)
+        :return: (int) Number of rows appended
+        """
+
+        columns = list(arrays)
+
+        if 'time' not in arrays:
+            raise ValueError('Rows of {} have no time column.'.format(market))
+
+        index = self.get_index(market)
+
+        if index is None:
+            makedirs(join(self.directory, market), exist_ok=True)
+
+            index = {'version': VERSION, 'columns': columns, 'num_rows': 0, 'first_time': None, 'last_time': None}
+
+        elif set(index['columns']) != set(columns):
+            raise ValueError('Columns of {} are {}, not {}.'.format(market, index['columns'], columns))
+
+        times = arrays['time']
+        start = int(searchsorted(times, index['last_time'], side='right')) if index['last_time'] is not None else 0
+
+        if start == len(times):
+            return 0
+
+        for column in index['columns']:
+            path = join(self.directory, market, column + COLUMN_SUFFIX)
+            values = array(arrays[column][start:], dtype='<i8')
+
+            with open(path, 'r+b' if index['num_rows'] else 'wb') as f:
+                # Rows beyond num_rows are left by an interrupted append
+                f.truncate(index['num_rows'] * 8)
+                f.seek(0, 2)
+                f.write(values.tobytes())
+
+        if index['first_time'] is None:
+            index['first_time'] = int(times[start])
+
+        index['last_time'] = int(times[-1])
+        index['num_rows'] += len(times) - start
+
+        self._write_index(market, index)
+
+        return len(times) - start
+
+    def open(self, market,
+             start_time=None,
+             end_time=None,
+             columns=None):
+        """
+        Open columns of market as read-only memory-mapped arrays
+        :param market:
+        :param start_time: First time in microseconds since epoch (from the first row if None)
+        :param end_time: Rows before end_time in microseconds since epoch (to the last row if None)
+        :param columns: List of columns (all columns if None)
+        :return: (dict) int64 array per column (views of the column files)
+        """
+
+        index = self.get_index(market)
+
+        if index is None:
+            raise KeyError('{} is not archived in {}.'.format(market, self.directory))
+
+        columns = columns or index['columns']
+        num_rows = index['num_rows']
+
+        if not num_rows:
+            return {x: empty(0, dtype=int64) for x in columns}
+
+        arrays = {x: memmap(join(self.directory, market, x + COLUMN_SUFFIX), dtype='<i8', mode='r', shape=(num_rows,))
+                  for x in set(columns) | {'time'}}
+
+        times = arrays['time']
+        start = searchsorted(times, start_time) if start_time is not None else 0
+        end = searchsorted(times, end_time) if end_time is not None else num_rows
+
+        return {x: arrays[x][start:end] for x in columns}
+
+    def get_size(self, market):
+        """
+        Get bytes of column files of market
+        :param market:
+        :return: (int)
+        """
+
+        directory = join(self.directory, market)
+
+        return sum(getsize(join(directory, x)) for x in listdir(directory) if x.endswith(COLUMN_SUFFIX)) \
+            if isdir(directory) else 0
+
+
+def export_table(archive, db, market, table_name, columns,
+                 chunk_size=100000):
+    """
+    Append rows of a price table later than the last archived time of market to the archive.
+    Rows are streamed in chunks, so the export can be rerun (or interrupted) at any time.
+    :param archive: BarArchive
+    :param db: Database of any storage backend
+    :param market: Market name in the archive
+    :param table_name: Price or rollup table of market
+    :param columns: Columns besides time
+    :param chunk_size: Rows per chunk
+    :return: (int) Number of rows appended
+    """
+
+    columns = ['time'] + [x for x in columns if x != 'time']
+    expressions = [db.get_array_column(x, prices='satoshi')[0] for x in columns]
+
+    index = archive.get_index(market)
+    condition = ''
+
+    if index is not None and index['last_time'] is not None:
+        # Stored time whose read_arrays value is last_time (compared on the column to use the primary key)
+        condition = 'WHERE time > \'{:%Y-%m-%d %H:%M:%S}\' '.format(
+            EPOCH_NAIVE + timedelta(microseconds=index['last_time']))
+
+    num_rows = 0
+
+    for rows in db.stream_query(table_name, expressions, condition + 'ORDER BY time', chunk_size=chunk_size):
+        values = array(rows, dtype=int64)
+
+        num_rows += archive.append(market, {x: values[:, i] for i, x in enumerate(columns)})
+
+    return num_rows
+
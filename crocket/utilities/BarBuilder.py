@@ -0,0 +1,223 @@
+from datetime import datetime, timedelta
+
+from utilities.constants import OrderType
+from utilities.satoshi import divide_round_half_even, from_satoshi
+from utilities.time import convert_datetime_to_epoch, format_time, utc_to_local
+
+EPOCH_NAIVE = datetime(1970, 1, 1)
+
+# Fields of bars, in column order of rollup tables
+BAR_FIELDS = ('time', 'price', 'wprice', 'base_volume', 'buy_volume', 'sell_volume', 'buy_order', 'sell_order',
+              'open', 'high', 'low', 'close')
+
+
+class _Bar:
+    """
+    Accumulator of the bar being built for one market and resolution
+    """
+
+    __slots__ = ('start', 'count', 'buy_count', 'price_total', 'volume', 'buy_volume', 'sell_volume',
+                 'price_volume', 'open', 'high', 'low', 'close')
+
+    def __init__(self, start):
+
+        self.reset(start)
+
+    def reset(self, start):
+
+        self.start = start
+        self.count = 0
+        self.buy_count = 0
+        self.price_total = 0
+        self.volume = 0
+        self.buy_volume = 0
+        self.sell_volume = 0
+        self.price_volume = 0
+        self.open = None
+        self.high = None
+        self.low = None
+        self.close = None
+
+
+class BarBuilder:
+    """
+    Aggregates trade streams of several markets into bars of several resolutions at once.
+
+    Each trade updates one accumulator per resolution in O(1), so coarse bars never re-read finer bars.
+    A bar of resolution r covers trades t with start < t <= start + r, with starts at multiples of r
+    from origin. A bar is closed when a later trade arrives or when close_bars is called past its end;
+    bars without trades are forward-filled with the last price.
+
+    Prices and totals are satoshi integers: mean prices are identical to calculate_metrics, volumes
+    are sums of the totals rounded to satoshis per trade and the volume weighted price is the exactly
+    rounded quotient of these sums. calculate_metrics sums float totals before rounding, so volumes can
+    differ from its volumes by a satoshi when totals of Bittrex have more than 8 decimal places.
+    Bars have the fields of calculate_metrics plus open, high, low and close.
+    """
+
+    def __init__(self,
+                 resolutions=(10, 60, 300, 3600),
+                 origin=None):
+
+        self.resolutions = tuple(sorted(resolutions))
+        self.origin = convert_datetime_to_epoch(origin) if origin else 0
+
+        # Accumulators per market, one per resolution
+        self._bars = {}
+
+        # Price, weighted price and close of last bar with trades per market, one per resolution
+        self._last = {}
+
+        # Closed bars by resolution and market
+        self._entries = {x: {} for x in self.resolutions}
+
+    def __contains__(self, market):
+
+        return market in self._bars
+
+    def start(self, market, start_datetime):
+        """
+        Start bars of market at the first bar start of each resolution at or after start_datetime.
+        Trades up to that bar start are ignored, so the first bar of each resolution is not partial
+        (the bar containing start_datetime would only hold the trades of the fetched history).
+        :param market:
+        :param start_datetime: Time from which all trades of market are added
+        :return:
+        """
+
+        start = convert_datetime_to_epoch(start_datetime)
+        bars = []
+
+        for resolution in self.resolutions:
+            length = resolution * 1000000
+            bars.append(_Bar(start + (self.origin - start) % length))
+
+        self._bars[market] = bars
+        self._last[market] = [[0, 0, 0] for _ in self.resolutions]
+
+    def _close(self, market, index):
+        """
+        Close current bar of market and resolution and start the next one
+        :param market:
+        :param index: Index of resolution
+        :return:
+        """
+
+        bar = self._bars[market][index]
+        last = self._last[market][index]
+        resolution = self.resolutions[index]
+
+        bar_datetime = utc_to_local(EPOCH_NAIVE + timedelta(microseconds=bar.start))
+
+        entry = {'base_volume': 0,
+                 'buy_order': 0,
+                 'sell_order': 0,
+                 'buy_volume': 0,
+                 'sell_volume': 0,
+                 'price': last[0],
+                 'wprice': last[1],
+                 'open': last[2],
+                 'high': last[2],
+                 'low': last[2],
+                 'close': last[2],
+                 'datetime': bar_datetime,
+                 'time': format_time(bar_datetime, "%Y-%m-%d %H:%M:%S")}
+
+        if bar.count:
+            # Bars of orders without volume have no prices (as in calculate_metrics)
+            last[0] = last[1] = 0
+
+            if bar.volume:
+                last[0] = from_satoshi(divide_round_half_even(bar.price_total, bar.count))
+                last[1] = from_satoshi(divide_round_half_even(bar.price_volume, bar.volume))
+
+                entry['base_volume'] = from_satoshi(bar.volume)
+                entry['buy_order'] = bar.buy_count
+                entry['sell_order'] = bar.count - bar.buy_count
+                entry['buy_volume'] = from_satoshi(bar.buy_volume)
+                entry['sell_volume'] = from_satoshi(bar.sell_volume)
+
+            last[2] = from_satoshi(bar.close)
+
+            entry['price'] = last[0]
+            entry['wprice'] = last[1]
+            entry['open'] = from_satoshi(bar.open)
+            entry['high'] = from_satoshi(bar.high)
+            entry['low'] = from_satoshi(bar.low)
+            entry['close'] = last[2]
+
+        self._entries[resolution].setdefault(market, []).append(entry)
+
+        bar.reset(bar.start + resolution * 1000000)
+
+    def add_trades(self, market, timestamps, prices, totals, sides):
+        """
+        Add trades of market (oldest first), closing bars that end before a trade
+        :param market: Started market
+        :param timestamps: Microseconds since epoch
+        :param prices: Prices in satoshi units
+        :param totals: Totals in satoshi units
+        :param sides: OrderType values
+        :return:
+        """
+
+        bars = self._bars[market]
+        buy = OrderType.BUY.value
+        sell = OrderType.SELL.value
+
+        for timestamp, price, total, side in zip(timestamps, prices, totals, sides):
+
+            for index, bar in enumerate(bars):
+                length = self.resolutions[index] * 1000000
+
+                if timestamp <= bar.start:
+                    continue
+
+                while timestamp > bar.start + length:
+                    self._close(market, index)
+
+                if not bar.count:
+                    bar.open = bar.high = bar.low = price
+                elif price > bar.high:
+                    bar.high = price
+                elif price < bar.low:
+                    bar.low = price
+
+                bar.count += 1
+                bar.price_total += price
+                bar.volume += total
+                bar.price_volume += price * total
+                bar.close = price
+
+                if side == buy:
+                    bar.buy_count += 1
+                    bar.buy_volume += total
+                elif side == sell:
+                    bar.sell_volume += total
+
+    def close_bars(self, market, complete_datetime):
+        """
+        Close bars of market ending before complete_datetime
+        :param market: Started market
+        :param complete_datetime: Time up to which all trades of market were added
+        :return:
+        """
+
+        complete_timestamp = convert_datetime_to_epoch(complete_datetime)
+
+        for index, bar in enumerate(self._bars[market]):
+            length = self.resolutions[index] * 1000000
+
+            while bar.start + length <= complete_timestamp:
+                self._close(market, index)
+
+    def pop_entries(self):
+        """
+        Remove and return closed bars
+        :return: (dict) List of bars per market by resolution
+        """
+
+        entries = self._entries
+        self._entries = {x: {} for x in self.resolutions}
+
+        return entries
@@ -0,0 +1,181 @@
+from time import time
+
+
+class PollScheduler:
+    """
+    Schedules market history requests per market from the observed trade arrival rate.
+
+    The trade rate of a market is an exponentially weighted moving average (EWMA) of new trades
+    (Id above the latest Id seen) per second between polls. A market is polled every
+    target_trades / rate seconds, clamped to [min_period, max_period], so busy markets are polled
+    often and quiet markets rarely. Every market is also polled grace seconds after its current bar
+    ends, so the bar can be closed (forward-filled if no trades) on time. Busy markets are polled
+    earlier, as soon as a trade after the end of the bar is expected.
+    """
+
+    def __init__(self,
+                 markets,
+                 interval=60,
+                 min_period=5,
+                 max_period=60,
+                 target_trades=20,
+                 grace=5,
+                 alpha=0.3,
+                 clock=time):
+
+        self.interval = interval
+        self.min_period = min_period
+        self.max_period = max_period
+        self.target_trades = target_trades
+        self.grace = grace
+        self.alpha = alpha
+        self.clock = clock
+
+        self._markets = {market: {
+            'rate': None,
+            'period': min_period,
+            'last_id': None,
+            'last_poll': None,
+            'last_attempt': None,
+            'next_poll': 0
+        } for market in markets}
+
+    def _get_deadlines(self, stats, market_datetime):
+        """
+        Times to poll market after the bar starting at market_datetime ends: once a trade after the end
+        of the bar is expected (busy markets) and once grace seconds after the end of the bar
+        :param stats: Market statistics
+        :param market_datetime: Start of current bar
+        :return: (list(float)) Seconds since epoch
+        """
+
+        bar_end = market_datetime.timestamp() + self.interval
+        deadlines = [bar_end + self.grace]
+
+        if stats.get('rate') and 2 / stats.get('rate') < self.grace:
+            deadlines.insert(0, bar_end + 2 / stats.get('rate'))
+
+        return deadlines
+
+    def _get_next_poll_time(self, stats, market_datetime):
+
+        next_poll_time = stats.get('next_poll')
+
+        if market_datetime is not None:
+            for deadline in self._get_deadlines(stats, market_datetime):
+                if stats.get('last_attempt') is None or stats.get('last_attempt') < deadline:
+                    return min(next_poll_time, deadline)
+
+        return next_poll_time
+
+    def get_due_markets(self, market_datetime, now=None):
+        """
+        Get markets to poll now
+        :param market_datetime: (dict) Start of current bar per market
+        :param now: Current time
+        :return: (list) Markets
+        """
+
+        now = self.clock() if now is None else now
+
+        return [market for market, stats in self._markets.items()
+                if self._get_next_poll_time(stats, market_datetime.get(market)) <= now]
+
+    def get_next_poll_time(self, market_datetime):
+        """
+        Get time of the next scheduled poll of any market
+        :param market_datetime: (dict) Start of current bar per market
+        :return: (float) Seconds since epoch
+        """
+
+        if not self._markets:
+            return self.clock() + self.max_period
+
+        return min(self._get_next_poll_time(stats, market_datetime.get(market))
+                   for market, stats in self._markets.items())
+
+    def record_polls(self, markets, response_dict, now=None):
+        """
+        Update trade rates and schedule next polls of polled markets
+        :param markets: Polled markets
+        :param response_dict: (dict) Market history per market (failed polls are missing)
+        :param now: Time of poll
+        :return:
+        """
+
+        now = self.clock() if now is None else now
+
+        for market in markets:
+            stats = self._markets.get(market)
+
+            if stats is None:
+                continue
+
+            stats['last_attempt'] = now
+            trades = response_dict.get(market)
+
+            # Failed poll: retry soon
+            if not trades:
+                stats['next_poll'] = now + self.min_period
+                continue
+
+            last_id = stats.get('last_id')
+            num_new_trades = 0
+
+            for trade in trades:
+                if last_id is not None and trade.get('Id') <= last_id:
+                    break
+                num_new_trades += 1
+
+            stats['last_id'] = max(trades[0].get('Id'), last_id if last_id is not None else trades[0].get('Id'))
+
+            if last_id is not None and now > stats.get('last_poll'):
+                rate = num_new_trades / (now - stats.get('last_poll'))
+
+                if stats.get('rate') is None:
+                    stats['rate'] = rate
+                else:
+                    stats['rate'] += self.alpha * (rate - stats.get('rate'))
+
+                if stats.get('rate') > 0:
+                    stats['period'] = min(max(self.target_trades / stats.get('rate'), self.min_period), self.max_period)
+                else:
+                    stats['period'] = self.max_period
+
+                # Response held only new trades: some trades may have been missed
+                if num_new_trades == len(trades):
+                    stats['period'] = self.min_period
+
+            stats['last_poll'] = now
+            stats['next_poll'] = now + stats.get('period')
+
+    def remove(self, market):
+        """
+        Stop polling market
+        :param market:
+        :return:
+        """
+
+        self._markets.pop(market, None)
+
+    def get_stats(self):
+        """
+        Get polling statistics of all markets
+        :return: (dict) Trade rate and polling period per market
+        """
+
+        return {market: {'rate': stats.get('rate'), 'period': stats.get('period')}
+                for market, stats in self._markets.items()}
+
+    def summary(self):
+        """
+        Summarize polling periods of all markets
+        :return: (str)
+        """
+
+        periods = [x.get('period') for x in self._markets.values()]
+
+        return 'PollScheduler: {} markets, {:.1f} requests/min, {} at minimum period.'.format(
+            len(periods),
+            sum(60 / x for x in periods),
+            len([x for x in periods if x <= self.min_period]))
@@ -0,0 +1,176 @@
+from random import shuffle
+from time import time
+
+
+class ProxyPool:
+    """
+    Tracks latency and errors of all proxies and assigns requests to the fastest healthy proxies.
+
+    Latency and error rate are exponentially weighted moving averages (EWMA). Proxies that have not
+    been used yet have no latency and are tried first. Proxies slower than slow_ratio times the median
+    are skipped, except for one request every probe_interval seconds to update their latency.
+    A proxy failing failure_threshold times in a row
+    is quarantined; the quarantine doubles with each further failure (up to max_backoff) and ends on
+    the next success after it expires.
+    """
+
+    def __init__(self,
+                 proxies,
+                 alpha=0.2,
+                 error_penalty=4,
+                 slow_ratio=4,
+                 probe_interval=300,
+                 failure_threshold=2,
+                 base_backoff=10,
+                 max_backoff=600,
+                 clock=time,
+                 logger=None):
+
+        if not isinstance(proxies, list) or not proxies:
+            raise TypeError('ProxyPool: proxies must be a non-empty list of proxy addresses.')
+
+        self.proxies = proxies
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.slow_ratio = slow_ratio
+        self.probe_interval = probe_interval
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.logger = logger
+
+        self._stats = [{
+            'latency': None,
+            'error_rate': 0,
+            'requests': 0,
+            'failures': 0,
+            'consecutive_failures': 0,
+            'last_request': 0,
+            'quarantined_until': 0
+        } for _ in proxies]
+
+    def _score(self, index):
+        """
+        Expected cost of a request through proxy (lower is better)
+        :param index: Proxy index
+        :return:
+        """
+
+        stats = self._stats[index]
+
+        if stats.get('latency') is None:
+            return 0
+
+        return stats.get('latency') * (1 + self.error_penalty * stats.get('error_rate'))
+
+    def is_healthy(self, index, now=None):
+        """
+        Check if proxy is not quarantined
+        :param index: Proxy index
+        :param now: Current time
+        :return:
+        """
+
+        return self._stats[index].get('quarantined_until') <= (self.clock() if now is None else now)
+
+    def assign(self, count):
+        """
+        Assign proxies to requests, one proxy per request while enough healthy proxies are available
+        :param count: Number of requests
+        :return: (list(int)) Proxy index per request
+        """
+
+        now = self.clock()
+
+        healthy = [x for x in range(len(self.proxies)) if self.is_healthy(x, now)]
+
+        # All proxies quarantined: use proxies closest to the end of their quarantine
+        if not healthy:
+            healthy = sorted(range(len(self.proxies)), key=lambda x: self._stats[x].get('quarantined_until'))
+
+        healthy.sort(key=self._score)
+
+        # Skip slow proxies unless due for a probe
+        scores = [self._score(x) for x in healthy if self._stats[x].get('latency') is not None]
+
+        if scores:
+            cutoff = self.slow_ratio * scores[len(scores) // 2]
+            healthy = [x for x in healthy if self._score(x) <= cutoff or
+                       now - self._stats[x].get('last_request') >= self.probe_interval]
+
+        indexes = [healthy[x % len(healthy)] for x in range(count)]
+        shuffle(indexes)
+
+        return indexes
+
+    def record_success(self, index, latency):
+        """
+        Record successful request through proxy
+        :param index: Proxy index
+        :param latency: Duration of request in seconds
+        :return:
+        """
+
+        stats = self._stats[index]
+
+        if stats.get('latency') is None:
+            stats['latency'] = latency
+        else:
+            stats['latency'] += self.alpha * (latency - stats.get('latency'))
+
+        stats['error_rate'] *= 1 - self.alpha
+        stats['requests'] += 1
+        stats['last_request'] = self.clock()
+        stats['consecutive_failures'] = 0
+
+    def record_failure(self, index):
+        """
+        Record failed request through proxy and quarantine proxy if it keeps failing
+        :param index: Proxy index
+        :return:
+        """
+
+        stats = self._stats[index]
+
+        stats['error_rate'] += self.alpha * (1 - stats.get('error_rate'))
+        stats['requests'] += 1
+        stats['last_request'] = self.clock()
+        stats['failures'] += 1
+        stats['consecutive_failures'] += 1
+
+        excess_failures = stats.get('consecutive_failures') - self.failure_threshold
+
+        if excess_failures >= 0:
+            backoff = min(self.base_backoff * 2 ** excess_failures, self.max_backoff)
+            stats['quarantined_until'] = self.clock() + backoff
+
+            if self.logger:
+                self.logger.debug('ProxyPool: Quarantined {} for {}s after {} consecutive failures.'.format(
+                    self.proxies[index], backoff, stats.get('consecutive_failures')))
+
+    def get_stats(self):
+        """
+        Get statistics of all proxies
+        :return: (dict) Statistics per proxy address
+        """
+
+        now = self.clock()
+
+        return {self.proxies[x]: dict(self._stats[x], quarantined=not self.is_healthy(x, now))
+                for x in range(len(self.proxies))}
+
+    def summary(self):
+        """
+        Summarize health of all proxies
+        :return: (str)
+        """
+
+        now = self.clock()
+
+        latencies = [x.get('latency') for x in self._stats if x.get('latency') is not None]
+        num_quarantined = len([x for x in range(len(self.proxies)) if not self.is_healthy(x, now)])
+
+        return 'ProxyPool: {} proxies, {} quarantined, mean latency {}.'.format(
+            len(self.proxies), num_quarantined,
+            '{:.3f}s'.format(sum(latencies) / len(latencies)) if latencies else 'unknown')
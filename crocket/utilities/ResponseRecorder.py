@@ -0,0 +1,188 @@
+from datetime import datetime
+from gzip import BadGzipFile, compress, open as gzip_open
+from os import listdir, makedirs
+from os.path import getsize, join
+from urllib.parse import parse_qs, urlsplit
+from zlib import error as ZlibError
+
+from bittrex.bittrex2 import format_bittrex_entry
+
+SEGMENT_PREFIX = 'responses'
+SEGMENT_SUFFIX = '.seg.gz'
+
+
+class ResponseRecorder:
+    """
+    Records raw market history responses of the scraper to compressed append-only segment files.
+
+    Each cycle is appended to the current segment as one gzip member of text lines:
+        C <cycle time> <complete time or empty>    start of cycle
+        R <receive time> <market> <body>           raw response body
+        U <market>                                 market not fetched, last market history reused
+        B <market> <values of format_bittrex_entry> bar emitted in cycle
+        E                                          end of cycle
+    Every segment starts with a line "S <start time>" (start of the first bar of all markets).
+    Times are seconds since epoch. Segments are rotated once they exceed segment_size bytes;
+    a cycle cut short by a crash is skipped when reading.
+    """
+
+    def __init__(self,
+                 directory,
+                 start_datetime,
+                 segment_size=64 * 1024 * 1024,
+                 compression_level=6):
+
+        self.directory = directory
+        self.start_datetime = start_datetime
+        self.segment_size = segment_size
+        self.compression_level = compression_level
+
+        self.num_segments = 0
+        self.path = None
+
+        self._responses = []
+
+        makedirs(directory, exist_ok=True)
+
+        self._open_segment()
+
+    def _open_segment(self):
+        """
+        Start a new segment file
+        :return:
+        """
+
+        self.path = join(self.directory, '{}-{:.0f}-{:06d}{}'.format(
+            SEGMENT_PREFIX, self.start_datetime.timestamp(), self.num_segments, SEGMENT_SUFFIX))
+        self.num_segments += 1
+
+        with open(self.path, 'ab') as f:
+            f.write(compress('S\t{!r}\n'.format(self.start_datetime.timestamp()).encode('utf-8'),
+                             self.compression_level))
+
+    def record_response(self, market, receive_time, body):
+        """
+        Record raw response body of market (written with the next cycle)
+        :param market:
+        :param receive_time: Seconds since epoch
+        :param body: (bytes) Response body
+        :return:
+        """
+
+        # Line breaks are only whitespace in valid JSON
+        self._responses.append(b'R\t%r\t%s\t%s\n' % (receive_time, market.encode('utf-8'), body.replace(b'\n', b' ')))
+
+    def write_cycle(self, cycle_time, response_dict, entries, complete_datetime=None):
+        """
+        Append recorded responses, reused market histories and bars of a cycle to the current segment
+        :param cycle_time: Start of cycle in seconds since epoch
+        :param response_dict: (dict) Market history per market passed to process_data
+        :param entries: (dict) List of bars per market emitted by process_data
+        :param complete_datetime: Time up to which market histories are complete
+        :return:
+        """
+
+        lines = [b'C\t%r\t%s\n' % (cycle_time,
+                                   repr(complete_datetime.timestamp()).encode('utf-8') if complete_datetime else b'')]
+        lines += self._responses
+
+        recorded_markets = set(x.split(b'\t', 3)[2].decode('utf-8') for x in self._responses)
+        lines += [b'U\t%s\n' % x.encode('utf-8') for x in response_dict if x not in recorded_markets]
+
+        for market, market_entries in entries.items():
+            for entry in market_entries:
+                lines.append('B\t{}\t{}\n'.format(market, '\t'.join(map(str, format_bittrex_entry(entry)[1])))
+                             .encode('utf-8'))
+
+        lines.append(b'E\n')
+
+        self._responses = []
+
+        with open(self.path, 'ab') as f:
+            f.write(compress(b''.join(lines), self.compression_level))
+
+        if getsize(self.path) > self.segment_size:
+            self._open_segment()
+
+    def close(self):
+        """
+        Drop responses not written with a cycle
+        :return:
+        """
+
+        self._responses = []
+
+
+def read_cycles(directory):
+    """
+    Read recorded cycles of all segments in a directory, oldest first.
+    :param directory:
+    :return: (generator) dict with start_datetime, cycle_time, complete_datetime, responses
+        (list of receive time, market, body), reused (list of markets) and bars (list of values per market)
+    """
+
+    segments = sorted(x for x in listdir(directory) if x.startswith(SEGMENT_PREFIX) and x.endswith(SEGMENT_SUFFIX))
+
+    for segment in segments:
+        start_datetime = None
+        cycle = None
+
+        try:
+            with gzip_open(join(directory, segment), 'rb') as f:
+                for line in f:
+                    kind, _, data = line.rstrip(b'\n').partition(b'\t')
+
+                    if kind == b'R':
+                        receive_time, market, body = data.split(b'\t', 2)
+                        cycle['responses'].append((float(receive_time), market.decode('utf-8'), body))
+
+                    elif kind == b'B':
+                        market, *values = data.decode('utf-8').split('\t')
+                        cycle['bars'].setdefault(market, []).append(values)
+
+                    elif kind == b'U':
+                        cycle['reused'].append(data.decode('utf-8'))
+
+                    elif kind == b'C':
+                        cycle_time, complete_time = data.split(b'\t')
+                        cycle = {'start_datetime': start_datetime,
+                                 'cycle_time': float(cycle_time),
+                                 'complete_datetime': datetime.fromtimestamp(float(complete_time)).astimezone(tz=None)
+                                 if complete_time else None,
+                                 'responses': [],
+                                 'reused': [],
+                                 'bars': {}}
+
+                    elif kind == b'E':
+                        yield cycle
+                        cycle = None
+
+                    elif kind == b'S':
+                        start_datetime = datetime.fromtimestamp(float(data)).astimezone(tz=None)
+
+        # Segment cut short by a crash
+        except (EOFError, BadGzipFile, ZlibError):
+            continue
+
+
+class ReplayTransport:
+    """
+    AsyncSession transport answering market history requests with the recorded responses of a cycle
+    """
+
+    def __init__(self):
+
+        self.responses = {}
+
+    async def get(self, url, headers=None, proxy=None):
+
+        market = parse_qs(urlsplit(url).query).get('market', [None])[0]
+
+        if market not in self.responses:
+            raise ConnectionError('No recorded response for {}.'.format(market))
+
+        return 200, self.responses.get(market)
+
+    async def close(self):
+
+        pass
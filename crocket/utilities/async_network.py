@@ -0,0 +1,278 @@
+from asyncio import IncompleteReadError, LimitOverrunError, TimeoutError as AsyncTimeoutError, gather, \
+    new_event_loop, open_connection, wait_for
+from ssl import create_default_context
+from urllib.parse import urlsplit
+
+# Errors of a failed request (connection, timeout or malformed response)
+NETWORK_ERRORS = (OSError, AsyncTimeoutError, IncompleteReadError, LimitOverrunError)
+
+
+def split_proxy(proxy):
+    """
+    Split proxy address into host and port.
+    Ex: 173.234.194.56:8800 or http://173.234.194.56:8800
+    :param proxy:
+    :return: (tuple) host, port
+    """
+    parts = urlsplit(proxy if '//' in proxy else '//{}'.format(proxy))
+
+    return parts.hostname, parts.port or 80
+
+
+async def read_head(reader):
+    """
+    Read status line and headers of an HTTP response.
+    :param reader: StreamReader
+    :return: (tuple) status, headers (lowercase names)
+    """
+    status_line = await reader.readline()
+
+    if not status_line:
+        raise ConnectionError('Connection closed by server.')
+
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        raise ConnectionError('Malformed status line: {}'.format(status_line))
+
+    headers = {}
+
+    while True:
+        line = await reader.readline()
+
+        if line in (b'\r\n', b'\n'):
+            break
+
+        if not line:
+            raise ConnectionError('Connection closed by server.')
+
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    return status, headers
+
+
+async def read_body(reader, headers):
+    """
+    Read body of an HTTP response.
+    :param reader: StreamReader
+    :param headers: Response headers
+    :return: (tuple) body, keep alive
+    """
+    keep_alive = headers.get('connection', '').lower() != 'close'
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        chunks = []
+
+        while True:
+            size_line = await reader.readline()
+
+            try:
+                size = int(size_line.split(b';')[0], 16)
+            except ValueError:
+                raise ConnectionError('Malformed chunk size: {}'.format(size_line))
+
+            if size == 0:
+                break
+
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+        # Trailers
+        while await reader.readline() not in (b'\r\n', b'\n', b''):
+            pass
+
+        return b''.join(chunks), keep_alive
+
+    if 'content-length' in headers:
+        return await reader.readexactly(int(headers['content-length'])), keep_alive
+
+    return await reader.read(), False
+
+
+class StreamTransport:
+    """
+    HTTP/1.1 transport on asyncio streams with keep-alive connection pools per proxy
+    """
+
+    def __init__(self,
+                 ssl_context=None,
+                 max_idle_connections=8):
+
+        self.ssl_context = ssl_context if ssl_context else create_default_context()
+        self.max_idle_connections = max_idle_connections
+
+        # Idle connections by (proxy, scheme, host, port)
+        self.pools = {}
+
+        self.connections_opened = 0
+
+    async def _connect(self, proxy, scheme, host, port):
+        """
+        Open connection to host, tunneling https through proxy with CONNECT
+        :return: (tuple) reader, writer
+        """
+
+        ssl_context = self.ssl_context if scheme == 'https' else None
+
+        if not proxy:
+            reader, writer = await open_connection(host, port,
+                                                   ssl=ssl_context,
+                                                   server_hostname=host if ssl_context else None)
+        else:
+            reader, writer = await open_connection(*split_proxy(proxy))
+
+            if ssl_context:
+                try:
+                    writer.write('CONNECT {0}:{1} HTTP/1.1\r\nHost: {0}:{1}\r\n\r\n'.format(host, port).encode('latin-1'))
+                    await writer.drain()
+
+                    status, _ = await read_head(reader)
+
+                    if status != 200:
+                        raise ConnectionError('Proxy CONNECT failed with status {}.'.format(status))
+
+                    await writer.start_tls(ssl_context, server_hostname=host)
+                except BaseException:
+                    writer.close()
+                    raise
+
+        self.connections_opened += 1
+
+        return reader, writer
+
+    async def _request(self, key, reader, writer, target, host, headers):
+        """
+        Send request on an open connection and read response. Connection is returned to its pool if kept alive.
+        :return: (tuple) status, body
+        """
+
+        lines = ['GET {} HTTP/1.1'.format(target), 'Host: {}'.format(host), 'Connection: keep-alive']
+        lines += ['{}: {}'.format(k, v) for k, v in headers.items()]
+
+        try:
+            writer.write('{}\r\n\r\n'.format('\r\n'.join(lines)).encode('latin-1'))
+            await writer.drain()
+
+            status, response_headers = await read_head(reader)
+            body, keep_alive = await read_body(reader, response_headers)
+        except BaseException:
+            writer.close()
+            raise
+
+        pool = self.pools.setdefault(key, [])
+
+        if keep_alive and len(pool) < self.max_idle_connections:
+            pool.append((reader, writer))
+        else:
+            writer.close()
+
+        return status, body
+
+    async def get(self, url, headers=None, proxy=None):
+        """
+        Send a GET request
+        :param url:
+        :param headers: (dict) Request headers
+        :param proxy: Proxy address
+        :return: (tuple) status, body
+        """
+
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        host = parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        headers = headers if headers else {}
+
+        # Plain http through a proxy uses absolute URLs
+        if proxy and scheme == 'http':
+            target = url
+        else:
+            target = '{}?{}'.format(parts.path or '/', parts.query) if parts.query else (parts.path or '/')
+
+        key = (proxy, scheme, host, port)
+        pool = self.pools.get(key)
+
+        # Reuse idle connection, retry on a new connection if it was closed by the server
+        while pool:
+            reader, writer = pool.pop()
+
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+
+            try:
+                return await self._request(key, reader, writer, target, host, headers)
+            except (ConnectionError, IncompleteReadError):
+                continue
+
+        reader, writer = await self._connect(proxy, scheme, host, port)
+
+        return await self._request(key, reader, writer, target, host, headers)
+
+    async def close(self):
+        """
+        Close all idle connections
+        :return:
+        """
+
+        for pool in self.pools.values():
+            for _, writer in pool:
+                writer.close()
+
+        self.pools.clear()
+
+
+class AsyncSession:
+    """
+    Runs concurrent requests on an asyncio event loop through a pluggable transport.
+    The transport must provide: async get(url, headers, proxy) -> (status, body) and async close().
+    """
+
+    def __init__(self,
+                 transport=None,
+                 timeout=3):
+
+        self.transport = transport if transport else StreamTransport()
+        self.timeout = timeout
+        self.loop = new_event_loop()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+    async def _get(self, url, headers, proxy, timeout):
+
+        start = self.loop.time()
+        status, body = await wait_for(self.transport.get(url, headers=headers, proxy=proxy), timeout)
+
+        return status, body, self.loop.time() - start
+
+    async def _get_all(self, requests, timeout):
+
+        return await gather(*[self._get(x.get('url'), x.get('headers'), x.get('proxy'), timeout) for x in requests],
+                            return_exceptions=True)
+
+    def get_all(self, requests, timeout=None):
+        """
+        Send all requests concurrently
+        :param requests: (list(dict)) Requests with url, headers and proxy
+        :param timeout: Deadline per request in seconds (defaults to session timeout)
+        :return: (list) (status, body, elapsed seconds) per request or the exception raised by the request
+        """
+
+        return self.loop.run_until_complete(self._get_all(requests, timeout if timeout else self.timeout))
+
+    def close(self):
+        """
+        Close transport and event loop
+        :return:
+        """
+
+        if not self.loop.is_closed():
+            self.loop.run_until_complete(self.transport.close())
+            self.loop.close()
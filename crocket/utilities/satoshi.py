@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from numpy import abs as np_abs, asarray, float64, floor, int64, rint
+
+SATOSHI_DIGITS = 8
+SATOSHI_PER_UNIT = 10 ** SATOSHI_DIGITS
+
+# Relative error bound of one float64 operation, with a safety factor of 8
+FLOAT_TOLERANCE = 2.0 ** -50
+
+
+def divide_round_half_even(numerator, denominator):
+    """
+    Integer division rounded half to even (same rounding as Decimal.quantize).
+    :param numerator: (int)
+    :param denominator: (int) Positive denominator
+    :return: (int)
+    """
+
+    quotient, remainder = divmod(numerator, denominator)
+    remainder *= 2
+
+    if remainder > denominator or (remainder == denominator and quotient & 1):
+        quotient += 1
+
+    return quotient
+
+
+def to_satoshi(value):
+    """
+    Convert a float, int or Decimal to satoshi units.
+    Exact: equivalent to Decimal(value).quantize(Decimal('1e-8')) scaled by 1e8.
+    :param value: Amount in base units
+    :return: (int)
+    """
+
+    numerator, denominator = value.as_integer_ratio()
+
+    return divide_round_half_even(numerator * SATOSHI_PER_UNIT, denominator)
+
+
+def to_satoshi_array(values):
+    """
+    Convert a sequence of floats to an int64 array of satoshi units.
+    Values close to a half satoshi are converted exactly with to_satoshi.
+    :param values: Amounts in base units
+    :return: (numpy.ndarray) int64
+    """
+
+    values = asarray(values, dtype=float64)
+    scaled = values * SATOSHI_PER_UNIT
+    satoshis = rint(scaled).astype(int64)
+
+    ties = np_abs(scaled - floor(scaled) - 0.5) <= np_abs(scaled) * FLOAT_TOLERANCE
+
+    if ties.any():
+        for index in ties.nonzero()[0]:
+            satoshis[index] = to_satoshi(float(values[index]))
+
+    return satoshis
+
+
+def from_satoshi(satoshis):
+    """
+    Convert satoshi units to a Decimal with 8 decimal places.
+    :param satoshis: (int)
+    :return: (Decimal)
+    """
+
+    return Decimal(int(satoshis)).scaleb(-SATOSHI_DIGITS)
@@ -1,4 +1,13 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+BITTREX_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Microseconds per unit of fractional seconds, indexed by number of digits
+FRACTION_SCALE = (0, 100000, 10000, 1000, 100, 10, 1)
 
 
 def format_time(datetime_to_format, time_format="%Y-%m-%d %H:%M:%S.%f"):
@@ -10,9 +19,9 @@ def format_time(datetime_to_format, time_format="%Y-%m-%d %H:%M:%S.%f"):
     return datetime_to_format.strftime(time_format)
 
 
-def convert_bittrex_timestamp_to_datetime(timestamp, time_format="%Y-%m-%dT%H:%M:%S.%f"):
+def convert_bittrex_timestamp_to_datetime_strptime(timestamp, time_format=BITTREX_TIME_FORMAT):
     """
-    Convert timestamp string to datetime.
+    Convert timestamp string to datetime using strptime.
     :param timestamp:
     :param time_format:
     :return:
@@ -25,10 +34,125 @@ def convert_bittrex_timestamp_to_datetime(timestamp, time_format="%Y-%m-%dT%H:%M
     return converted_datetime
 
 
+def split_bittrex_timestamp(timestamp):
+    """
+    Split timestamp string in Bittrex format (YYYY-MM-DDTHH:MM:SS[.ffffff]) into integer fields.
+    :param timestamp:
+    :return: (tuple) year, month, day, hour, minute, second, microsecond or None if not in Bittrex format
+    """
+    length = len(timestamp)
+
+    if length < 19 or length == 20 or length > 26 or timestamp[10] != 'T':
+        return None
+
+    if length == 19:
+        microsecond = 0
+    elif timestamp[19] == '.':
+        microsecond = int(timestamp[20:]) * FRACTION_SCALE[length - 20]
+    else:
+        return None
+
+    return (int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]),
+            int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19]), microsecond)
+
+
+def convert_bittrex_timestamp_to_datetime(timestamp, time_format=BITTREX_TIME_FORMAT):
+    """
+    Convert timestamp string to (naive UTC) datetime.
+    :param timestamp:
+    :param time_format:
+    :return:
+    """
+    fields = split_bittrex_timestamp(timestamp) if time_format == BITTREX_TIME_FORMAT else None
+
+    if fields is None:
+        return convert_bittrex_timestamp_to_datetime_strptime(timestamp, time_format)
+
+    return datetime(*fields)
+
+
+def convert_bittrex_timestamp_to_epoch(timestamp):
+    """
+    Convert timestamp string to microseconds since epoch.
+    :param timestamp:
+    :return: (int)
+    """
+    fields = split_bittrex_timestamp(timestamp)
+
+    if fields is None:
+        return convert_datetime_to_epoch(convert_bittrex_timestamp_to_datetime_strptime(timestamp))
+
+    year, month, day, hour, minute, second, microsecond = fields
+
+    # Days since epoch (proleptic Gregorian calendar, year starting in March)
+    if month <= 2:
+        year -= 1
+        month += 9
+    else:
+        month -= 3
+
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + (153 * month + 2) // 5 + day - 1
+    days = era * 146097 + day_of_era - 719468
+
+    return (((days * 24 + hour) * 60 + minute) * 60 + second) * 1000000 + microsecond
+
+
+@lru_cache(maxsize=64)
+def get_local_timezone(quarter_hour):
+    """
+    Get local timezone (fixed UTC offset) at a time. Cached: offsets only change on quarter hours.
+    :param quarter_hour: (int) Quarter hours since epoch
+    :return: (timezone)
+    """
+    return datetime.fromtimestamp(quarter_hour * 900, tz=timezone.utc).astimezone(tz=None).tzinfo
+
+
+def get_quarter_hour(utc_dt):
+    """
+    Get number of quarter hours since epoch.
+    :param utc_dt: UTC datetime
+    :return: (int)
+    """
+    return (utc_dt.toordinal() - EPOCH_ORDINAL) * 96 + utc_dt.hour * 4 + utc_dt.minute // 15
+
+
 def utc_to_local(utc_dt):
     """
     Convert UTC datetime to local datetime.
     :param utc_dt:
     :return:
     """
-    return utc_dt.replace(tzinfo=timezone.utc).astimezone(tz=None)
+    local_timezone = get_local_timezone(get_quarter_hour(utc_dt))
+
+    return utc_dt.replace(tzinfo=local_timezone) + local_timezone.utcoffset(None)
+
+
+def convert_bittrex_timestamp_to_local(timestamp):
+    """
+    Convert timestamp string to local datetime.
+    :param timestamp:
+    :return:
+    """
+    fields = split_bittrex_timestamp(timestamp)
+
+    if fields is None:
+        return utc_to_local(convert_bittrex_timestamp_to_datetime_strptime(timestamp))
+
+    utc_dt = datetime(*fields)
+    local_timezone = get_local_timezone(get_quarter_hour(utc_dt))
+
+    return datetime(*fields, tzinfo=local_timezone) + local_timezone.utcoffset(None)
+
+
+def convert_datetime_to_epoch(datetime_to_convert):
+    """
+    Convert datetime to microseconds since epoch. Naive datetimes are treated as UTC.
+    :param datetime_to_convert:
+    :return: (int)
+    """
+    if datetime_to_convert.tzinfo is None:
+        datetime_to_convert = datetime_to_convert.replace(tzinfo=timezone.utc)
+
+    return (datetime_to_convert - EPOCH) // timedelta(microseconds=1)